@@ -0,0 +1,217 @@
+import argparse
+import copy
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+import slack.slack
+from functional_tests.fake_jira import FakeJira
+from jira import issues, jira, sprints
+
+RESULTS_DIR = 'benchmarks/results'
+SIZES = '10x3,50x5'
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def start_fake(size):
+    # every run gets a freshly seeded fake so writes from an earlier run
+    # don't leave the next one with nothing to do
+    fake = FakeJira().start()
+    sprint = fake.seed_sprint(
+        size['stories'], size['subtasks'], size['bugs'], size['tasks'],
+        fractional=size['fractional']
+    )
+    jira.SERVER = fake.url
+    slack.slack.WEBHOOK_URL = f"{fake.url}/slack"
+    jira.transition_ids.clear()
+    issues.story_index.clear()
+    return fake, sprint
+
+
+def fetch_sprint(sprint, fields):
+    sprint_issues = jira.get_issues_for_sprint(
+        sprint['id'], fields=fields + [jira.get_estimate_field()]
+    )
+    estimates = jira.get_estimates(
+        [issue['key'] for issue in sprint_issues], sprint_issues
+    )
+    return sprint_issues, estimates
+
+
+def prepare_round_sprint_issue_estimates(sprint):
+    return lambda: issues.round_sprint_issue_estimates(sprint['id'])
+
+
+def prepare_get_sprint_stories(sprint):
+    sprint_issues, estimates = fetch_sprint(sprint, issues.ISSUE_FIELDS)
+    return lambda: issues.get_sprint_stories(
+        copy.deepcopy(sprint_issues), dict(estimates)
+    )
+
+
+def wait_for_delivery(delivery):
+    # alerts are sent by a background thread, the case ends once slack has
+    # accepted the message
+    if delivery:
+        delivery.result()
+
+
+def prepare_get_sprint_issues_by_type(sprint):
+    return lambda: wait_for_delivery(sprints.get_sprint_issues_by_type(
+        sprint['id'], sprint['name']
+    ))
+
+
+def prepare_get_message_info(sprint):
+    sprint_issues, estimates = fetch_sprint(sprint, sprints.SPRINT_FIELDS)
+    stories, bugs, tasks = sprints.sort_sprint_issues(sprint_issues)
+    return lambda: wait_for_delivery(sprints.get_message_info(
+        sprint['name'], stories, bugs, tasks, estimates
+    ))
+
+
+CASES = {
+    'round_sprint_issue_estimates': prepare_round_sprint_issue_estimates,
+    'get_sprint_stories': prepare_get_sprint_stories,
+    'get_sprint_issues_by_type': prepare_get_sprint_issues_by_type,
+    'get_message_info': prepare_get_message_info
+}
+
+
+def run_once(prepare, size, trace_memory=False):
+    fake, sprint = start_fake(size)
+    try:
+        func = prepare(sprint)
+        requests_before = sum(fake.requests.values())
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        peak = None
+        if trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return elapsed, sum(fake.requests.values()) - requests_before, peak
+    finally:
+        fake.stop()
+
+
+def run_case(name, size, repeat):
+    # timings come from untraced runs, tracemalloc slows everything down so
+    # memory is measured in one extra run
+    timings = []
+    for _ in range(repeat):
+        elapsed, requests, _ = run_once(CASES[name], size)
+        timings.append(elapsed)
+    _, _, peak = run_once(CASES[name], size, trace_memory=True)
+    return {
+        'case': name,
+        'size': size,
+        'wall_seconds': {
+            'min': min(timings),
+            'median': statistics.median(timings),
+            'max': max(timings)
+        },
+        'requests': requests,
+        'peak_memory_bytes': peak
+    }
+
+
+def parse_sizes(sizes, bugs, tasks, fractional):
+    parsed = []
+    for size in sizes.split(','):
+        stories, subtasks = size.lower().split('x')
+        parsed.append({
+            'stories': int(stories),
+            'subtasks': int(subtasks),
+            'bugs': bugs,
+            'tasks': tasks,
+            'fractional': fractional
+        })
+    return parsed
+
+
+def compare(results, baseline):
+    def get_key(result):
+        return (result['case'], json.dumps(result['size'], sort_keys=True))
+
+    baseline = {get_key(result): result for result in baseline['results']}
+    for result in results['results']:
+        old = baseline.get(get_key(result))
+        if not old:
+            continue
+        old_time = old['wall_seconds']['median']
+        new_time = result['wall_seconds']['median']
+        print(
+            f"{result['case']:<30} "
+            f"{result['size']['stories']}x{result['size']['subtasks']:<6} "
+            f"{old_time * 1000:9.1f}ms -> {new_time * 1000:9.1f}ms "
+            f"({new_time / old_time if old_time else 0:5.2f}x) "
+            f"requests {old['requests']} -> {result['requests']}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time the rollup and burndown paths against a fake jira'
+    )
+    parser.add_argument(
+        '--sizes', default=SIZES, help='comma separated STORIESxSUBTASKS'
+    )
+    parser.add_argument('--bugs', type=int, default=5)
+    parser.add_argument('--tasks', type=int, default=5)
+    parser.add_argument('--no-fractional', action='store_true')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--cases', default=','.join(CASES))
+    parser.add_argument('--output', help='defaults to RESULTS_DIR/COMMIT.json')
+    parser.add_argument('--compare', help='earlier results to compare with')
+    args = parser.parse_args()
+    # client side throttles would only measure their own refill rate
+    jira.bucket = None
+    slack.slack.bucket = None
+    commit = get_commit()
+    results = {
+        'commit': commit,
+        'created': datetime.datetime.now().astimezone().isoformat(),
+        'python': platform.python_version(),
+        'results': []
+    }
+    sizes = parse_sizes(
+        args.sizes, args.bugs, args.tasks, not args.no_fractional
+    )
+    for size in sizes:
+        for name in args.cases.split(','):
+            result = run_case(name, size, args.repeat)
+            results['results'].append(result)
+            print(
+                f"{name:<30} {size['stories']}x{size['subtasks']:<6} "
+                f"{result['wall_seconds']['median'] * 1000:9.1f}ms "
+                f"{result['requests']:5d} requests "
+                f"{result['peak_memory_bytes'] / 1024:9.1f}KiB"
+            )
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as outfile:
+        json.dump(results, outfile, indent=2)
+    print(f"results written to {output}")
+    if args.compare:
+        with open(args.compare) as infile:
+            compare(results, json.load(infile))
+
+
+if __name__ == '__main__':
+    main()
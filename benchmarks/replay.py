@@ -0,0 +1,178 @@
+import argparse
+import glob
+import itertools
+import json
+import math
+import os
+import threading
+import time
+import jira.app as app
+import slack.slack
+from functional_tests.fake_jira import FakeJira
+from jira import jira, retry
+from jira.webhook_queue import MemoryQueue
+
+DATADUMPS = 'functional_tests/datadumps'
+TIMEOUT = 300
+
+
+class ReplayQueue(MemoryQueue):
+    # stands in for the webhook queue, events get sequential ids so the time
+    # each one is acked by its worker can be recorded
+
+    def __init__(self):
+        super().__init__()
+        self.ids = itertools.count(1)
+        self.put_at = {}
+        self.acked_at = {}
+        self.lock = threading.Lock()
+
+    def _put(self, data):
+        event_id = next(self.ids)
+        with self.lock:
+            self.put_at[event_id] = time.monotonic()
+        self.queue.append((event_id, data))
+
+    def ack(self, event_ids):
+        now = time.monotonic()
+        with self.lock:
+            for event_id in event_ids:
+                self.acked_at[event_id] = now
+
+    def get_latencies(self):
+        with self.lock:
+            return [
+                self.acked_at[event_id] - put_at
+                for event_id, put_at in self.put_at.items()
+                if event_id in self.acked_at
+            ]
+
+
+def load_payloads(path):
+    if os.path.isdir(path):
+        filenames = sorted(glob.glob(os.path.join(path, 'webhook-*.json')))
+    else:
+        filenames = [path]
+    payloads = []
+    for filename in filenames:
+        with open(filename) as infile:
+            payloads.append(json.load(infile))
+    return payloads
+
+
+def get_delays(payloads, speed):
+    # recorded webhooks carry the time jira sent them in milliseconds, the
+    # gaps between them are replayed divided by speed, or not at all for max
+    timestamps = [payload.get('timestamp') for payload in payloads]
+    if not speed or None in timestamps:
+        return [0] * len(payloads)
+    return [0] + [
+        max(0, (later - earlier) / 1000 / speed)
+        for earlier, later in zip(timestamps, timestamps[1:])
+    ]
+
+
+def get_percentile(values, percentile):
+    # nearest rank, so the value reported was actually observed
+    if not values:
+        return None
+    values = sorted(values)
+    rank = math.ceil(percentile / 100 * len(values))
+    return values[max(0, rank - 1)]
+
+
+def get_request_count(name):
+    return retry.get_counters().get(name, {}).get('requests', 0)
+
+
+def replay(payloads, speed=None, repeat=1, quiet_window=0, timeout=TIMEOUT):
+    # the worker threads started by jira.app are reused, only the coalescer
+    # is started again so that it reads from the replay queue
+    app.QUIET_WINDOW = quiet_window
+    replay_q = ReplayQueue()
+    app.q = replay_q
+    threading.Thread(target=app.coalesce_webhooks_from_q, daemon=True).start()
+    jira_requests = get_request_count('jira')
+    slack_requests = get_request_count('slack')
+    payloads = payloads * repeat
+    start = time.monotonic()
+    for payload, delay in zip(payloads, get_delays(payloads, speed)):
+        time.sleep(delay)
+        replay_q.put(dict(payload))
+    sent = time.monotonic() - start
+    while (
+        len(replay_q.acked_at) < len(payloads) and
+        time.monotonic() - start < timeout
+    ):
+        time.sleep(0.05)
+    elapsed = time.monotonic() - start
+    latencies = replay_q.get_latencies()
+    events = len(payloads)
+    return {
+        'events': events,
+        'handled': len(latencies),
+        'send_seconds': sent,
+        'elapsed_seconds': elapsed,
+        'events_per_second': len(latencies) / elapsed if elapsed else None,
+        'latency_seconds': {
+            'p50': get_percentile(latencies, 50),
+            'p90': get_percentile(latencies, 90),
+            'p99': get_percentile(latencies, 99),
+            'max': get_percentile(latencies, 100)
+        },
+        'jira_requests_per_event': (
+            get_request_count('jira') - jira_requests
+        ) / events if events else 0,
+        'slack_requests_per_event': (
+            get_request_count('slack') - slack_requests
+        ) / events if events else 0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Replay recorded webhooks through the jackbot workers'
+    )
+    parser.add_argument('path', nargs='?', default=DATADUMPS)
+    parser.add_argument(
+        '--speed', default='1',
+        help="1 for realtime, N for N times faster or 'max'"
+    )
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--quiet-window', type=float, default=0)
+    parser.add_argument('--timeout', type=float, default=TIMEOUT)
+    parser.add_argument(
+        '--fake', action='store_true',
+        help='replay against a local fake jira seeded from the webhooks'
+    )
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0)
+    args = parser.parse_args()
+    speed = None if args.speed == 'max' else float(args.speed)
+    payloads = load_payloads(args.path)
+    if not payloads:
+        parser.error(f'no recorded webhooks found in {args.path}')
+    fake = None
+    if args.fake:
+        fake = FakeJira(
+            args.latency, args.error_rate, args.rate_limit_rate, retry_after=0
+        ).start()
+        for payload in payloads:
+            fake.load_webhook(payload)
+        jira.SERVER = fake.url
+        slack.slack.WEBHOOK_URL = f"{fake.url}/slack"
+    report = replay(
+        payloads, speed, args.repeat, args.quiet_window, args.timeout
+    )
+    if fake:
+        report['fake_requests'] = {
+            f"{method} {endpoint}": n
+            for (method, endpoint), n in sorted(fake.requests.items())
+        }
+        fake.stop()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import unittest
+from concurrent.futures import Future
+from unittest.mock import patch
+from benchmarks.hot_paths import compare, parse_sizes, wait_for_delivery
+
+
+class ParseSizesTest(unittest.TestCase):
+
+    def test_every_size_gets_the_shared_counts(self):
+        self.assertEqual([
+            {
+                'stories': 10, 'subtasks': 3, 'bugs': 5, 'tasks': 2,
+                'fractional': True
+            },
+            {
+                'stories': 50, 'subtasks': 5, 'bugs': 5, 'tasks': 2,
+                'fractional': True
+            }
+        ], parse_sizes('10x3,50X5', 5, 2, True))
+
+    def test_malformed_sizes_are_rejected(self):
+        with self.assertRaises(ValueError):
+            parse_sizes('10', 0, 0, False)
+
+
+@patch('builtins.print')
+class CompareTest(unittest.TestCase):
+
+    @staticmethod
+    def make_result(case, stories, median, requests):
+        return {
+            'case': case,
+            'size': {'stories': stories, 'subtasks': 3},
+            'wall_seconds': {'median': median},
+            'requests': requests
+        }
+
+    def test_matching_cases_are_compared(self, mock_print):
+        compare(
+            {'results': [self.make_result('rollup', 10, 0.5, 4)]},
+            {'results': [self.make_result('rollup', 10, 1.0, 8)]}
+        )
+        line = mock_print.call_args[0][0]
+        self.assertIn('1000.0ms ->     500.0ms', line)
+        self.assertIn('0.50x', line)
+        self.assertIn('requests 8 -> 4', line)
+
+    def test_cases_missing_from_the_baseline_are_skipped(self, mock_print):
+        compare(
+            {'results': [self.make_result('rollup', 50, 0.5, 4)]},
+            {'results': [self.make_result('rollup', 10, 1.0, 8)]}
+        )
+        mock_print.assert_not_called()
+
+
+class WaitForDeliveryTest(unittest.TestCase):
+
+    def test_waits_for_the_delivery(self):
+        delivery = Future()
+        delivery.set_result(None)
+        wait_for_delivery(delivery)
+        self.assertTrue(delivery.done())
+
+    def test_failed_deliveries_are_raised(self):
+        delivery = Future()
+        delivery.set_exception(RuntimeError())
+        with self.assertRaises(RuntimeError):
+            wait_for_delivery(delivery)
+
+    def test_nothing_to_wait_for(self):
+        wait_for_delivery(None)
@@ -0,0 +1,52 @@
+import unittest
+from benchmarks.replay import ReplayQueue, get_delays, get_percentile
+
+
+class GetPercentileTest(unittest.TestCase):
+
+    def test_nearest_rank_is_an_observed_value(self):
+        values = [4, 1, 3, 2]
+        self.assertEqual(2, get_percentile(values, 50))
+        self.assertEqual(4, get_percentile(values, 90))
+        self.assertEqual(4, get_percentile(values, 100))
+
+    def test_zero_percentile_is_the_minimum(self):
+        self.assertEqual(1, get_percentile([3, 1, 2], 0))
+
+    def test_no_values_have_no_percentile(self):
+        self.assertIsNone(get_percentile([], 50))
+
+
+class GetDelaysTest(unittest.TestCase):
+
+    payloads = [
+        {'timestamp': 1000}, {'timestamp': 3000}, {'timestamp': 2000}
+    ]
+
+    def test_recorded_gaps_are_divided_by_speed(self):
+        self.assertEqual([0, 1, 0], get_delays(self.payloads, 2))
+
+    def test_max_speed_sends_everything_at_once(self):
+        self.assertEqual([0, 0, 0], get_delays(self.payloads, None))
+
+    def test_payloads_without_timestamps_are_not_delayed(self):
+        self.assertEqual([0, 0], get_delays([{'timestamp': 1000}, {}], 1))
+
+
+class ReplayQueueTest(unittest.TestCase):
+
+    def test_events_get_sequential_ids(self):
+        replay_q = ReplayQueue()
+        replay_q.put({'issue': 1})
+        replay_q.put({'issue': 2})
+        self.assertEqual((1, {'issue': 1}), replay_q.get())
+        self.assertEqual((2, {'issue': 2}), replay_q.get())
+
+    def test_only_acked_events_have_a_latency(self):
+        replay_q = ReplayQueue()
+        replay_q.put({'issue': 1})
+        replay_q.put({'issue': 2})
+        replay_q.put_at.update({1: 10, 2: 12})
+        replay_q.ack([1])
+        replay_q.acked_at[1] = 15
+        self.assertEqual([5], replay_q.get_latencies())
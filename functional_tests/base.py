@@ -44,11 +44,17 @@ class FunctionalTest(unittest.TestCase):
     def tearDown(self):
         for issue_key in self.issue_keys + self.subtask_keys:
             jira.transition_issue(issue_key, "Archive", "Won't Do")
-            jira.assign_issue(issue_key, None)
+        report = jira.assign_issues(self.issue_keys + self.subtask_keys, None)
         jira.delete_sprint(self.sprint_id)
         if not STAGING_SERVER:
             self.serveo.kill()
             self.serveo.wait()
+        # issues left assigned would leak into the next test's sprint
+        if report['failed']:
+            error = next(iter(report['failed'].values()))
+            raise AssertionError(
+                f"Could not unassign {', '.join(report['failed'])}"
+            ) from error
 
     def set_up_server(self):
         if STAGING_SERVER:
@@ -0,0 +1,477 @@
+import collections
+import http.server
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+from jira import metrics, store
+
+# an in-process stand-in for the parts of the jira cloud agile and rest apis
+# that jackbot uses, with seeded data and injectable latency, errors and 429s
+PROJ_KEY = 'EDU'
+BOARD_ID = 17
+ESTIMATE_FIELD = 'customfield_10016'
+ACCOUNT_ID = 'fake-account-id'
+PAGE_SIZE = 50
+STATUS_CATEGORIES = {
+    'Backlog': 'To Do',
+    'In Progress': 'In Progress',
+    'PO Review': 'In Progress',
+    'Done': 'Done',
+    'Archive': 'Done'
+}
+
+
+class FakeJira:
+
+    def __init__(
+        self, latency=0, error_rate=0, rate_limit_rate=0, retry_after=1,
+        page_size=PAGE_SIZE, seed=0
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.page_size = page_size
+        self.random = random.Random(seed)
+        self.lock = threading.RLock()
+        self.issues = {}
+        self.sprints = {}
+        self.messages = []
+        self.requests = collections.Counter()
+        self.ids = collections.Counter()
+        self.server = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        fake = self
+
+        class Handler(FakeJiraHandler):
+            jira = fake
+
+        self.server = http.server.ThreadingHTTPServer(
+            ('127.0.0.1', 0), Handler
+        )
+        self.server.daemon_threads = True
+        threading.Thread(
+            target=self.server.serve_forever, kwargs={'poll_interval': 0.05},
+            daemon=True
+        ).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def next_id(self, kind):
+        self.ids[kind] += 1
+        return self.ids[kind]
+
+    def add_sprint(
+        self, name='TEST Sprint', state='active', board_id=BOARD_ID
+    ):
+        with self.lock:
+            sprint_id = self.next_id('sprint')
+            self.sprints[sprint_id] = {
+                'id': sprint_id,
+                'name': name,
+                'state': state,
+                'originBoardId': board_id
+            }
+            return self.sprints[sprint_id]
+
+    def add_issue(
+        self, issuetype, summary='', parent_key=None, sprint_id=None,
+        status='Backlog', estimate=None, assignee=None, project=PROJ_KEY
+    ):
+        with self.lock:
+            issue_id = self.next_id('issue')
+            key = f"{project}-{issue_id}"
+            self.issues[key] = {
+                'id': str(issue_id),
+                'key': key,
+                'sprint_id': sprint_id,
+                'fields': {
+                    'summary': summary,
+                    'project': {'key': project},
+                    'issuetype': {'name': issuetype},
+                    'status': get_status(status),
+                    'assignee': get_assignee(assignee),
+                    'parent': {'key': parent_key} if parent_key else None,
+                    ESTIMATE_FIELD: estimate
+                }
+            }
+            return self.issues[key]
+
+    def seed_sprint(
+        self, stories=3, subtasks=2, bugs=1, tasks=1, name='TEST Sprint',
+        fractional=True
+    ):
+        # estimates are made fractional every so often so rounding has work
+        sprint = self.add_sprint(name)
+
+        def estimate():
+            value = self.random.randint(1, 8)
+            if fractional and self.random.random() < 0.3:
+                value += 0.5
+            return value
+
+        for i in range(stories):
+            story = self.add_issue(
+                'Story', f'story_{i}', sprint_id=sprint['id']
+            )
+            for j in range(subtasks):
+                self.add_issue(
+                    'Story Task', f'story_{i}_{j}', story['key'],
+                    status=self.random.choice(list(STATUS_CATEGORIES)[:4]),
+                    estimate=estimate()
+                )
+        for i in range(bugs):
+            self.add_issue(
+                'Bug', f'bug_{i}', sprint_id=sprint['id'], estimate=estimate()
+            )
+        for i in range(tasks):
+            self.add_issue(
+                'Task', f'task_{i}', sprint_id=sprint['id'],
+                estimate=estimate()
+            )
+        return sprint
+
+    def load_webhook(self, data):
+        # issues and sprints from a recorded webhook are seeded so replays
+        # find what the webhook refers to
+        with self.lock:
+            if data.get('sprint'):
+                self.load_sprint(data['sprint'])
+            issue = data.get('issue')
+            if not issue or issue['key'] in self.issues:
+                return
+            fields = issue.get('fields') or {}
+            sprint = store.get_payload_sprint(fields)
+            if not isinstance(sprint, dict):
+                sprint = None
+            if sprint:
+                self.load_sprint(sprint)
+            self.issues[issue['key']] = {
+                'id': str(issue.get('id', len(self.issues) + 1)),
+                'key': issue['key'],
+                'sprint_id': sprint['id'] if sprint else None,
+                'fields': {
+                    'summary': fields.get('summary', ''),
+                    'project': fields.get('project', {'key': PROJ_KEY}),
+                    'issuetype': fields.get('issuetype', {'name': 'Task'}),
+                    'status': fields.get('status', get_status('Backlog')),
+                    'assignee': fields.get('assignee'),
+                    'parent': fields.get('parent'),
+                    ESTIMATE_FIELD: fields.get(ESTIMATE_FIELD)
+                }
+            }
+
+    def load_sprint(self, sprint):
+        self.sprints.setdefault(sprint['id'], {
+            'id': sprint['id'],
+            'name': sprint.get('name', 'TEST Sprint'),
+            'state': sprint.get('state', 'active'),
+            'originBoardId': sprint.get(
+                'originBoardId', sprint.get('boardId', BOARD_ID)
+            )
+        })
+
+    def get_sprint_id(self, issue):
+        parent = issue['fields']['parent']
+        if parent and parent['key'] in self.issues:
+            return self.issues[parent['key']]['sprint_id']
+        return issue['sprint_id']
+
+    def render_issue(self, issue, fields=None):
+        rendered = dict(issue['fields'])
+        rendered['subtasks'] = [
+            {'key': key, 'fields': {
+                'status': subtask['fields']['status'],
+                'issuetype': subtask['fields']['issuetype']
+            }}
+            for key, subtask in self.issues.items()
+            if (subtask['fields']['parent'] or {}).get('key') == issue['key']
+        ]
+        rendered['sprint'] = self.sprints.get(self.get_sprint_id(issue))
+        if fields:
+            rendered = {
+                field: rendered[field] for field in fields if field in rendered
+            }
+        return {
+            'id': issue['id'],
+            'key': issue['key'],
+            'fields': json.loads(json.dumps(rendered))
+        }
+
+    def handle(self, method, path, query, body):
+        # returns (status, payload), routes are matched in order
+        for route_method, pattern, name in ROUTES:
+            match = re.fullmatch(pattern, path)
+            if route_method == method and match:
+                with self.lock:
+                    return getattr(self, name)(query, body, *match.groups())
+        return 404, {'errorMessages': [f'No route for {method} {path}']}
+
+    def get_board_sprints(self, query, body, board_id):
+        return 200, {'isLast': True, 'values': [
+            sprint for sprint in self.sprints.values()
+            if sprint['originBoardId'] == int(board_id)
+        ]}
+
+    def get_board_configuration(self, query, body, board_id):
+        return 200, {'estimation': {'field': {'fieldId': ESTIMATE_FIELD}}}
+
+    def create_sprint(self, query, body):
+        sprint = self.add_sprint(body['name'], 'future', body['originBoardId'])
+        return 201, sprint
+
+    def update_sprint(self, query, body, sprint_id):
+        sprint = self.sprints.get(int(sprint_id))
+        if not sprint:
+            return 404, {'errorMessages': ['Sprint does not exist']}
+        sprint.update(body)
+        return 200, sprint
+
+    def delete_sprint(self, query, body, sprint_id):
+        if not self.sprints.pop(int(sprint_id), None):
+            return 404, {'errorMessages': ['Sprint does not exist']}
+        for issue in self.issues.values():
+            if issue['sprint_id'] == int(sprint_id):
+                issue['sprint_id'] = None
+        return 204, None
+
+    def get_sprint_issues(self, query, body, sprint_id):
+        if int(sprint_id) not in self.sprints:
+            return 404, {'errorMessages': ['Sprint does not exist']}
+        start_at = int(query.get('startAt', 0))
+        fields = query['fields'].split(',') if 'fields' in query else None
+        issues = [
+            issue for issue in self.issues.values()
+            if self.get_sprint_id(issue) == int(sprint_id)
+        ]
+        return 200, {
+            'startAt': start_at,
+            'maxResults': self.page_size,
+            'total': len(issues),
+            'issues': [
+                self.render_issue(issue, fields)
+                for issue in issues[start_at:start_at + self.page_size]
+            ]
+        }
+
+    def move_to_sprint(self, query, body, sprint_id):
+        for key in body['issues']:
+            self.issues[key]['sprint_id'] = int(sprint_id)
+        return 204, None
+
+    def move_to_backlog(self, query, body):
+        for key in body['issues']:
+            self.issues[key]['sprint_id'] = None
+        return 204, None
+
+    def get_issue(self, query, body, key):
+        if key not in self.issues:
+            return 404, {'errorMessages': ['Issue does not exist']}
+        fields = query['fields'].split(',') if 'fields' in query else None
+        return 200, self.render_issue(self.issues[key], fields)
+
+    def get_estimation(self, query, body, key):
+        if key not in self.issues:
+            return 404, {'errorMessages': ['Issue does not exist']}
+        return 200, {
+            'fieldId': ESTIMATE_FIELD,
+            'value': self.issues[key]['fields'][ESTIMATE_FIELD]
+        }
+
+    def update_estimation(self, query, body, key):
+        if key not in self.issues:
+            return 404, {'errorMessages': ['Issue does not exist']}
+        self.issues[key]['fields'][ESTIMATE_FIELD] = body['value']
+        return 200, {'fieldId': ESTIMATE_FIELD, 'value': body['value']}
+
+    def search(self, query, body):
+        jql = (body or {}).get('jql') or query.get('jql', '')
+        fields = (body or {}).get('fields')
+        keys = re.fullmatch(r'key in \((.*)\)', jql)
+        if keys:
+            keys = keys.group(1).split(',')
+            issues = [self.issues[key] for key in keys if key in self.issues]
+        else:
+            issues = [
+                issue for issue in self.issues.values()
+                if matches_jql(issue, jql)
+            ]
+        return 200, {
+            'startAt': 0,
+            'maxResults': len(issues),
+            'total': len(issues),
+            'issues': [self.render_issue(issue, fields) for issue in issues]
+        }
+
+    def create_issue(self, query, body):
+        fields = body['fields']
+        issue = self.add_issue(
+            fields['issuetype']['name'], fields.get('summary', ''),
+            (fields.get('parent') or {}).get('key'),
+            estimate=fields.get(ESTIMATE_FIELD),
+            project=fields['project']['key']
+        )
+        return 201, {'id': issue['id'], 'key': issue['key']}
+
+    def delete_issue(self, query, body, key):
+        if not self.issues.pop(key, None):
+            return 404, {'errorMessages': ['Issue does not exist']}
+        if query.get('deleteSubtasks') == 'True':
+            for subtask_key, subtask in list(self.issues.items()):
+                if (subtask['fields']['parent'] or {}).get('key') == key:
+                    del self.issues[subtask_key]
+        return 204, None
+
+    def assign(self, query, body, key):
+        if key not in self.issues:
+            return 404, {'errorMessages': ['Issue does not exist']}
+        self.issues[key]['fields']['assignee'] = get_assignee(
+            body['accountId']
+        )
+        return 204, None
+
+    def get_myself(self, query, body):
+        return 200, {'accountId': ACCOUNT_ID, 'displayName': 'JackBot'}
+
+    def get_transitions(self, query, body, key):
+        if key not in self.issues:
+            return 404, {'errorMessages': ['Issue does not exist']}
+        return 200, {'transitions': [
+            {'id': str(i + 1), 'name': status}
+            for i, status in enumerate(STATUS_CATEGORIES)
+        ]}
+
+    def transition(self, query, body, key):
+        if key not in self.issues:
+            return 404, {'errorMessages': ['Issue does not exist']}
+        statuses = list(STATUS_CATEGORIES)
+        index = int(body['transition']['id']) - 1
+        if not 0 <= index < len(statuses):
+            return 400, {'errorMessages': ['Transition is not valid']}
+        self.issues[key]['fields']['status'] = get_status(statuses[index])
+        return 204, None
+
+    def post_slack_message(self, query, body):
+        self.messages.append(body)
+        return 200, 'ok'
+
+
+class FakeJiraHandler(http.server.BaseHTTPRequestHandler):
+    jira = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def respond(self, status, payload, headers=None):
+        data = b''
+        if payload is not None:
+            data = (
+                payload if isinstance(payload, str) else json.dumps(payload)
+            ).encode()
+        self.send_response(status)
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def dispatch(self):
+        fake = self.jira
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        with fake.lock:
+            fake.requests[
+                (self.command, metrics.normalize_endpoint(url.path))
+            ] += 1
+            roll = fake.random.random()
+        if fake.latency:
+            time.sleep(fake.latency)
+        if roll < fake.rate_limit_rate:
+            return self.respond(
+                429, {'errorMessages': ['Rate limit exceeded']},
+                {'Retry-After': str(fake.retry_after)}
+            )
+        if roll < fake.rate_limit_rate + fake.error_rate:
+            return self.respond(500, {'errorMessages': ['Injected error']})
+        status, payload = fake.handle(self.command, url.path, query, body)
+        self.respond(status, payload)
+
+    do_GET = do_POST = do_PUT = do_DELETE = dispatch
+
+
+def get_status(name):
+    return {'name': name, 'statusCategory': {
+        'name': STATUS_CATEGORIES.get(name, 'To Do')
+    }}
+
+
+def get_assignee(account_id):
+    if not account_id:
+        return None
+    return {'accountId': account_id, 'displayName': account_id}
+
+
+def matches_jql(issue, jql):
+    # just enough jql for jira.search_for_issue, clauses joined by '&'
+    for clause in jql.split('&'):
+        match = re.fullmatch(r'(\w+)\s*(=|~)\s*"?(.*?)"?', clause.strip())
+        if not match:
+            continue
+        field, operator, value = match.groups()
+        fields = issue['fields']
+        actual = {
+            'project': fields['project']['key'],
+            'issuetype': fields['issuetype']['name'],
+            'summary': fields['summary'],
+            'parent': (fields['parent'] or {}).get('key')
+        }.get(field)
+        if operator == '~' and value not in (actual or ''):
+            return False
+        if operator == '=' and actual != value:
+            return False
+    return True
+
+
+ROUTES = [
+    ('GET', r'/rest/agile/1\.0/board/(\d+)/sprint', 'get_board_sprints'),
+    (
+        'GET', r'/rest/agile/1\.0/board/(\d+)/configuration',
+        'get_board_configuration'
+    ),
+    ('POST', r'/rest/agile/1\.0/sprint', 'create_sprint'),
+    ('POST', r'/rest/agile/1\.0/sprint/(\d+)', 'update_sprint'),
+    ('DELETE', r'/rest/agile/1\.0/sprint/(\d+)', 'delete_sprint'),
+    ('GET', r'/rest/agile/1\.0/sprint/(\d+)/issue', 'get_sprint_issues'),
+    ('POST', r'/rest/agile/1\.0/sprint/(\d+)/issue', 'move_to_sprint'),
+    ('POST', r'/rest/agile/1\.0/backlog/issue', 'move_to_backlog'),
+    ('GET', r'/rest/agile/1\.0/issue/([^/]+)', 'get_issue'),
+    ('GET', r'/rest/agile/1\.0/issue/([^/]+)/estimation', 'get_estimation'),
+    (
+        'PUT', r'/rest/agile/1\.0/issue/([^/]+)/estimation',
+        'update_estimation'
+    ),
+    ('GET', r'/rest/api/3/search', 'search'),
+    ('POST', r'/rest/api/3/search', 'search'),
+    ('POST', r'/rest/api/3/issue', 'create_issue'),
+    ('DELETE', r'/rest/api/3/issue/([^/]+)', 'delete_issue'),
+    ('PUT', r'/rest/api/3/issue/([^/]+)/assignee', 'assign'),
+    ('GET', r'/rest/api/3/myself', 'get_myself'),
+    ('GET', r'/rest/api/3/issue/([^/]+)/transitions', 'get_transitions'),
+    ('POST', r'/rest/api/3/issue/([^/]+)/transitions', 'transition'),
+    ('POST', r'/slack', 'post_slack_message'),
+]
@@ -1,35 +1,274 @@
 import flask
 import json
+import os
 import queue
 import threading
-from jira.issues import issue_event
+import time
+import traceback
+import zlib
+from jira import boards, metrics, retry, store, tracing
+from jira.issues import get_payload_sprint_id, issue_events, reconcile_store
 from jira.sprints import sprint_event, scheduler
+from jira.webhook_queue import open_queue
+from slack import slack
+
+QUIET_WINDOW = float(os.environ.get('JACKBOT_QUIET_WINDOW', 2))
+MAX_WAIT = float(os.environ.get('JACKBOT_MAX_WAIT', 30))
+WORKERS = int(os.environ.get('JACKBOT_WORKERS', 4))
+QUEUE_PATH = os.environ.get('JACKBOT_QUEUE_PATH')
+RECONCILE_INTERVAL = float(
+    os.environ.get('JACKBOT_RECONCILE_INTERVAL', 900)
+)
+
+
+def get_board_partitions():
+    # every board gets its own workers so a busy board cannot starve the
+    # others, configured boards default to one worker and the default board
+    # gets JACKBOT_WORKERS
+    partitions = {}
+    start = 0
+    for board in boards.get_boards():
+        count = board['workers'] or WORKERS
+        partitions[board['id']] = range(start, start + count)
+        start += count
+    return partitions
+
 
 app = flask.Flask(__name__)
-q = queue.Queue()
+q = open_queue(QUEUE_PATH)
+board_partitions = get_board_partitions()
+PARTITIONS = sum(len(partitions) for partitions in board_partitions.values())
+worker_qs = [queue.Queue() for _ in range(PARTITIONS)]
+stats_lock = threading.Lock()
+partition_stats = [
+    {'processed': 0, 'failed': 0, 'last_latency': 0, 'max_latency': 0}
+    for _ in range(PARTITIONS)
+]
+
+
+def get_event_key(data):
+    # events sharing a key trigger the same recomputation so only the latest
+    # one needs to be handled
+    sprint = data.get('sprint')
+    if sprint:
+        return f"sprint:{sprint.get('id')}"
+    issue = data.get('issue')
+    if issue:
+        fields = issue.get('fields') or {}
+        sprint_id = get_payload_sprint_id(issue)
+        if sprint_id is not None:
+            return f"sprint-issues:{sprint_id}"
+        if fields.get('parent'):
+            return f"issue:{fields['parent']['key']}"
+        return f"issue:{issue.get('key')}"
+    return None
+
 
+def get_event_board(data):
+    # None when the event does not say, False when it names a board or
+    # project jackbot does not serve
+    sprint = data.get('sprint')
+    if sprint and 'originBoardId' in sprint:
+        return boards.get_board(sprint['originBoardId']) or False
+    project = ((data.get('issue') or {}).get('fields') or {}).get('project')
+    if project:
+        return boards.get_project_board(project.get('key')) or False
+    return None
 
-def handle_webhook_from_q():
+
+def coalesce_webhooks_from_q():
+    pending = {}
     while True:
-        data = q.get()
+        timeout = None
+        if pending:
+            next_deadline = min(
+                event['deadline'] for event in pending.values()
+            )
+            timeout = max(0, next_deadline - time.monotonic())
+        try:
+            event_id, data = q.get(timeout=timeout)
+        except queue.Empty:
+            event_id, data = None, None
         if data == 'shutdown':
+            for key, event in pending.items():
+                dispatch(key, event)
+            for worker_q in worker_qs:
+                worker_q.put('shutdown')
             break
-        issue = data.get('issue')
-        if issue:
-            issue_event(issue)
-        sprint = data.get('sprint')
-        if sprint:
-            sprint_event(sprint)
+        now = time.monotonic()
+        key = get_event_key(data) if data else None
+        board = get_event_board(data) if key else None
+        if key and board is not False:
+            if key in pending:
+                metrics.inc(
+                    'jackbot_events_coalesced_total',
+                    help_text='Events merged into a pending event'
+                )
+            event = pending.setdefault(key, {
+                'first_seen': now,
+                'event_ids': [],
+                'trace_ids': [],
+                'events': {},
+                'board': board and board['id']
+            })
+            event['deadline'] = min(
+                now + QUIET_WINDOW, event['first_seen'] + MAX_WAIT
+            )
+            event['event_ids'].append(event_id)
+            event['trace_ids'].append(data.get('jackbotTraceId'))
+            # only the latest event for each issue is kept
+            issue_key = (data.get('issue') or {}).get('key')
+            event['events'].pop(issue_key, None)
+            event['events'][issue_key] = data
+        elif data:
+            metrics.inc(
+                'jackbot_events_dropped_total',
+                help_text='Events ignored for having nothing to act on'
+            )
+            q.ack([event_id])
+        for key, event in list(pending.items()):
+            if event['deadline'] <= now:
+                dispatch(key, pending.pop(key))
+
+
+def get_partition(key, board_id=None):
+    # a stable hash keeps every event for a key on the same worker of its
+    # board, so they are handled in order while unrelated keys run in parallel,
+    # a sprint's own events share the worker of its issues' events
+    kind, _, value = key.partition(':')
+    if kind == 'sprint-issues':
+        key = f"sprint:{value}"
+    partitions = board_partitions.get(board_id) or range(len(worker_qs))
+    return partitions[zlib.crc32(key.encode()) % len(partitions)]
 
 
-threading.Thread(target=handle_webhook_from_q, daemon=True).start()
+def dispatch(key, event):
+    worker_qs[get_partition(key, event['board'])].put({
+        'key': key,
+        'board': event['board'],
+        'received': event['first_seen'],
+        'event_ids': event['event_ids'],
+        'trace_ids': event['trace_ids'],
+        'events': list(event['events'].values())
+    })
+
+
+def handle_webhook_from_q(partition):
+    worker_q = worker_qs[partition]
+    stats = partition_stats[partition]
+    while True:
+        event = worker_q.get()
+        if event == 'shutdown':
+            break
+        # coalesced webhooks are handled under the first one's trace id
+        trace_ids = [
+            trace_id for trace_id in event.get('trace_ids', []) if trace_id
+        ]
+        try:
+            with tracing.trace(
+                'event', trace_ids[0] if trace_ids else None,
+                key=event['key'], partition=partition, trace_ids=trace_ids
+            ):
+                issues = [
+                    (data['issue'], data.get('webhookEvent'))
+                    for data in event['events']
+                    if data.get('issue')
+                ]
+                if issues:
+                    issue_events(issues)
+                for data in event['events']:
+                    if data.get('sprint'):
+                        sprint_event(data['sprint'])
+            q.ack(event['event_ids'])
+        except Exception:
+            traceback.print_exc()
+            # the queue hands the events out again or dead-letters them
+            q.fail(event['event_ids'])
+            with stats_lock:
+                stats['failed'] += 1
+            metrics.inc(
+                'jackbot_events_failed_total', help_text='Failed events',
+                partition=partition
+            )
+        latency = time.monotonic() - event['received']
+        metrics.inc(
+            'jackbot_events_processed_total', help_text='Handled events',
+            partition=partition
+        )
+        metrics.observe(
+            'jackbot_event_latency_seconds', latency,
+            'Time from first webhook to handled', partition=partition
+        )
+        with stats_lock:
+            stats['processed'] += 1
+            stats['last_latency'] = latency
+            stats['max_latency'] = max(stats['max_latency'], latency)
+
+
+def reconcile_store_periodically():
+    while True:
+        try:
+            reconcile_store()
+        except Exception:
+            traceback.print_exc()
+        time.sleep(RECONCILE_INTERVAL)
+
+
+def get_queue_stats():
+    with stats_lock:
+        return {
+            'requests': retry.get_counters(),
+            'queued': q.qsize(),
+            'slack_outbox': slack.outbox.qsize(),
+            'partitions': [
+                {**stats, 'queued': worker_q.qsize()}
+                for worker_q, stats in zip(worker_qs, partition_stats)
+            ]
+        }
+
+
+threading.Thread(target=coalesce_webhooks_from_q, daemon=True).start()
+for partition in range(PARTITIONS):
+    threading.Thread(
+        target=handle_webhook_from_q, args=(partition,), daemon=True
+    ).start()
 threading.Thread(target=scheduler, daemon=True).start()
+if store.ENABLED:
+    threading.Thread(target=reconcile_store_periodically, daemon=True).start()
 
 
 @app.route('/', methods=['POST', 'GET'])
 def webhook():
     if flask.request.method == 'POST':
         data = json.loads(flask.request.data.decode())
+        data['jackbotTraceId'] = tracing.new_trace_id()
         q.put(data)
+        metrics.inc(
+            'jackbot_events_received_total', help_text='Webhooks received'
+        )
         return 'OK'
     return 'JackBot is running!'
+
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    return flask.jsonify(get_queue_stats())
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    metrics.set_gauge(
+        'jackbot_queue_depth', q.qsize(), 'Webhooks waiting to be coalesced'
+    )
+    metrics.set_gauge(
+        'slack_outbox_depth', slack.outbox.qsize(),
+        'Slack messages waiting to be sent'
+    )
+    for partition, worker_q in enumerate(worker_qs):
+        metrics.set_gauge(
+            'jackbot_partition_queue_depth', worker_q.qsize(),
+            'Events waiting for a worker', partition=partition
+        )
+    return flask.Response(
+        metrics.render(), mimetype='text/plain; version=0.0.4'
+    )
@@ -0,0 +1,82 @@
+import contextlib
+import contextvars
+import json
+import os
+
+# boards jackbot serves, each with its project, slack webhook, alert schedule
+# and workers, loaded from the json file at JACKBOT_BOARDS:
+# {"boards": [{"id": 17, "project": "EDU", "slack_webhook_url": "...",
+#              "alert_schedule": "0 9 * * mon-fri", "timezone": "...",
+#              "workers": 1}]}
+CONFIG_PATH = os.environ.get('JACKBOT_BOARDS')
+
+boards = {}
+projects = {}
+# the board whose event or job is being handled, read by the jira helpers
+current = contextvars.ContextVar('board', default=None)
+
+
+def add_board(board_id, project, **settings):
+    # issue events are routed by project, so a project can only be served by
+    # one board
+    if project in projects and projects[project]['id'] != board_id:
+        raise ValueError(
+            f"Project {project} is already served by board "
+            f"{projects[project]['id']}"
+        )
+    board = {
+        'id': board_id,
+        'project': project,
+        'slack_webhook_url': None,
+        'alert_schedule': None,
+        'timezone': None,
+        'workers': 1,
+        **settings
+    }
+    boards[board_id] = board
+    projects[project] = board
+    return board
+
+
+def load_config(path):
+    with open(path) as infile:
+        config = json.load(infile)
+    boards.clear()
+    projects.clear()
+    for board in config['boards']:
+        add_board(board.pop('id'), board.pop('project'), **board)
+
+
+def set_default(board_id, project, **settings):
+    # without a config file jackbot serves a single board
+    if not boards:
+        add_board(board_id, project, **settings)
+
+
+def get_boards():
+    return list(boards.values())
+
+
+def get_board(board_id):
+    return boards.get(board_id)
+
+
+def get_project_board(project):
+    return projects.get(project)
+
+
+def get_current():
+    return current.get()
+
+
+@contextlib.contextmanager
+def using(board):
+    token = current.set(board)
+    try:
+        yield board
+    finally:
+        current.reset(token)
+
+
+if CONFIG_PATH:
+    load_config(CONFIG_PATH)
@@ -0,0 +1,225 @@
+import datetime
+import fcntl
+import os
+import threading
+import traceback
+import zoneinfo
+from jira import metrics, tracing
+
+# five field cron expressions (minute hour day-of-month month day-of-week),
+# a scheduler that sleeps until the next one is due, and a leader lock so only
+# one of several processes runs them
+FIELDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+NAMES = [
+    {}, {}, {},
+    {
+        name: i + 1 for i, name in enumerate([
+            'jan', 'feb', 'mar', 'apr', 'may', 'jun',
+            'jul', 'aug', 'sep', 'oct', 'nov', 'dec'
+        ])
+    },
+    {
+        name: i for i, name in enumerate([
+            'sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'
+        ])
+    }
+]
+MAX_SLEEP = 3600
+SEARCH_DAYS = 366 * 5
+
+
+def parse_value(value, names):
+    value = value.lower()
+    return names[value] if value in names else int(value)
+
+
+def parse_field(field, low, high, names):
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/')
+            step = int(step)
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (
+                parse_value(value, names) for value in part.split('-')
+            )
+        else:
+            start = parse_value(part, names)
+            end = high if step > 1 else start
+        # 7 is sunday too
+        if high == 6 and start == end == 7:
+            start = end = 0
+        elif high == 6 and end == 7:
+            values.add(0)
+            end = 6
+        if not low <= start <= end <= high or step < 1:
+            raise ValueError(f"Invalid cron field: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def parse(expression):
+    fields = expression.split()
+    if len(fields) != 5:
+        raise ValueError(f"Cron expressions have five fields: {expression}")
+    parsed = [
+        parse_field(field, low, high, names)
+        for field, (low, high), names in zip(fields, FIELDS, NAMES)
+    ]
+    # like cron, a restricted day of month and day of week match either,
+    # anything but a bare * is a restriction, */2 included
+    parsed.append(fields[2] != '*' and fields[4] != '*')
+    return parsed
+
+
+def matches_day(parsed, date):
+    minutes, hours, days, months, weekdays, either = parsed
+    if date.month not in months:
+        return False
+    day_match = date.day in days
+    weekday_match = (date.isoweekday() % 7) in weekdays
+    if either:
+        return day_match or weekday_match
+    return day_match and weekday_match
+
+
+def exists(moment):
+    # wall clock times skipped by a daylight saving change don't round trip
+    utc = moment.astimezone(datetime.timezone.utc)
+    return utc.astimezone(moment.tzinfo).replace(tzinfo=None) == (
+        moment.replace(tzinfo=None)
+    )
+
+
+def get_next(parsed, after):
+    # the first matching minute strictly after the given aware datetime, in
+    # that datetime's timezone
+    minutes, hours = parsed[0], parsed[1]
+    tz = after.tzinfo
+    start = after.replace(second=0, microsecond=0) + datetime.timedelta(
+        minutes=1
+    )
+    date = start.date()
+    for _ in range(SEARCH_DAYS):
+        if matches_day(parsed, date):
+            for hour in sorted(hours):
+                for minute in sorted(minutes):
+                    moment = datetime.datetime(
+                        date.year, date.month, date.day, hour, minute,
+                        tzinfo=tz
+                    )
+                    if moment >= start and exists(moment):
+                        return moment
+        date += datetime.timedelta(days=1)
+    raise ValueError('Cron expression never matches')
+
+
+def get_timezone(name=None):
+    # without a name the host's zone is used, a fixed offset is the last
+    # resort as it ignores daylight saving
+    name = name or os.environ.get('TZ')
+    if not name and os.path.islink('/etc/localtime'):
+        name = os.path.realpath('/etc/localtime').split('zoneinfo/', 1)[-1]
+    try:
+        return zoneinfo.ZoneInfo(name)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError, TypeError):
+        return datetime.datetime.now().astimezone().tzinfo
+
+
+class Job:
+
+    def __init__(
+        self, expression, func, timezone=None, name=None, retries=0,
+        retry_delay=60
+    ):
+        self.expression = expression
+        self.parsed = parse(expression)
+        self.func = func
+        self.timezone = get_timezone(timezone)
+        self.name = name or func.__name__
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.failures = 0
+
+    def get_next(self, after=None):
+        if after is None:
+            after = datetime.datetime.now(self.timezone)
+        return get_next(self.parsed, after.astimezone(self.timezone))
+
+
+class LeaderLock:
+    # an exclusive lock on a file shared by every process on the host, the
+    # first process to take it keeps it for as long as it lives
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def acquire(self):
+        if self.file:
+            return True
+        lock_file = open(self.path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self.file = lock_file
+        return True
+
+    def release(self):
+        if self.file:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+
+
+def run_job(job):
+    try:
+        with metrics.timed(
+            'scheduler_job_duration_seconds', 'Scheduled job run time',
+            job=job.name
+        ), tracing.trace('job', job=job.name):
+            job.func()
+    except Exception:
+        traceback.print_exc()
+        return False
+    return True
+
+
+def run_jobs(jobs, lock=None, stop=None):
+    # sleep until the earliest job is due, followers check the lock again at
+    # every due time so one of them takes over if the leader goes away
+    stop = stop or threading.Event()
+    due = {job: job.get_next() for job in jobs}
+    while not stop.is_set():
+        job = min(due, key=due.get)
+        now = datetime.datetime.now(job.timezone)
+        delay = (due[job] - now).total_seconds()
+        if delay > 0:
+            stop.wait(min(delay, MAX_SLEEP))
+            continue
+        if lock is None or lock.acquire():
+            # failed runs are tried again before the next scheduled time
+            if not run_job(job) and job.failures < job.retries:
+                job.failures += 1
+                metrics.inc(
+                    'scheduler_job_retries_total',
+                    help_text='Failed job runs retried', job=job.name
+                )
+                due[job] = now + datetime.timedelta(seconds=job.retry_delay)
+                continue
+        job.failures = 0
+        due[job] = job.get_next(max(
+            due[job], datetime.datetime.now(job.timezone)
+        ))
+
+
+def open_leader_lock(path):
+    if not path:
+        return None
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return LeaderLock(path)
@@ -0,0 +1,111 @@
+import datetime
+import os
+import sqlite3
+import threading
+
+# one snapshot of each sprint's burndown per day, kept so reports can compare
+# against earlier days without asking jira for its history
+PATH = os.environ.get('JACKBOT_HISTORY_PATH')
+ENABLED = bool(PATH)
+
+COLUMNS = [
+    'sprint_id', 'day', 'board_id', 'sprint_name', 'remaining',
+    'estimate_missing', 'large_estimates', 'no_subtasks', 'recorded_at'
+]
+
+lock = threading.Lock()
+connection = None
+
+
+def open_history(path=PATH):
+    global connection
+    if not path:
+        return
+    connection = sqlite3.connect(
+        path, check_same_thread=False, isolation_level=None
+    )
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    # the primary key doubles as the sprint and date index, the later
+    # snapshot of a day replaces the earlier one
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS snapshots ("
+        "sprint_id INTEGER NOT NULL, day TEXT NOT NULL, board_id INTEGER, "
+        "sprint_name TEXT NOT NULL, remaining REAL NOT NULL, "
+        "estimate_missing INTEGER NOT NULL, large_estimates INTEGER NOT NULL, "
+        "no_subtasks INTEGER NOT NULL, recorded_at REAL NOT NULL, "
+        "PRIMARY KEY (sprint_id, day)) WITHOUT ROWID"
+    )
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS snapshots_day ON snapshots (day)"
+    )
+
+
+def record_snapshot(
+    sprint_id, sprint_name, remaining, estimate_missing=0, large_estimates=0,
+    no_subtasks=0, day=None, board_id=None
+):
+    if not connection:
+        return
+    now = datetime.datetime.now(datetime.timezone.utc)
+    day = day or now.date()
+    with lock:
+        connection.execute(
+            "INSERT OR REPLACE INTO snapshots VALUES "
+            "(?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                sprint_id, day.isoformat(), board_id, sprint_name, remaining,
+                estimate_missing, large_estimates, no_subtasks,
+                now.timestamp()
+            )
+        )
+
+
+def to_snapshot(row):
+    snapshot = dict(zip(COLUMNS, row))
+    snapshot['day'] = datetime.date.fromisoformat(snapshot['day'])
+    return snapshot
+
+
+def get_snapshots(sprint_id, start=None, end=None):
+    if not connection:
+        return []
+    query = f"SELECT {', '.join(COLUMNS)} FROM snapshots WHERE sprint_id = ?"
+    args = [sprint_id]
+    if start:
+        query += " AND day >= ?"
+        args.append(start.isoformat())
+    if end:
+        query += " AND day <= ?"
+        args.append(end.isoformat())
+    with lock:
+        rows = connection.execute(query + " ORDER BY day", args).fetchall()
+    return [to_snapshot(row) for row in rows]
+
+
+def get_day_snapshots(day, board_id=None):
+    if not connection:
+        return []
+    query = f"SELECT {', '.join(COLUMNS)} FROM snapshots WHERE day = ?"
+    args = [day.isoformat()]
+    if board_id is not None:
+        query += " AND board_id = ?"
+        args.append(board_id)
+    with lock:
+        rows = connection.execute(
+            query + " ORDER BY sprint_id", args
+        ).fetchall()
+    return [to_snapshot(row) for row in rows]
+
+
+def get_burned(snapshots):
+    # hours burned between consecutive snapshots, scope added shows as
+    # negative burn
+    return [
+        (snapshot['day'], previous['remaining'] - snapshot['remaining'])
+        for previous, snapshot in zip(snapshots, snapshots[1:])
+    ]
+
+
+if ENABLED:
+    open_history()
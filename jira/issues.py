@@ -1,52 +1,290 @@
+import os
 import queue
 import requests
-from jira import jira
+import threading
+from jira import boards, jira, store, tracing
+from jira.plan import planned
+
+INCREMENTAL = os.environ.get('JACKBOT_INCREMENTAL', 'true').lower() == 'true'
 
 q = queue.Queue()
+ISSUE_FIELDS = [
+    'status', 'issuetype', 'assignee', 'subtasks', 'sprint', 'parent',
+    'project'
+]
+# story key -> status, subtasks and estimates as of the last rollup, kept so a
+# subtask webhook can be rolled up into its story without rescanning the sprint
+story_index = {}
+index_lock = threading.Lock()
+
+
+def get_payload_sprint_id(issue):
+    # webhooks carry the sprint in a custom field, a subtask without one is
+    # placed in the sprint its story was last rolled up in
+    fields = issue.get('fields') or {}
+    sprint = store.get_payload_sprint(fields)
+    if isinstance(sprint, dict):
+        return sprint.get('id')
+    parent = fields.get('parent')
+    if parent:
+        with index_lock:
+            indexed_story = story_index.get(parent.get('key'))
+        if indexed_story:
+            return indexed_story['sprint_id']
+    return None
+
+
+def is_subtask_event(event):
+    issue, webhook_event = event
+    return bool(((issue or {}).get('fields') or {}).get('parent'))
+
+
+def issue_events(events):
+    # events are (issue, webhook_event) pairs that were collapsed together,
+    # each one updates the index but a full rescan only needs the latest
+    if not INCREMENTAL:
+        for issue, webhook_event in events[:-1]:
+            store_issue(issue, webhook_event)
+        events = events[-1:]
+    # a rescan reads jira after every event of the batch happened, so each
+    # sprint is rescanned at most once and the batch's payloads are not
+    # rolled up into it again, stories go first as they are the ones that
+    # rescan
+    rescanned = set()
+    for issue, webhook_event in sorted(events, key=is_subtask_event):
+        issue_event(issue, webhook_event, rescanned)
+
+
+def issue_event(issue, webhook_event=None, rescanned=None):
+    board = issue and boards.get_project_board(
+        issue['fields']['project']['key']
+    )
+    if board:
+        with boards.using(board), tracing.span(
+            'issue_event', issue=issue['key'], board=board['id']
+        ) as span:
+            store_issue(issue, webhook_event)
+            if rescanned is None:
+                rescanned = set()
+            if get_payload_sprint_id(issue) in rescanned:
+                if span is not None:
+                    span['rescanned'] = True
+                return
+            incremental = INCREMENTAL and update_indexed_story(
+                issue, webhook_event
+            )
+            if span is not None:
+                span['incremental'] = bool(incremental)
+            if not incremental:
+                sprint_id = get_issue_sprint(issue['key'])
+                if sprint_id is not None:
+                    rescanned.add(sprint_id)
 
 
-def issue_event(issue):
-    if issue and issue['fields']['project']['key'] == jira.PROJ_KEY:
-        get_issue_sprint(issue['key'])
+def store_issue(issue, webhook_event=None):
+    if webhook_event == 'jira:issue_deleted':
+        store.remove_issue(issue['key'], deleted=True)
+    elif issue:
+        store.put_issue(issue)
+
+
+def reconcile_store():
+    # webhooks can be missed, so the sprints in the store are refetched now
+    # and then and replace whatever the store believed
+    for sprint_id in store.get_sprint_ids():
+        board_id = store.get_sprint_board(sprint_id)
+        board = boards.get_board(board_id)
+        if board_id is not None and not board:
+            continue
+        with boards.using(board):
+            reconcile_sprint(sprint_id)
+
+
+def reconcile_sprint(sprint_id):
+    fields = ISSUE_FIELDS + [jira.get_estimate_field()]
+    try:
+        sprint_issues = list(jira.iter_issues_for_sprint(
+            sprint_id, ordered=True, fields=fields
+        ))
+    except requests.exceptions.HTTPError as e:
+        if e.response.status_code != 404:
+            raise
+        store.remove_sprint(sprint_id)
+    else:
+        store.put_sprint_issues(sprint_id, sprint_issues, jira.get_board_id())
+
+
+def index_story(story, subtasks, estimates):
+    sprint = story['fields'].get('sprint') or {}
+    with index_lock:
+        story_index[story['key']] = {
+            'sprint_id': sprint.get('id'),
+            'status': story['fields']['status'],
+            'subtasks': [
+                {'key': subtask['key'], 'fields': {
+                    'status': subtask['fields']['status']
+                }}
+                for subtask in subtasks
+            ],
+            'estimates': {
+                issue_key: estimates.get(issue_key)
+                for issue_key in [story['key']] + [
+                    subtask['key'] for subtask in subtasks
+                ]
+            }
+        }
+
+
+def clear_sprint_from_index(sprint_id):
+    with index_lock:
+        for story_key, story in list(story_index.items()):
+            if story['sprint_id'] == sprint_id:
+                del story_index[story_key]
+
+
+def is_indexed_state(story):
+    # whether a story's payload matches everything its last rollup read and
+    # wrote, as it does when the webhook only echoes jackbot's own write
+    with index_lock:
+        indexed_story = story_index.get(story['key'])
+    if not indexed_story:
+        return False
+    fields = story['fields']
+    sprint = store.get_payload_sprint(fields)
+    estimate_field = jira.get_estimate_field()
+    if (
+        not isinstance(sprint, dict) or 'status' not in fields or
+        'subtasks' not in fields or estimate_field not in fields
+    ):
+        return False
+    return (
+        sprint.get('id') == indexed_story['sprint_id'] and
+        fields['status']['name'] == indexed_story['status']['name'] and
+        fields[estimate_field] == indexed_story['estimates'].get(
+            story['key']
+        ) and
+        get_subtask_statuses(fields['subtasks']) ==
+        get_subtask_statuses(indexed_story['subtasks'])
+    )
+
+
+def get_subtask_statuses(subtasks):
+    return {
+        subtask['key']: subtask['fields']['status']['name']
+        for subtask in subtasks
+    }
+
+
+def update_indexed_story(issue, webhook_event=None):
+    parent = issue['fields'].get('parent')
+    if not parent:
+        if webhook_event != 'jira:issue_deleted' and is_indexed_state(issue):
+            return True
+        # the story itself changed, it may have left the sprint
+        with index_lock:
+            story_index.pop(issue['key'], None)
+        return False
+    with index_lock:
+        indexed_story = story_index.get(parent['key'])
+    if not indexed_story:
+        return False
+    # the rollup indexes the story again once its writes went through
+    with index_lock:
+        story_index.pop(parent['key'], None)
+    estimate_field = jira.get_estimate_field()
+    estimates = dict(indexed_story['estimates'])
+    subtasks = [
+        subtask for subtask in indexed_story['subtasks']
+        if subtask['key'] != issue['key']
+    ]
+    with planned() as plan:
+        if webhook_event == 'jira:issue_deleted':
+            estimates.pop(issue['key'], None)
+        else:
+            subtasks.append({'key': issue['key'], 'fields': {
+                'status': issue['fields']['status']
+            }})
+            if estimate_field in issue['fields']:
+                estimate = issue['fields'][estimate_field]
+                estimates[issue['key']] = estimate
+                if estimate and not float(estimate).is_integer():
+                    estimates[issue['key']] = int(estimate) + 1
+                    plan.estimate(
+                        issue['key'], estimates[issue['key']], estimate
+                    )
+        story = {
+            'key': parent['key'],
+            'fields': {
+                'sprint': {'id': indexed_story['sprint_id']},
+                'status': indexed_story['status'],
+                'subtasks': subtasks
+            }
+        }
+        roll_up_story(story, estimates, plan)
+    return True
 
 
 def get_issue_sprint(issue_key):
+    # returns the id of the sprint that was rescanned, if any
     try:
-        issue = jira.get_issue(issue_key)
+        issue = jira.get_issue(issue_key, fields=ISSUE_FIELDS)
         sprint = issue['fields']['sprint']
         if sprint:
             round_sprint_issue_estimates(sprint['id'])
         else:
             get_backlog_parent_issue(issue)
+        return sprint['id'] if sprint else None
     except requests.exceptions.HTTPError as e:
         if e.response.status_code != 404:
             raise
+    return None
 
 
 def round_sprint_issue_estimates(sprint_id):
-    sprint_issues = jira.get_issues_for_sprint(sprint_id)
-    for issue in sprint_issues:
-        estimate = jira.get_estimate(issue['key'])
-        if estimate and not float(estimate).is_integer():
-            jira.update_estimate(issue['key'], int(estimate) + 1)
-    get_sprint_stories(sprint_issues)
+    sprint_issues = jira.get_issues_for_sprint(
+        sprint_id, fields=ISSUE_FIELDS + [jira.get_estimate_field()]
+    )
+    estimates = jira.get_estimates(
+        [issue['key'] for issue in sprint_issues], sprint_issues
+    )
+    with planned() as plan:
+        for issue_key, estimate in estimates.items():
+            if estimate and not float(estimate).is_integer():
+                estimates[issue_key] = int(estimate) + 1
+                plan.estimate(issue_key, estimates[issue_key], estimate)
+        clear_sprint_from_index(sprint_id)
+        get_sprint_stories(sprint_issues, estimates, plan)
 
 
-def get_sprint_stories(sprint_issues):
+def get_sprint_stories(sprint_issues, estimates=None, plan=None):
     sprint_stories = [
         issue for issue in sprint_issues
         if issue['fields']['issuetype']['name'] == 'Story'
     ]
-    for story in sprint_stories:
-        story['fields']['subtasks'] = [
-            subtask for subtask in story['fields']['subtasks']
-            if subtask['fields']['status']['name'] != 'Archive'
-        ]
-        set_story_status(story)
-        set_story_estimate(story)
+    with planned(plan) as plan:
+        for story in sprint_stories:
+            roll_up_story(story, estimates, plan)
+
+
+def roll_up_story(story, estimates=None, plan=None):
+    subtasks = story['fields']['subtasks']
+    story['fields']['subtasks'] = [
+        subtask for subtask in subtasks
+        if subtask['fields']['status']['name'] != 'Archive'
+    ]
+    with planned(plan) as plan:
+        set_story_status(story, plan)
+        set_story_estimate(story, estimates, plan)
+        # the story is only indexed once its writes and its subtasks' have
+        # gone through, so a failed or dry run write is rescanned next time
+        if estimates is not None:
+            plan.on_applied(
+                [story['key']] + [subtask['key'] for subtask in subtasks],
+                lambda: index_story(story, subtasks, estimates)
+            )
 
 
-def set_story_status(story):
+def set_story_status(story, plan=None):
     current_story_status = story['fields']['status']['name']
     unique_subtask_statuses = list(set([
         subtask['fields']['status']['name']
@@ -62,41 +300,66 @@ def set_story_status(story):
     else:
         new_story_status = 'In Progress'
     if current_story_status != new_story_status:
-        jira.transition_issue(story['key'], new_story_status)
+        def transitioned():
+            story['fields']['status'] = {
+                **story['fields']['status'], 'name': new_story_status
+            }
+        with planned(plan) as plan:
+            plan.transition(
+                story['key'], new_story_status, current_story_status, 'Story'
+            )
+            plan.on_applied([story['key']], transitioned)
 
 
-def set_story_estimate(story):
-    current_story_estimate = jira.get_estimate(story['key'])
+def set_story_estimate(story, estimates=None, plan=None):
+    subtask_keys = [subtask['key'] for subtask in story['fields']['subtasks']]
+    issue_keys = [story['key']] + subtask_keys
+    if estimates is None or not set(issue_keys) <= estimates.keys():
+        estimates = jira.get_estimates(issue_keys)
+    current_story_estimate = estimates[story['key']]
     new_story_estimate = 0
-    for subtask in story['fields']['subtasks']:
-        subtask_estimate = jira.get_estimate(subtask['key'])
+    for subtask_key in subtask_keys:
+        subtask_estimate = estimates[subtask_key]
         if subtask_estimate:
             new_story_estimate += subtask_estimate
     if current_story_estimate != new_story_estimate:
-        jira.update_estimate(story['key'], new_story_estimate)
+        def estimated():
+            estimates[story['key']] = new_story_estimate
+        with planned(plan) as plan:
+            plan.estimate(
+                story['key'], new_story_estimate, current_story_estimate
+            )
+            plan.on_applied([story['key']], estimated)
 
 
 def get_backlog_parent_issue(issue):
     if issue['fields'].get('parent'):
         parent_key = issue['fields']['parent']['key']
-        issue = jira.get_issue(parent_key)
-    set_backlog_parent_issue_status(issue)
-    set_backlog_parent_issue_assignee(issue)
-    set_backlog_parent_issue_estimate(issue['key'])
+        issue = jira.get_issue(parent_key, fields=ISSUE_FIELDS)
+    with planned() as plan:
+        set_backlog_parent_issue_status(issue, plan)
+        set_backlog_parent_issue_assignee(issue, plan)
+        set_backlog_parent_issue_estimate(issue['key'], plan)
 
 
-def set_backlog_parent_issue_status(issue):
+def set_backlog_parent_issue_status(issue, plan=None):
     issue_status = issue['fields']['status']['name']
     if issue_status != "Backlog":
-        jira.transition_issue(issue['key'], "Backlog")
+        with planned(plan) as plan:
+            plan.transition(
+                issue['key'], "Backlog", issue_status,
+                issue['fields'].get('issuetype', {}).get('name')
+            )
 
 
-def set_backlog_parent_issue_assignee(issue):
+def set_backlog_parent_issue_assignee(issue, plan=None):
     if issue['fields']['assignee']:
-        jira.assign_issue(issue['key'], None)
+        with planned(plan) as plan:
+            plan.assign(issue['key'], None, issue['fields']['assignee'])
 
 
-def set_backlog_parent_issue_estimate(issue_key):
+def set_backlog_parent_issue_estimate(issue_key, plan=None):
     estimate = jira.get_estimate(issue_key)
     if estimate is not None:
-        jira.update_estimate(issue_key, None)
+        with planned(plan) as plan:
+            plan.estimate(issue_key, None, estimate)
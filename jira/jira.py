@@ -3,11 +3,26 @@ import datetime
 import json
 import os
 import requests
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from jira import boards, metrics, retry, store, tracing
+from requests.adapters import HTTPAdapter
 
 SERVER = os.environ['JIRA_SERVER']
 EMAIL = os.environ['JIRA_EMAIL']
 PROJ_KEY = "EDU"
 BOARD_ID = 17
+POOL_CONNECTIONS = int(os.environ.get('JIRA_POOL_CONNECTIONS', 4))
+POOL_MAXSIZE = int(os.environ.get('JIRA_POOL_MAXSIZE', 10))
+POOL_BLOCK = os.environ.get('JIRA_POOL_BLOCK', 'true').lower() == 'true'
+SEARCH_BATCH_SIZE = 100
+PAGE_WORKERS = int(os.environ.get('JIRA_PAGE_WORKERS', 4))
+TRANSITION_TTL = int(os.environ.get('JIRA_TRANSITION_TTL', 3600))
+RATE_LIMIT = float(os.environ.get('JIRA_RATE_LIMIT', 10))
+RATE_BURST = int(os.environ.get('JIRA_RATE_BURST', 20))
+BULK_WORKERS = int(os.environ.get('JIRA_BULK_WORKERS', 4))
+BULK_CHUNK_SIZE = 50
 
 api_token = base64.b64encode(
     bytes(f"{EMAIL}:{os.environ['JIRA_API_TOKEN']}", 'utf-8')
@@ -17,21 +32,88 @@ headers = {
     "Content-Type": "application/json",
     "Authorization": f"Basic {api_token}"
 }
+# board id -> estimation field
+estimate_fields = {}
+account_id = None
+# (project, issue type, status, transition name) -> (transition id, expiry)
+transition_ids = {}
+
+# one keep-alive session shared by every thread, pool_maxsize caps the number
+# of open connections per host and pool_connections the number of hosts kept
+session = requests.Session()
+session.headers.update({"Connection": "keep-alive"})
+adapter = HTTPAdapter(
+    pool_connections=POOL_CONNECTIONS,
+    pool_maxsize=POOL_MAXSIZE,
+    pool_block=POOL_BLOCK
+)
+session.mount('https://', adapter)
+session.mount('http://', adapter)
+bucket = retry.TokenBucket(RATE_LIMIT, RATE_BURST)
+boards.set_default(BOARD_ID, PROJ_KEY, workers=None)
+
+
+def get_board_id():
+    board = boards.get_current()
+    return board['id'] if board else BOARD_ID
+
+
+def get_project_key():
+    board = boards.get_current()
+    return board['project'] if board else PROJ_KEY
 
 
 def api_call(method, endpoint, data=None):
     url = f"{SERVER}{endpoint}"
     if data:
         data = json.dumps(data)
-    response = requests.request(method, url, data=data, headers=headers)
+    labels = {
+        'method': method, 'endpoint': metrics.normalize_endpoint(endpoint)
+    }
+    start = time.monotonic()
+    try:
+        with tracing.span('jira', **labels) as span:
+            response = retry.request(
+                session.request, method, url, name='jira', bucket=bucket,
+                data=data, headers=headers
+            )
+            if span is not None:
+                span['status'] = response.status_code
+    except requests.exceptions.RequestException:
+        metrics.inc(
+            'jira_requests_total', help_text='Jira API calls by status',
+            status='error', **labels
+        )
+        raise
+    finally:
+        metrics.observe(
+            'jira_request_duration_seconds', time.monotonic() - start,
+            'Jira API call latency, including retries', **labels
+        )
+    metrics.inc(
+        'jira_requests_total', help_text='Jira API calls by status',
+        status=response.status_code, **labels
+    )
     if not response.ok:
         print(response.text)
         response.raise_for_status()
     return response.text
 
 
+def build_query(**params):
+    # fields and expand accept lists and are sent as comma separated values
+    params = {
+        key: ','.join(value) if isinstance(value, (list, tuple)) else value
+        for key, value in params.items()
+        if value
+    }
+    if not params:
+        return ''
+    return '?' + urllib.parse.urlencode(params, safe=',')
+
+
 def get_active_sprint():
-    url = f"/rest/agile/1.0/board/{BOARD_ID}/sprint"
+    url = f"/rest/agile/1.0/board/{get_board_id()}/sprint"
     response = api_call("GET", url)
     sprints = json.loads(response)['values']
     active_sprint = next((
@@ -71,18 +153,44 @@ def delete_sprint(sprint_id):
     api_call("DELETE", url)
 
 
-def get_issues_for_sprint(sprint_id):
+def get_issues_page(sprint_id, start_at=0, fields=None, expand=None):
     url = f"/rest/agile/1.0/sprint/{sprint_id}/issue"
+    url += build_query(startAt=start_at, fields=fields, expand=expand)
     response = api_call("GET", url)
-    max_results = json.loads(response)['maxResults']
-    start_at = json.loads(response)['startAt']
-    total = json.loads(response)['total']
-    sprint_issues = json.loads(response)['issues']
-    while start_at + max_results < total:
-        start_at += max_results
-        url = f"/rest/agile/1.0/sprint/{sprint_id}/issue?startAt={start_at}"
-        response = api_call("GET", url)
-        sprint_issues += json.loads(response)['issues']
+    return json.loads(response)
+
+
+def iter_issues_for_sprint(sprint_id, ordered=False, fields=None, expand=None):
+    # the first page tells us how many pages are left, those are then fetched
+    # concurrently and yielded as they arrive unless ordered is set
+    page = get_issues_page(sprint_id, fields=fields, expand=expand)
+    yield from page['issues']
+    start_ats = range(
+        page['startAt'] + page['maxResults'], page['total'], page['maxResults']
+    )
+    if not start_ats:
+        return
+    get_page = tracing.wrap(get_issues_page)
+    with ThreadPoolExecutor(max_workers=PAGE_WORKERS) as executor:
+        futures = [
+            executor.submit(get_page, sprint_id, start_at, fields, expand)
+            for start_at in start_ats
+        ]
+        if not ordered:
+            futures = as_completed(futures)
+        for future in futures:
+            yield from future.result()['issues']
+
+
+def get_issues_for_sprint(sprint_id, fields=None, expand=None):
+    if not expand:
+        sprint_issues = store.get_sprint_issues(sprint_id, fields)
+        if sprint_issues is not None:
+            return sprint_issues
+    sprint_issues = list(iter_issues_for_sprint(
+        sprint_id, ordered=True, fields=fields, expand=expand
+    ))
+    store.put_sprint_issues(sprint_id, sprint_issues, get_board_id())
     return sprint_issues
 
 
@@ -102,34 +210,138 @@ def remove_issues_from_sprint(issue_keys):
     api_call("POST", url, data=payload)
 
 
-def get_issue(issue_key):
+def get_issue(issue_key, fields=None, expand=None):
+    if not expand:
+        issue = store.get_issue(issue_key, fields)
+        if issue is not None:
+            return issue
     url = f"/rest/agile/1.0/issue/{issue_key}"
-    issue = api_call("GET", url)
-    return json.loads(issue)
+    url += build_query(fields=fields, expand=expand)
+    issue = json.loads(api_call("GET", url))
+    store.put_issue(issue, full=not fields)
+    return issue
 
 
 def get_estimate(issue_key):
-    url = f"/rest/agile/1.0/issue/{issue_key}/estimation?boardId={BOARD_ID}"
+    estimate_field = estimate_fields.get(get_board_id())
+    if estimate_field:
+        issue = store.get_issue(issue_key, [estimate_field])
+        if issue is not None:
+            return issue['fields'][estimate_field]
+    url = f"/rest/agile/1.0/issue/{issue_key}/estimation"
+    url += f"?boardId={get_board_id()}"
     estimate = api_call("GET", url)
     return json.loads(estimate).get('value')
 
 
-def get_estimate_field(issue_key):
-    url = f"/rest/agile/1.0/issue/{issue_key}/estimation?boardId={BOARD_ID}"
-    estimate = api_call("GET", url)
-    return json.loads(estimate).get('fieldId')
+def get_estimate_field(issue_key=None):
+    # the estimation field is a board setting, so it is only looked up once
+    # per board
+    board_id = get_board_id()
+    if not estimate_fields.get(board_id):
+        if issue_key:
+            url = f"/rest/agile/1.0/issue/{issue_key}/estimation"
+            url += f"?boardId={board_id}"
+            estimate = api_call("GET", url)
+            estimate_fields[board_id] = json.loads(estimate).get('fieldId')
+        else:
+            url = f"/rest/agile/1.0/board/{board_id}/configuration"
+            configuration = json.loads(api_call("GET", url))
+            estimate_fields[board_id] = (
+                configuration['estimation']['field']['fieldId']
+            )
+    return estimate_fields[board_id]
+
+
+def get_known_estimates(issue_keys, issues, field_id):
+    # estimates already in hand from payloads or the local store
+    estimates = {
+        issue['key']: issue['fields'][field_id]
+        for issue in issues or []
+        if field_id in issue['fields']
+    }
+    for issue_key in issue_keys:
+        if issue_key not in estimates:
+            issue = store.get_issue(issue_key, [field_id])
+            if issue is not None:
+                estimates[issue_key] = issue['fields'][field_id]
+    return estimates
+
+
+def get_estimates(issue_keys, issues=None):
+    field_id = get_estimate_field()
+    estimates = get_known_estimates(issue_keys, issues, field_id)
+    missing_keys = [key for key in issue_keys if key not in estimates]
+    for i in range(0, len(missing_keys), SEARCH_BATCH_SIZE):
+        estimates.update(
+            search_estimates(missing_keys[i:i + SEARCH_BATCH_SIZE])
+        )
+    return {issue_key: estimates.get(issue_key) for issue_key in issue_keys}
+
+
+def search_estimates(issue_keys):
+    field_id = get_estimate_field()
+    payload = {
+        "jql": f"key in ({','.join(issue_keys)})",
+        "fields": [field_id],
+        "maxResults": len(issue_keys),
+        "validateQuery": "warn"
+    }
+    response = api_call("POST", "/rest/api/3/search", data=payload)
+    issues = json.loads(response)['issues']
+    for issue in issues:
+        store.update_issue_fields(
+            issue['key'], {field_id: issue['fields'].get(field_id)}
+        )
+    return {
+        issue['key']: issue['fields'].get(field_id) for issue in issues
+    }
+
+
+def run_bulk(write, issue_keys):
+    # writes are sent a chunk at a time, BULK_WORKERS in parallel, and a
+    # failed write does not stop the rest so callers get a per key report
+    report = {'succeeded': [], 'failed': {}}
+    issue_keys = list(issue_keys)
+    write = tracing.wrap(write)
+    with ThreadPoolExecutor(max_workers=BULK_WORKERS) as executor:
+        for i in range(0, len(issue_keys), BULK_CHUNK_SIZE):
+            chunk = issue_keys[i:i + BULK_CHUNK_SIZE]
+            futures = [
+                executor.submit(write, issue_key) for issue_key in chunk
+            ]
+            for issue_key, future in zip(chunk, futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    report['failed'][issue_key] = e
+                else:
+                    report['succeeded'].append(issue_key)
+    return report
 
 
 def update_estimate(issue_key, estimate):
-    url = f"/rest/agile/1.0/issue/{issue_key}/estimation?boardId={BOARD_ID}"
+    url = f"/rest/agile/1.0/issue/{issue_key}/estimation"
+    url += f"?boardId={get_board_id()}"
     payload = {
         'value': estimate
     }
     api_call("PUT", url, data=payload)
+    estimate_field = estimate_fields.get(get_board_id())
+    if estimate_field:
+        store.update_issue_fields(issue_key, {estimate_field: estimate})
+
+
+def update_estimates(estimates):
+    return run_bulk(
+        lambda issue_key: update_estimate(issue_key, estimates[issue_key]),
+        estimates
+    )
 
 
 def search_for_issue(issuetype, summary, parent_key=None):
-    jql = f'project={PROJ_KEY}%26issuetype="{issuetype}"%26summary~"{summary}"'
+    jql = f'project={get_project_key()}%26issuetype="{issuetype}"'
+    jql += f'%26summary~"{summary}"'
     if parent_key:
         jql += f"%26parent={parent_key}"
     url = f"/rest/api/3/search?jql={jql}"
@@ -146,7 +358,7 @@ def create_issue(issuetype, summary, parent_key=None, **kwargs):
     payload = {
         "fields": {**{
             "project": {
-                "key": PROJ_KEY
+                "key": get_project_key()
             },
             "issuetype": {
                 "name": issuetype
@@ -177,17 +389,38 @@ def create_issue(issuetype, summary, parent_key=None, **kwargs):
 def delete_issue(issue_key, delete_subtasks=False):
     url = f"/rest/api/3/issue/{issue_key}?deleteSubtasks={delete_subtasks}"
     api_call("DELETE", url)
+    store.remove_issue(issue_key, deleted=True)
+
+
+def get_account_id():
+    # the bot's own account never changes, so it is only looked up once
+    global account_id
+    if not account_id:
+        myself = json.loads(api_call("GET", "/rest/api/3/myself"))
+        account_id = myself['accountId']
+    return account_id
 
 
 def assign_issue(issue_key, account_id='me'):
     if account_id == 'me':
-        response = requests.request('GET', SERVER, headers=headers)
-        account_id = response.headers['X-AACCOUNTID']
+        account_id = get_account_id()
     url = f"/rest/api/3/issue/{issue_key}/assignee"
     payload = {
         "accountId": account_id
     }
     api_call("PUT", url, data=payload)
+    if account_id is None:
+        store.update_issue_fields(issue_key, {'assignee': None})
+    else:
+        store.remove_issue(issue_key)
+
+
+def assign_issues(issue_keys, account_id='me'):
+    if account_id == 'me':
+        account_id = get_account_id()
+    return run_bulk(
+        lambda issue_key: assign_issue(issue_key, account_id), issue_keys
+    )
 
 
 def get_transition_id(issue_key, transition_name):
@@ -203,8 +436,25 @@ def get_transition_id(issue_key, transition_name):
     return transition_id
 
 
-def transition_issue(issue_key, transition_name, resolution=None):
-    transition_id = get_transition_id(issue_key, transition_name)
+def transition_issue(
+    issue_key, transition_name, resolution=None, issue_type=None, status=None
+):
+    # transition ids only depend on the workflow, so when the issue type and
+    # current status are known the lookup is cached per project
+    cache_key = None
+    if issue_type and status:
+        project_key = issue_key.rsplit('-', 1)[0]
+        cache_key = (project_key, issue_type, status, transition_name)
+    cached = transition_ids.get(cache_key)
+    if cached and cached[1] > time.monotonic():
+        transition_id = cached[0]
+    else:
+        cached = None
+        transition_id = get_transition_id(issue_key, transition_name)
+        if cache_key:
+            transition_ids[cache_key] = (
+                transition_id, time.monotonic() + TRANSITION_TTL
+            )
     url = f"/rest/api/3/issue/{issue_key}/transitions"
     payload = {
         "transition": {
@@ -217,7 +467,27 @@ def transition_issue(issue_key, transition_name, resolution=None):
                 "name": resolution
             }
         }
-    api_call("POST", url, data=payload)
+    try:
+        api_call("POST", url, data=payload)
+        # the new status comes back with the next webhook
+        store.remove_issue(issue_key)
+    except requests.exceptions.HTTPError as e:
+        if not cached or e.response.status_code != 400:
+            raise
+        # the workflow changed under us, look the transition up again
+        transition_ids.pop(cache_key, None)
+        transition_issue(
+            issue_key, transition_name, resolution, issue_type, status
+        )
+
+
+def transition_issues(issue_keys, transition_name, **kwargs):
+    return run_bulk(
+        lambda issue_key: transition_issue(
+            issue_key, transition_name, **kwargs
+        ),
+        issue_keys
+    )
 
 
 def generate_file(data, filename=None):
@@ -0,0 +1,102 @@
+import contextlib
+import re
+import threading
+import time
+
+# in-process counters, gauges and histograms rendered in the prometheus text
+# exposition format by the /metrics endpoint
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+lock = threading.Lock()
+# metric name -> {'type': ..., 'help': ..., 'series': {labels: value}}
+metrics = {}
+
+
+def get_series(name, kind, help_text, labels):
+    metric = metrics.setdefault(
+        name, {'type': kind, 'help': help_text, 'series': {}}
+    )
+    return metric['series'], tuple(sorted(labels.items()))
+
+
+def inc(name, n=1, help_text='', **labels):
+    with lock:
+        series, key = get_series(name, 'counter', help_text, labels)
+        series[key] = series.get(key, 0) + n
+
+
+def set_gauge(name, value, help_text='', **labels):
+    with lock:
+        series, key = get_series(name, 'gauge', help_text, labels)
+        series[key] = value
+
+
+def observe(name, value, help_text='', **labels):
+    with lock:
+        series, key = get_series(name, 'histogram', help_text, labels)
+        histogram = series.setdefault(key, {
+            'buckets': [0] * len(BUCKETS), 'sum': 0, 'count': 0
+        })
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                histogram['buckets'][i] += 1
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+
+@contextlib.contextmanager
+def timed(name, help_text='', **labels):
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        observe(name, time.monotonic() - start, help_text, **labels)
+
+
+def normalize_endpoint(endpoint):
+    # issue keys and ids would give every issue its own series, the api
+    # version is the only number worth keeping
+    path = endpoint.split('?', 1)[0]
+    path = re.sub(r'/[A-Z][A-Z0-9_]*-\d+(?=/|$)', '/{issue}', path)
+    return re.sub(r'(?<!/api)/\d+(?=/|$)', '/{id}', path)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    labels = ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace(
+            '"', '\\"'
+        ))
+        for key, value in labels
+    )
+    return '{' + labels + '}'
+
+
+def render():
+    lines = []
+    with lock:
+        for name, metric in sorted(metrics.items()):
+            if metric['help']:
+                lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            for labels, value in sorted(metric['series'].items()):
+                if metric['type'] != 'histogram':
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+                    continue
+                for bound, bucket in zip(BUCKETS, value['buckets']):
+                    le = labels + (('le', bound),)
+                    lines.append(
+                        f"{name}_bucket{format_labels(le)} {bucket}"
+                    )
+                le = labels + (('le', '+Inf'),)
+                lines.append(
+                    f"{name}_bucket{format_labels(le)} {value['count']}"
+                )
+                lines.append(
+                    f"{name}_sum{format_labels(labels)} {value['sum']}"
+                )
+                lines.append(
+                    f"{name}_count{format_labels(labels)} {value['count']}"
+                )
+    return '\n'.join(lines) + '\n'
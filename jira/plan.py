@@ -0,0 +1,132 @@
+import contextlib
+import json
+import os
+from jira import jira
+
+DRY_RUN = os.environ.get('JACKBOT_DRY_RUN', 'false').lower() == 'true'
+ACTIONS = ['estimate', 'transition', 'assignee']
+UNKNOWN = object()
+
+
+class Plan:
+    # mutations are keyed by action and issue so the last write planned for
+    # an issue wins, and writes that match the current state are dropped
+
+    def __init__(self):
+        self.mutations = {}
+        self.callbacks = []
+
+    def add(self, action, issue_key, value, current=UNKNOWN, **kwargs):
+        key = (action, issue_key)
+        if value == current:
+            self.mutations.pop(key, None)
+            return
+        self.mutations[key] = {
+            'action': action,
+            'issue_key': issue_key,
+            'value': value,
+            **kwargs
+        }
+        if current is not UNKNOWN:
+            self.mutations[key]['current'] = current
+
+    def transition(
+        self, issue_key, status, current=UNKNOWN, issue_type=None
+    ):
+        self.add(
+            'transition', issue_key, status, current, issue_type=issue_type
+        )
+
+    def estimate(self, issue_key, estimate, current=UNKNOWN):
+        self.add('estimate', issue_key, estimate, current)
+
+    def assign(self, issue_key, account_id, current=UNKNOWN):
+        self.add('assignee', issue_key, account_id, current)
+
+    def on_applied(self, issue_keys, callback):
+        # called once the plan is executed without a failed write to any of
+        # the issues, never on a dry run
+        self.callbacks.append((set(issue_keys), callback))
+
+    def applied(self, failed):
+        for issue_keys, callback in self.callbacks:
+            if not issue_keys & failed.keys():
+                callback()
+
+    def __len__(self):
+        return len(self.mutations)
+
+
+def get_batches(plan):
+    batches = {action: [] for action in ACTIONS}
+    for mutation in plan.mutations.values():
+        batches[mutation['action']].append(mutation)
+    return batches
+
+
+def execute_plan(plan, dry_run=None):
+    if dry_run is None:
+        dry_run = DRY_RUN
+    batches = get_batches(plan)
+    mutations = [
+        mutation for action in ACTIONS for mutation in batches[action]
+    ]
+    if dry_run:
+        for mutation in mutations:
+            print(json.dumps(mutation))
+        return mutations
+    failed = {}
+    for action in ACTIONS:
+        for report in apply_batch(action, batches[action]):
+            failed.update(report['failed'])
+    plan.applied(failed)
+    if failed:
+        # every write has been attempted, the first failure is surfaced so
+        # the event is treated as failed
+        for issue_key, error in failed.items():
+            print(f"{issue_key}: {error!r}")
+        raise next(iter(failed.values()))
+    return mutations
+
+
+def apply_batch(action, mutations):
+    # mutations sharing their arguments are handed to a bulk write together
+    groups = {}
+    for mutation in mutations:
+        if action == 'estimate':
+            group = ()
+        elif action == 'transition':
+            group = (
+                mutation['value'], mutation.get('issue_type'),
+                mutation.get('current')
+            )
+        else:
+            group = (mutation['value'],)
+        groups.setdefault(group, []).append(mutation)
+    reports = []
+    for group, grouped in groups.items():
+        issue_keys = [mutation['issue_key'] for mutation in grouped]
+        if action == 'estimate':
+            reports.append(jira.update_estimates({
+                mutation['issue_key']: mutation['value']
+                for mutation in grouped
+            }))
+        elif action == 'transition':
+            reports.append(jira.transition_issues(
+                issue_keys, group[0], issue_type=group[1], status=group[2]
+            ))
+        elif action == 'assignee':
+            reports.append(jira.assign_issues(issue_keys, group[0]))
+    return reports
+
+
+@contextlib.contextmanager
+def planned(plan=None):
+    # writes join the caller's plan, or get their own one that is executed
+    # as soon as the block is done
+    if plan is not None:
+        yield plan
+        return
+    plan = Plan()
+    yield plan
+    execute_plan(plan)
@@ -0,0 +1,129 @@
+import collections
+import email.utils
+import random
+import requests
+import threading
+import time
+
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+RETRY_STATUSES = {429, 502, 503, 504}
+# a POST may already have been acted on when it fails, so it is only retried
+# when the provider tells us it was rejected outright
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+counters = collections.defaultdict(collections.Counter)
+counters_lock = threading.Lock()
+
+
+class TokenBucket:
+    # client side throttle, allows bursts of up to capacity requests and
+    # refills at rate requests per second
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.resume_at = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        waited = 0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if now >= self.resume_at and self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = max(
+                    self.resume_at - now, (1 - self.tokens) / self.rate
+                )
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds):
+        # the provider asked us to back off, hold every caller until then
+        with self.lock:
+            self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+
+
+def count(name, event, n=1):
+    with counters_lock:
+        counters[name][event] += n
+
+
+def get_counters():
+    with counters_lock:
+        return {name: dict(counter) for name, counter in counters.items()}
+
+
+def get_retry_after(response):
+    retry_after = response.headers.get('Retry-After')
+    if not retry_after:
+        return None
+    try:
+        return max(0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0, retry_at.timestamp() - time.time())
+
+
+def get_backoff(attempt):
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def should_retry(method, response=None, error=None):
+    if response is not None:
+        if response.status_code == 429:
+            return True
+        return (
+            response.status_code in RETRY_STATUSES and
+            method in IDEMPOTENT_METHODS
+        )
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    return method in IDEMPOTENT_METHODS
+
+
+def request(
+    send, method, url, name='http', bucket=None, max_retries=MAX_RETRIES,
+    **kwargs
+):
+    attempt = 0
+    while True:
+        if bucket and bucket.acquire():
+            count(name, 'throttled')
+        count(name, 'requests')
+        try:
+            response = send(method, url, **kwargs)
+        except requests.exceptions.ConnectionError as e:
+            if attempt >= max_retries or not should_retry(method, error=e):
+                count(name, 'failures')
+                raise
+            delay = get_backoff(attempt)
+        else:
+            if response.status_code == 429:
+                count(name, 'rate_limited')
+            if attempt >= max_retries or not should_retry(method, response):
+                if not response.ok:
+                    count(name, 'failures')
+                return response
+            delay = get_retry_after(response)
+            if delay is None:
+                delay = get_backoff(attempt)
+            if bucket and response.status_code == 429:
+                bucket.pause(delay)
+        count(name, 'retries')
+        time.sleep(delay)
+        attempt += 1
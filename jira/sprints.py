@@ -1,10 +1,21 @@
+import concurrent.futures
+import datetime
 import os
-import schedule
-import time
-from jira import jira
-from slack import webhooks
+import tempfile
+from jira import boards, cron, history, jira, store, tracing
+from slack import slack, webhooks
 
-ALERT_TIME = '09:00'
+# cron expression for the burndown alert, in JACKBOT_TIMEZONE or the host's
+ALERT_SCHEDULE = os.environ.get('JACKBOT_ALERT_SCHEDULE', '0 9 * * mon-fri')
+TIMEZONE = os.environ.get('JACKBOT_TIMEZONE')
+# alerts slack did not accept are tried again this many times
+ALERT_RETRIES = int(os.environ.get('JACKBOT_ALERT_RETRIES', 3))
+ALERT_RETRY_DELAY = float(os.environ.get('JACKBOT_ALERT_RETRY_DELAY', 300))
+LEADER_LOCK = os.environ.get(
+    'JACKBOT_LEADER_LOCK',
+    os.path.join(tempfile.gettempdir(), 'jackbot-scheduler.lock')
+)
+SPRINT_FIELDS = ['status', 'issuetype', 'assignee', 'subtasks']
 live = False
 WEBHOOK_URL = os.environ.get('SLACK_LIVE_WEBHOOK_URL')
 if WEBHOOK_URL:
@@ -12,59 +23,97 @@ if WEBHOOK_URL:
 
 
 def sprint_event(sprint):
-    if sprint['originBoardId'] == jira.BOARD_ID:
-        get_sprint_issues_by_type(sprint['id'], sprint['name'])
+    board = boards.get_board(sprint['originBoardId'])
+    if board:
+        with boards.using(board), tracing.span(
+            'sprint_event', sprint=sprint['id'], board=board['id']
+        ):
+            store.put_sprint(sprint)
+            get_sprint_issues_by_type(sprint['id'], sprint['name'])
 
 
 def get_active_sprint_info():
     sprint = jira.get_active_sprint()
     if sprint:
-        get_sprint_issues_by_type(sprint['id'], sprint['name'])
+        store.put_sprint(sprint)
+        return get_sprint_issues_by_type(sprint['id'], sprint['name'])
+    return None
 
 
-def get_sprint_issues_by_type(sprint_id, sprint_name):
-    if (
+def is_tracked_sprint(sprint_name):
+    return (
         (sprint_name == 'TEST Sprint' and not live) or
         (sprint_name != 'TEST Sprint' and live)
-    ):
-        sprint_issues = jira.get_issues_for_sprint(sprint_id)
-        bugs = []
-        tasks = []
-        stories_no_subtasks = []
-        for issue in sprint_issues:
-            if issue['fields']['status']['statusCategory']['name'] != 'Done':
-                issuetype = issue['fields']['issuetype']['name']
-                assignee = None
-                if issue['fields']['assignee']:
-                    assignee = issue['fields']['assignee'].get('displayName')
-                if issuetype in ['Bug', 'Critical']:
-                    bugs.append({
-                        'key': issue['key'],
-                        'type': 'bug',
-                        'assignee': assignee
-                    })
-                elif issuetype in ['Task', 'Story Task']:
-                    tasks.append({
-                        'key': issue['key'],
-                        'type': 'task',
-                        'assignee': assignee
-                    })
-                elif issuetype == 'Story' and not issue['fields']['subtasks']:
-                    stories_no_subtasks.append({
-                        'key': issue['key'],
-                        'type': 'story',
-                        'assignee': assignee
-                    })
-        get_message_info(sprint_name, stories_no_subtasks, bugs, tasks)
-
-
-def get_message_info(sprint_name, stories, bugs, tasks):
+    )
+
+
+def get_sprint_issues_by_type(sprint_id, sprint_name):
+    if is_tracked_sprint(sprint_name):
+        sprint_issues = jira.get_issues_for_sprint(
+            sprint_id, fields=SPRINT_FIELDS + [jira.get_estimate_field()]
+        )
+        stories_no_subtasks, bugs, tasks = sort_sprint_issues(sprint_issues)
+        estimates = jira.get_estimates(
+            [issue['key'] for issue in bugs + tasks], sprint_issues
+        )
+        return get_message_info(
+            sprint_name, stories_no_subtasks, bugs, tasks, estimates,
+            sprint_id=sprint_id
+        )
+    return None
+
+
+def sort_sprint_issues(sprint_issues):
+    bugs = []
+    tasks = []
+    stories_no_subtasks = []
+    for issue in sprint_issues:
+        if issue['fields']['status']['statusCategory']['name'] != 'Done':
+            issuetype = issue['fields']['issuetype']['name']
+            assignee = None
+            if issue['fields']['assignee']:
+                assignee = issue['fields']['assignee'].get('displayName')
+            if issuetype in ['Bug', 'Critical']:
+                bugs.append({
+                    'key': issue['key'],
+                    'type': 'bug',
+                    'assignee': assignee
+                })
+            elif issuetype in ['Task', 'Story Task']:
+                tasks.append({
+                    'key': issue['key'],
+                    'type': 'task',
+                    'assignee': assignee
+                })
+            elif issuetype == 'Story' and not issue['fields']['subtasks']:
+                stories_no_subtasks.append({
+                    'key': issue['key'],
+                    'type': 'story',
+                    'assignee': assignee
+                })
+    return stories_no_subtasks, bugs, tasks
+
+
+def get_today():
+    # snapshots are dated in the timezone the board's alert is scheduled in
+    board = boards.get_current()
+    timezone = (board or {}).get('timezone') or TIMEZONE
+    return datetime.datetime.now(cron.get_timezone(timezone)).date()
+
+
+def get_message_info(
+    sprint_name, stories, bugs, tasks, estimates=None, sprint_id=None
+):
     burndown = 0
     no_subtasks = stories
     estimate_missing = []
     large_estimates = []
+    if estimates is None:
+        estimates = jira.get_estimates(
+            [issue['key'] for issue in bugs + tasks]
+        )
     for issue in bugs + tasks:
-        estimate = jira.get_estimate(issue['key'])
+        estimate = estimates[issue['key']]
         if estimate:
             burndown += estimate
             if issue['type'] == 'task' and estimate > 16:
@@ -75,17 +124,42 @@ def get_message_info(sprint_name, stories, bugs, tasks):
         'name': sprint_name,
         'burndown': int(burndown)
     }
-    webhooks.build_message(
+    if sprint_id is not None:
+        today = get_today()
+        history.record_snapshot(
+            sprint_id, sprint_name, burndown, len(estimate_missing),
+            len(large_estimates), len(no_subtasks), today,
+            jira.get_board_id()
+        )
+        sprint_info.update({'id': sprint_id, 'day': today})
+    return webhooks.build_message(
         sprint_info, no_subtasks, estimate_missing, large_estimates
     )
 
 
-def scheduler():
-    schedule.every().monday.at(ALERT_TIME).do(get_active_sprint_info)
-    schedule.every().tuesday.at(ALERT_TIME).do(get_active_sprint_info)
-    schedule.every().wednesday.at(ALERT_TIME).do(get_active_sprint_info)
-    schedule.every().thursday.at(ALERT_TIME).do(get_active_sprint_info)
-    schedule.every().friday.at(ALERT_TIME).do(get_active_sprint_info)
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+def get_board_job(board):
+
+    def run():
+        with boards.using(board):
+            delivery = get_active_sprint_info()
+        # an alert slack did not accept fails the run so it is retried, one
+        # still queued is withdrawn first so the retry doesn't send it twice
+        # and one already being sent is waited on instead
+        if delivery:
+            try:
+                delivery.result(slack.DELIVERY_TIMEOUT)
+            except concurrent.futures.TimeoutError:
+                if delivery.cancel():
+                    raise
+                delivery.result()
+
+    return cron.Job(
+        board['alert_schedule'] or ALERT_SCHEDULE, run,
+        board['timezone'] or TIMEZONE, name=f"burndown:{board['id']}",
+        retries=ALERT_RETRIES, retry_delay=ALERT_RETRY_DELAY
+    )
+
+
+def scheduler(stop=None):
+    jobs = [get_board_job(board) for board in boards.get_boards()]
+    cron.run_jobs(jobs, cron.open_leader_lock(LEADER_LOCK), stop)
@@ -0,0 +1,310 @@
+import json
+import os
+import sqlite3
+import threading
+
+# local copy of the issues and sprints jackbot has seen, kept fresh by webhook
+# payloads and periodic reconciliation so reads can skip the network
+PATH = os.environ.get('JACKBOT_STORE_PATH')
+ENABLED = bool(PATH) or (
+    os.environ.get('JACKBOT_STORE', 'false').lower() == 'true'
+)
+
+# issue key -> {'issue': payload, 'full': whether every field is present}
+issues = {}
+# sprint id -> {'sprint': payload, 'keys': member issue keys, 'complete': bool}
+sprints = {}
+lock = threading.RLock()
+connection = None
+
+
+def open_store(path=PATH):
+    global connection
+    if not path:
+        return
+    connection = sqlite3.connect(
+        path, check_same_thread=False, isolation_level=None
+    )
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS issues "
+        "(key TEXT PRIMARY KEY, data TEXT NOT NULL, full INTEGER NOT NULL)"
+    )
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS sprints "
+        "(id INTEGER PRIMARY KEY, data TEXT, keys TEXT NOT NULL)"
+    )
+    with lock:
+        for key, data, full in connection.execute("SELECT * FROM issues"):
+            issues[key] = {'issue': json.loads(data), 'full': bool(full)}
+        # membership may have changed while we were down, so sprints are only
+        # trusted again once they have been reconciled
+        for sprint_id, data, keys in connection.execute(
+            "SELECT * FROM sprints"
+        ):
+            sprints[sprint_id] = {
+                'sprint': json.loads(data) if data else None,
+                'keys': dict.fromkeys(json.loads(keys)),
+                'complete': False
+            }
+
+
+def save_issue(issue_key):
+    if not connection:
+        return
+    entry = issues.get(issue_key)
+    if entry:
+        connection.execute(
+            "INSERT OR REPLACE INTO issues VALUES (?, ?, ?)",
+            (issue_key, json.dumps(entry['issue']), int(entry['full']))
+        )
+    else:
+        connection.execute("DELETE FROM issues WHERE key = ?", (issue_key,))
+
+
+def save_sprint(sprint_id):
+    if not connection:
+        return
+    entry = sprints[sprint_id]
+    connection.execute(
+        "INSERT OR REPLACE INTO sprints VALUES (?, ?, ?)",
+        (sprint_id, json.dumps(entry['sprint']), json.dumps(
+            list(entry['keys'])
+        ))
+    )
+
+
+def get_sprint_entry(sprint_id):
+    return sprints.setdefault(sprint_id, {
+        'sprint': None,
+        'keys': {},
+        'complete': False
+    })
+
+
+def get_payload_sprint(fields):
+    # webhooks carry sprints in a custom field, the agile api reports the
+    # open one as 'sprint' so the same is done here
+    if 'sprint' in fields:
+        return fields['sprint']
+    for value in fields.values():
+        if (
+            isinstance(value, list) and value and
+            all(isinstance(item, dict) for item in value) and
+            all({'id', 'state', 'boardId'} <= item.keys() for item in value)
+        ):
+            open_sprints = [
+                sprint for sprint in value if sprint['state'] != 'closed'
+            ]
+            return open_sprints[-1] if open_sprints else None
+    return 'unknown'
+
+
+def move_issue(issue_key, sprint):
+    for sprint_id, entry in sprints.items():
+        if issue_key in entry['keys'] and (
+            not sprint or sprint['id'] != sprint_id
+        ):
+            del entry['keys'][issue_key]
+            save_sprint(sprint_id)
+    if sprint:
+        entry = get_sprint_entry(sprint['id'])
+        if not entry['sprint'] and sprint.keys() > {'id'}:
+            entry['sprint'] = sprint
+        if issue_key not in entry['keys']:
+            entry['keys'][issue_key] = None
+            save_sprint(sprint['id'])
+
+
+def get_parent_key(issue_key):
+    entry = issues.get(issue_key)
+    if not entry:
+        return None
+    return (entry['issue']['fields'].get('parent') or {}).get('key')
+
+
+def update_parent_subtask(parent_key, issue_key, status=None):
+    # stories embed their subtasks' statuses, and jira sends no webhook for
+    # the story when only a subtask changed, a status of None drops it
+    entry = issues.get(parent_key)
+    if not entry or 'subtasks' not in entry['issue']['fields']:
+        return
+    subtasks = [
+        subtask for subtask in entry['issue']['fields']['subtasks']
+        if subtask['key'] != issue_key or status is not None
+    ]
+    for index, subtask in enumerate(subtasks):
+        if subtask['key'] == issue_key:
+            subtasks[index] = {
+                **subtask, 'fields': {**subtask['fields'], 'status': status}
+            }
+            break
+    else:
+        if status is not None:
+            subtasks.append({'key': issue_key, 'fields': {'status': status}})
+    entry['issue']['fields']['subtasks'] = subtasks
+    save_issue(parent_key)
+
+
+def put_issue(issue, full=True):
+    if not ENABLED:
+        return
+    fields = dict(issue['fields'])
+    sprint = get_payload_sprint(fields)
+    with lock:
+        parent_key = (fields.get('parent') or {}).get('key')
+        previous_parent_key = get_parent_key(issue['key'])
+        if previous_parent_key and previous_parent_key != parent_key and (
+            'parent' in fields
+        ):
+            update_parent_subtask(previous_parent_key, issue['key'])
+        if parent_key and 'status' in fields:
+            update_parent_subtask(parent_key, issue['key'], fields['status'])
+        if sprint == 'unknown':
+            # without sprint information membership can not be trusted
+            for entry in sprints.values():
+                if issue['key'] in entry['keys']:
+                    entry['complete'] = False
+        else:
+            fields['sprint'] = sprint
+            move_issue(issue['key'], sprint)
+        entry = issues.get(issue['key'])
+        if entry and not full:
+            entry['issue']['fields'].update(fields)
+        else:
+            issues[issue['key']] = {
+                'issue': {**issue, 'fields': fields},
+                'full': full
+            }
+        save_issue(issue['key'])
+
+
+def remove_issue(issue_key, deleted=False):
+    if not ENABLED:
+        return
+    with lock:
+        parent_key = get_parent_key(issue_key)
+        if parent_key and deleted:
+            update_parent_subtask(parent_key, issue_key)
+        issues.pop(issue_key, None)
+        for sprint_id, entry in sprints.items():
+            if issue_key in entry['keys']:
+                if deleted:
+                    del entry['keys'][issue_key]
+                    save_sprint(sprint_id)
+                else:
+                    entry['complete'] = False
+        save_issue(issue_key)
+
+
+def update_issue_fields(issue_key, fields):
+    if not ENABLED:
+        return
+    with lock:
+        entry = issues.get(issue_key)
+        if entry:
+            entry['issue']['fields'].update(fields)
+            save_issue(issue_key)
+
+
+def put_sprint(sprint):
+    if not ENABLED:
+        return
+    with lock:
+        get_sprint_entry(sprint['id'])['sprint'] = sprint
+        save_sprint(sprint['id'])
+
+
+def put_sprint_issues(sprint_id, sprint_issues, board_id=None):
+    if not ENABLED:
+        return
+    with lock:
+        for issue in sprint_issues:
+            fields = {'sprint': {'id': sprint_id}, **issue['fields']}
+            put_issue({**issue, 'fields': fields}, full=False)
+        entry = get_sprint_entry(sprint_id)
+        if not entry['sprint'] and board_id is not None:
+            entry['sprint'] = {'id': sprint_id, 'originBoardId': board_id}
+        entry['keys'] = dict.fromkeys(issue['key'] for issue in sprint_issues)
+        entry['complete'] = True
+        save_sprint(sprint_id)
+
+
+def remove_sprint(sprint_id):
+    if not ENABLED:
+        return
+    with lock:
+        sprints.pop(sprint_id, None)
+        if connection:
+            connection.execute(
+                "DELETE FROM sprints WHERE id = ?", (sprint_id,)
+            )
+
+
+def get_sprint(sprint_id):
+    if not ENABLED:
+        return None
+    with lock:
+        sprint = (sprints.get(sprint_id) or {}).get('sprint')
+        return dict(sprint) if sprint else None
+
+
+def get_sprint_board(sprint_id):
+    with lock:
+        sprint = (sprints.get(sprint_id) or {}).get('sprint') or {}
+        return sprint.get('originBoardId', sprint.get('boardId'))
+
+
+def get_sprint_ids():
+    # closed sprints no longer change so they are not worth reconciling
+    with lock:
+        return [
+            sprint_id for sprint_id, entry in sprints.items()
+            if (entry['sprint'] or {}).get('state') != 'closed'
+        ]
+
+
+def project(issue, fields):
+    if fields is None:
+        return json.loads(json.dumps(issue))
+    return json.loads(json.dumps({
+        **issue,
+        'fields': {field: issue['fields'][field] for field in fields}
+    }))
+
+
+def get_issue(issue_key, fields=None):
+    if not ENABLED:
+        return None
+    with lock:
+        entry = issues.get(issue_key)
+        if not entry:
+            return None
+        if fields is None and not entry['full']:
+            return None
+        if fields is not None and (
+            not set(fields) <= entry['issue']['fields'].keys()
+        ):
+            return None
+        return project(entry['issue'], fields)
+
+
+def get_sprint_issues(sprint_id, fields=None):
+    if not ENABLED:
+        return None
+    with lock:
+        entry = sprints.get(sprint_id)
+        if not entry or not entry['complete']:
+            return None
+        sprint_issues = []
+        for issue_key in entry['keys']:
+            issue = get_issue(issue_key, fields)
+            if issue is None:
+                return None
+            sprint_issues.append(issue)
+        return sprint_issues
+
+
+if ENABLED:
+    open_store()
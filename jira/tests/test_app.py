@@ -1,7 +1,15 @@
 import json
+import queue
+import time
 import unittest
+import jira.app
 from unittest.mock import patch
-from jira.app import app, handle_webhook_from_q
+from jira import boards
+from jira.webhook_queue import MemoryQueue
+from jira.app import (
+    WORKERS, app, coalesce_webhooks_from_q, get_board_partitions,
+    get_event_key, get_partition, get_queue_stats, handle_webhook_from_q
+)
 
 app = app.test_client()
 
@@ -14,31 +22,248 @@ class WebhookTest(unittest.TestCase):
         mock_q_put.assert_not_called()
         self.assertEqual('JackBot is running!', response.data.decode())
 
-    def test_post_request_data_gets_put_in_q(self, mock_q_put):
+    @patch('jira.tracing.new_trace_id', return_value='abc')
+    def test_post_request_data_gets_put_in_q(
+        self, mock_new_trace_id, mock_q_put
+    ):
         response = app.post('/', data=json.dumps({"key": "value"}))
-        mock_q_put.assert_called_once_with({"key": "value"})
+        mock_q_put.assert_called_once_with(
+            {"key": "value", "jackbotTraceId": "abc"}
+        )
+        self.assertEqual(200, response.status_code)
+
+    def test_stats_reports_queue_depth(self, mock_q_put):
+        response = app.get('/stats')
+        stats = json.loads(response.data.decode())
+        self.assertIn('queued', stats)
+        self.assertEqual(0, stats['slack_outbox'])
+
+    def test_metrics_reports_queue_depth(self, mock_q_put):
+        response = app.get('/metrics')
         self.assertEqual(200, response.status_code)
+        self.assertIn('jackbot_queue_depth ', response.data.decode())
+        self.assertIn('slack_outbox_depth ', response.data.decode())
+
+
+def make_webhook(issue_key, parent=None, sprint_id=5):
+    # the shape jira cloud posts, with the sprint in a custom field
+    fields = {
+        "summary": issue_key,
+        "issuetype": {"name": "Sub-task" if parent else "Story"},
+        "project": {"key": jira.jira.PROJ_KEY},
+        "status": {"name": "In Progress"},
+        "subtasks": [],
+        "customfield_10016": 2,
+        "customfield_10020": [{
+            "id": sprint_id, "name": "TEST Sprint", "state": "active",
+            "boardId": jira.jira.BOARD_ID,
+            "startDate": "2024-03-04T09:00:00.000Z",
+            "endDate": "2024-03-18T09:00:00.000Z"
+        }]
+    }
+    if parent:
+        fields["parent"] = {"key": parent, "fields": {"summary": parent}}
+    return {
+        "timestamp": 1709550000000,
+        "webhookEvent": "jira:issue_updated",
+        "issue_event_type_name": "issue_generic",
+        "issue": {"id": "10001", "key": issue_key, "fields": fields},
+        "changelog": {"items": [{"field": "status", "toString": "Done"}]}
+    }
+
+
+class GetEventKeyTest(unittest.TestCase):
+
+    def test_sprint_events_are_keyed_by_sprint(self):
+        key = get_event_key({"sprint": {"id": 1}})
+        self.assertEqual("sprint:1", key)
+
+    def test_subtask_events_are_keyed_by_parent(self):
+        key = get_event_key({"issue": {
+            "key": "TEST-2",
+            "fields": {
+                "parent": {
+                    "key": "TEST-1"
+                }
+            }
+        }})
+        self.assertEqual("issue:TEST-1", key)
+
+    def test_issue_events_are_keyed_by_sprint_when_known(self):
+        key = get_event_key({"issue": {
+            "key": "TEST-2",
+            "fields": {
+                "sprint": {
+                    "id": 1
+                }
+            }
+        }})
+        self.assertEqual("sprint-issues:1", key)
+
+    def test_other_events_have_no_key(self):
+        self.assertIsNone(get_event_key({"anything_else": "something"}))
+
+    def test_webhooks_are_keyed_by_their_sprint_custom_field(self):
+        keys = {
+            get_event_key(make_webhook("TEST-1")),
+            get_event_key(make_webhook("TEST-2")),
+            get_event_key(make_webhook("TEST-4", parent="TEST-1"))
+        }
+        self.assertEqual({"sprint-issues:5"}, keys)
+
+    def test_closed_sprints_in_the_custom_field_are_skipped(self):
+        data = make_webhook("TEST-1")
+        data['issue']['fields']['customfield_10020'].insert(0, {
+            "id": 4, "name": "Old Sprint", "state": "closed", "boardId": 17
+        })
+        self.assertEqual("sprint-issues:5", get_event_key(data))
+
+    @patch.dict('jira.issues.story_index', {"TEST-1": {"sprint_id": 5}})
+    def test_subtasks_without_a_sprint_use_their_storys(self):
+        data = make_webhook("TEST-4", parent="TEST-1")
+        del data['issue']['fields']['customfield_10020']
+        self.assertEqual("sprint-issues:5", get_event_key(data))
+
+
+@patch('jira.app.MAX_WAIT', 60)
+@patch('jira.app.QUIET_WINDOW', 60)
+@patch('jira.app.worker_qs', [queue.Queue()])
+@patch('jira.app.q', new_callable=MemoryQueue)
+class CoalesceWebhooksFromQTest(unittest.TestCase):
+
+    @staticmethod
+    def drain():
+        events = []
+        while not jira.app.worker_qs[0].empty():
+            event = jira.app.worker_qs[0].get()
+            events.append(event if event == 'shutdown' else event['events'])
+        return events
+
+    def test_events_for_the_same_key_are_collapsed(self, mock_q):
+        for i in range(3):
+            mock_q.put({"issue": {"key": f"TEST-{i}", "fields": {
+                "parent": {
+                    "key": "TEST-9"
+                }
+            }}})
+        mock_q.put('shutdown')
+        coalesce_webhooks_from_q()
+        events = self.drain()
+        self.assertEqual(2, len(events))
+        self.assertEqual(
+            ["TEST-0", "TEST-1", "TEST-2"],
+            [data['issue']['key'] for data in events[0]]
+        )
+        self.assertEqual('shutdown', events[1])
+
+    def test_only_the_latest_event_per_issue_is_kept(self, mock_q):
+        for summary in ['first', 'second']:
+            mock_q.put({"issue": {"key": "TEST-1", "summary": summary}})
+        mock_q.put({"issue": {"key": "TEST-1", "summary": 'third'}})
+        mock_q.put('shutdown')
+        coalesce_webhooks_from_q()
+        events = self.drain()
+        self.assertEqual(
+            [[{"issue": {"key": "TEST-1", "summary": 'third'}}], 'shutdown'],
+            events
+        )
+
+    @patch('jira.app.board_partitions', {})
+    def test_stories_of_one_sprint_are_collapsed(self, mock_q):
+        for i in range(10):
+            mock_q.put(make_webhook(f"TEST-{i}"))
+        mock_q.put('shutdown')
+        coalesce_webhooks_from_q()
+        events = self.drain()
+        self.assertEqual(2, len(events))
+        self.assertEqual(10, len(events[0]))
+
+    def test_events_for_different_keys_are_kept(self, mock_q):
+        mock_q.put({"sprint": {"id": 1}})
+        mock_q.put({"sprint": {"id": 2}})
+        mock_q.put({"sprint": {"id": 1}})
+        mock_q.put('shutdown')
+        coalesce_webhooks_from_q()
+        events = self.drain()
+        self.assertEqual(
+            [[{"sprint": {"id": 1}}], [{"sprint": {"id": 2}}], 'shutdown'],
+            events
+        )
+
+    def test_other_events_get_discarded(self, mock_q):
+        mock_q.put({"anything_else": "something"})
+        mock_q.put('shutdown')
+        coalesce_webhooks_from_q()
+        self.assertEqual(['shutdown'], self.drain())
+
+    def test_collapsed_events_are_acked_together(self, mock_q):
+        mock_q.put({"sprint": {"id": 1}})
+        mock_q.put({"sprint": {"id": 1}})
+        mock_q.put('shutdown')
+        coalesce_webhooks_from_q()
+        event = jira.app.worker_qs[0].get()
+        self.drain()
+        self.assertEqual([None, None], event['event_ids'])
+
+    def test_events_are_released_after_quiet_window(self, mock_q):
+        with patch('jira.app.QUIET_WINDOW', 0):
+            mock_q.put({"sprint": {"id": 1}})
+            mock_q.put('shutdown')
+            coalesce_webhooks_from_q()
+        self.assertEqual(
+            [[{"sprint": {"id": 1}}], 'shutdown'], self.drain()
+        )
+
+    def test_events_for_unknown_boards_get_discarded(self, mock_q):
+        mock_q.put({"sprint": {"id": 1, "originBoardId": -1}})
+        mock_q.put({"issue": {"key": "NOPE-1", "fields": {
+            "project": {"key": "NOPE"}
+        }}})
+        mock_q.put('shutdown')
+        coalesce_webhooks_from_q()
+        self.assertEqual(['shutdown'], self.drain())
+
+    @patch('jira.app.board_partitions', {jira.jira.BOARD_ID: range(0, 1)})
+    def test_events_carry_their_board(self, mock_q):
+        mock_q.put({"sprint": {"id": 1, "originBoardId": jira.jira.BOARD_ID}})
+        mock_q.put('shutdown')
+        coalesce_webhooks_from_q()
+        event = jira.app.worker_qs[0].get()
+        self.drain()
+        self.assertEqual(jira.jira.BOARD_ID, event['board'])
 
 
 class HandleWebhookFromQTest(unittest.TestCase):
 
-    @patch('jira.app.q.get')
-    def mock_handle_webhook_from_q(self, webhook, mock_q_get):
-        mock_q_get.side_effect = [webhook, 'shutdown']
-        handle_webhook_from_q()
+    @patch('jira.app.partition_stats', [
+        {'processed': 0, 'failed': 0, 'last_latency': 0, 'max_latency': 0}
+    ])
+    @patch('jira.app.worker_qs', [queue.Queue()])
+    def mock_handle_webhook_from_q(self, webhook):
+        jira.app.worker_qs[0].put({
+            'key': 'key',
+            'received': time.monotonic(),
+            'event_ids': [1, 2],
+            'events': [webhook]
+        })
+        jira.app.worker_qs[0].put('shutdown')
+        handle_webhook_from_q(0)
+        return jira.app.partition_stats[0]
 
     @patch('jira.app.sprint_event')
-    @patch('jira.app.issue_event')
+    @patch('jira.app.issue_events')
     def test_issue_event_passed_to_issue_event_func(
         self, mock_issue_event, mock_sprint_event
     ):
-        webhook = {"issue": "Not None"}
+        webhook = {"issue": "Not None", "webhookEvent": "jira:issue_updated"}
         self.mock_handle_webhook_from_q(webhook)
-        mock_issue_event.assert_called_once_with("Not None")
+        mock_issue_event.assert_called_once_with(
+            [("Not None", "jira:issue_updated")]
+        )
         mock_sprint_event.assert_not_called()
 
     @patch('jira.app.sprint_event')
-    @patch('jira.app.issue_event')
+    @patch('jira.app.issue_events')
     def test_sprint_started_event_passed_to_sprint_started_func(
         self, mock_issue_event, mock_sprint_event
     ):
@@ -48,7 +273,7 @@ class HandleWebhookFromQTest(unittest.TestCase):
         mock_sprint_event.assert_called_once_with("Not None")
 
     @patch('jira.app.sprint_event')
-    @patch('jira.app.issue_event')
+    @patch('jira.app.issue_events')
     def test_other_events_get_discarded(
         self, mock_issue_event, mock_sprint_event
     ):
@@ -56,3 +281,79 @@ class HandleWebhookFromQTest(unittest.TestCase):
         self.mock_handle_webhook_from_q(webhook)
         mock_issue_event.assert_not_called()
         mock_sprint_event.assert_not_called()
+
+    @patch('jira.app.q.ack')
+    @patch('jira.app.sprint_event')
+    @patch('jira.app.issue_events')
+    def test_handled_events_are_acked(
+        self, mock_issue_event, mock_sprint_event, mock_q_ack
+    ):
+        self.mock_handle_webhook_from_q({"issue": "Not None"})
+        mock_q_ack.assert_called_once_with([1, 2])
+
+    @patch('jira.app.q.fail')
+    @patch('jira.app.q.ack')
+    @patch('jira.app.sprint_event')
+    @patch('jira.app.issue_events')
+    def test_failed_events_do_not_stop_the_worker(
+        self, mock_issue_event, mock_sprint_event, mock_q_ack, mock_q_fail
+    ):
+        mock_issue_event.side_effect = Exception
+        with patch('traceback.print_exc'):
+            stats = self.mock_handle_webhook_from_q({"issue": "Not None"})
+        mock_q_ack.assert_not_called()
+        mock_q_fail.assert_called_once()
+        self.assertEqual(1, stats['processed'])
+        self.assertEqual(1, stats['failed'])
+
+
+class PartitionTest(unittest.TestCase):
+
+    def test_same_key_always_maps_to_the_same_partition(self):
+        self.assertEqual(get_partition("sprint:1"), get_partition("sprint:1"))
+
+    @patch('jira.app.worker_qs', [queue.Queue() for _ in range(8)])
+    def test_stories_of_one_sprint_share_a_partition(self):
+        partitions = {
+            get_partition(get_event_key(make_webhook(f"TEST-{i}")))
+            for i in range(10)
+        }
+        partitions.add(get_partition(get_event_key({"sprint": {"id": 5}})))
+        self.assertEqual(1, len(partitions))
+
+    @patch('jira.app.worker_qs', [queue.Queue() for _ in range(8)])
+    def test_sprint_and_issue_events_share_a_partition(self):
+        for i in range(20):
+            self.assertEqual(
+                get_partition(f"sprint:{i}"),
+                get_partition(f"sprint-issues:{i}")
+            )
+
+    @patch('jira.app.board_partitions', {17: range(0, 2), 18: range(2, 3)})
+    def test_boards_only_use_their_own_partitions(self):
+        for i in range(20):
+            self.assertIn(get_partition(f"sprint:{i}", 17), [0, 1])
+            self.assertEqual(2, get_partition(f"sprint:{i}", 18))
+
+    @patch.dict('jira.boards.projects', clear=True)
+    @patch.dict('jira.boards.boards', clear=True)
+    def test_each_board_gets_its_workers(self):
+        boards.add_board(17, 'EDU', workers=None)
+        boards.add_board(18, 'OTHER', workers=2)
+        self.assertEqual(
+            {17: range(0, WORKERS), 18: range(WORKERS, WORKERS + 2)},
+            get_board_partitions()
+        )
+
+    @patch('jira.app.worker_qs', [queue.Queue(), queue.Queue()])
+    @patch('jira.app.partition_stats', [
+        {'processed': 1, 'failed': 0, 'last_latency': 2, 'max_latency': 2},
+        {'processed': 0, 'failed': 0, 'last_latency': 0, 'max_latency': 0}
+    ])
+    def test_get_queue_stats_reports_each_partition(self):
+        jira.app.worker_qs[1].put('event')
+        stats = get_queue_stats()
+        self.assertEqual(2, len(stats['partitions']))
+        self.assertEqual(1, stats['partitions'][0]['processed'])
+        self.assertEqual(2, stats['partitions'][0]['max_latency'])
+        self.assertEqual(1, stats['partitions'][1]['queued'])
@@ -0,0 +1,60 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from jira import boards, jira
+
+
+@patch.dict('jira.boards.projects', clear=True)
+@patch.dict('jira.boards.boards', clear=True)
+class BoardsTest(unittest.TestCase):
+
+    def test_boards_are_found_by_id_and_project(self):
+        board = boards.add_board(18, 'OTHER', workers=2)
+        self.assertIs(board, boards.get_board(18))
+        self.assertIs(board, boards.get_project_board('OTHER'))
+        self.assertIsNone(boards.get_board(19))
+        self.assertEqual(2, board['workers'])
+        self.assertIsNone(board['slack_webhook_url'])
+
+    def test_config_file_replaces_the_boards(self):
+        boards.add_board(17, 'OLD')
+        config = {'boards': [
+            {'id': 18, 'project': 'A', 'slack_webhook_url': 'https://a'},
+            {'id': 19, 'project': 'B', 'alert_schedule': '0 8 * * *'}
+        ]}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'boards.json')
+            with open(path, 'w') as outfile:
+                json.dump(config, outfile)
+            boards.load_config(path)
+        self.assertEqual([18, 19], [b['id'] for b in boards.get_boards()])
+        self.assertEqual(
+            'https://a', boards.get_board(18)['slack_webhook_url']
+        )
+        self.assertEqual('0 8 * * *', boards.get_board(19)['alert_schedule'])
+        self.assertIsNone(boards.get_project_board('OLD'))
+
+    def test_a_project_can_only_be_served_by_one_board(self):
+        boards.add_board(18, 'OTHER')
+        boards.add_board(18, 'OTHER', workers=2)
+        with self.assertRaises(ValueError):
+            boards.add_board(19, 'OTHER')
+        self.assertEqual(2, boards.get_project_board('OTHER')['workers'])
+        self.assertIsNone(boards.get_board(19))
+
+    def test_default_board_is_only_added_without_a_config(self):
+        boards.set_default(17, 'EDU')
+        boards.set_default(18, 'OTHER')
+        self.assertEqual([17], [b['id'] for b in boards.get_boards()])
+
+    def test_current_board_is_used_by_jira_helpers(self):
+        board = boards.add_board(18, 'OTHER')
+        self.assertEqual(jira.BOARD_ID, jira.get_board_id())
+        with boards.using(board):
+            self.assertIs(board, boards.get_current())
+            self.assertEqual(18, jira.get_board_id())
+            self.assertEqual('OTHER', jira.get_project_key())
+        self.assertIsNone(boards.get_current())
+        self.assertEqual(jira.PROJ_KEY, jira.get_project_key())
@@ -0,0 +1,154 @@
+import datetime
+import os
+import tempfile
+import threading
+import unittest
+import zoneinfo
+from unittest.mock import Mock, patch
+from jira import cron
+
+LONDON = zoneinfo.ZoneInfo('Europe/London')
+
+
+class ParseTest(unittest.TestCase):
+
+    def test_fields_support_lists_ranges_steps_and_names(self):
+        minutes, hours, days, months, weekdays, either = cron.parse(
+            '0,30 */6 1-3 jan-mar mon-fri'
+        )
+        self.assertEqual({0, 30}, minutes)
+        self.assertEqual({0, 6, 12, 18}, hours)
+        self.assertEqual({1, 2, 3}, days)
+        self.assertEqual({1, 2, 3}, months)
+        self.assertEqual({1, 2, 3, 4, 5}, weekdays)
+        self.assertTrue(either)
+
+    def test_only_a_bare_star_leaves_the_day_unrestricted(self):
+        self.assertFalse(cron.parse('0 9 * * mon')[5])
+        self.assertTrue(cron.parse('0 9 */2 * mon')[5])
+        self.assertTrue(cron.parse('0 9 1 * */2')[5])
+
+    def test_stepped_days_match_either_day_field(self):
+        parsed = cron.parse('0 9 */2 * mon')
+        # the 3rd of march 2024 was a sunday, the 4th a monday
+        self.assertTrue(cron.matches_day(parsed, datetime.date(2024, 3, 3)))
+        self.assertTrue(cron.matches_day(parsed, datetime.date(2024, 3, 4)))
+        self.assertFalse(cron.matches_day(parsed, datetime.date(2024, 3, 6)))
+
+    def test_seven_is_sunday(self):
+        self.assertEqual({0}, cron.parse('* * * * 7')[4])
+
+    def test_invalid_expressions_are_rejected(self):
+        self.assertRaises(ValueError, cron.parse, '* * * *')
+        self.assertRaises(ValueError, cron.parse, '60 * * * *')
+
+
+class GetNextTest(unittest.TestCase):
+
+    def test_weekday_alerts_skip_the_weekend(self):
+        parsed = cron.parse('0 9 * * mon-fri')
+        friday = datetime.datetime(2024, 3, 1, 9, 0, tzinfo=LONDON)
+        self.assertEqual(
+            datetime.datetime(2024, 3, 4, 9, 0, tzinfo=LONDON),
+            cron.get_next(parsed, friday)
+        )
+
+    def test_same_day_match_later_on(self):
+        parsed = cron.parse('0 9 * * *')
+        morning = datetime.datetime(2024, 3, 1, 8, 59, 30, tzinfo=LONDON)
+        self.assertEqual(
+            datetime.datetime(2024, 3, 1, 9, 0, tzinfo=LONDON),
+            cron.get_next(parsed, morning)
+        )
+
+    def test_times_skipped_by_daylight_saving_are_skipped(self):
+        parsed = cron.parse('30 1 * * *')
+        before = datetime.datetime(2024, 3, 30, 12, 0, tzinfo=LONDON)
+        self.assertEqual(
+            datetime.datetime(2024, 4, 1, 1, 30, tzinfo=LONDON),
+            cron.get_next(parsed, before)
+        )
+
+    def test_day_of_month_or_day_of_week(self):
+        parsed = cron.parse('0 0 15 * fri')
+        after = datetime.datetime(2024, 3, 2, tzinfo=LONDON)
+        self.assertEqual(
+            datetime.datetime(2024, 3, 8, tzinfo=LONDON),
+            cron.get_next(parsed, after)
+        )
+
+    def test_jobs_use_their_timezone(self):
+        job = cron.Job('0 9 * * *', Mock(__name__='job'), 'America/New_York')
+        after = datetime.datetime(
+            2024, 3, 1, 12, 0, tzinfo=datetime.timezone.utc
+        )
+        self.assertEqual(
+            datetime.datetime(2024, 3, 1, 14, 0, tzinfo=datetime.timezone.utc),
+            job.get_next(after)
+        )
+
+
+class LeaderLockTest(unittest.TestCase):
+
+    def test_only_one_holder_at_a_time(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'leader.lock')
+            leader = cron.LeaderLock(path)
+            follower = cron.LeaderLock(path)
+            self.assertTrue(leader.acquire())
+            self.assertTrue(leader.acquire())
+            self.assertFalse(follower.acquire())
+            leader.release()
+            self.assertTrue(follower.acquire())
+            follower.release()
+
+
+class RunJobsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stop = threading.Event()
+        self.func = Mock(__name__='job')
+        self.job = cron.Job('0 9 * * *', self.func)
+        now = datetime.datetime.now(self.job.timezone)
+        later = now + datetime.timedelta(days=1)
+
+        def get_next(after=None):
+            if self.job.get_next.call_count > 1:
+                self.stop.set()
+                return later
+            return now - datetime.timedelta(seconds=1)
+        self.job.get_next = Mock(side_effect=get_next)
+
+    def test_due_jobs_run(self):
+        cron.run_jobs([self.job], stop=self.stop)
+        self.func.assert_called_once()
+
+    def test_followers_stay_idle(self):
+        lock = Mock()
+        lock.acquire.return_value = False
+        cron.run_jobs([self.job], lock, self.stop)
+        self.func.assert_not_called()
+
+    def test_failing_jobs_do_not_stop_the_scheduler(self):
+        self.func.side_effect = ValueError()
+        with patch('traceback.print_exc'):
+            cron.run_jobs([self.job], stop=self.stop)
+        self.assertEqual(2, self.job.get_next.call_count)
+
+    def test_failed_runs_are_retried(self):
+        self.job.retries = 2
+        self.job.retry_delay = 0
+        self.func.side_effect = [ValueError(), None]
+        with patch('traceback.print_exc'):
+            cron.run_jobs([self.job], stop=self.stop)
+        self.assertEqual(2, self.func.call_count)
+        self.assertEqual(0, self.job.failures)
+
+    def test_retries_give_up_until_the_next_run(self):
+        self.job.retries = 1
+        self.job.retry_delay = 0
+        self.func.side_effect = ValueError()
+        with patch('traceback.print_exc'):
+            cron.run_jobs([self.job], stop=self.stop)
+        self.assertEqual(2, self.func.call_count)
+        self.assertEqual(2, self.job.get_next.call_count)
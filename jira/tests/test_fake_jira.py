@@ -0,0 +1,47 @@
+import requests
+import unittest
+from unittest.mock import patch
+from functional_tests.fake_jira import ACCOUNT_ID, ESTIMATE_FIELD, FakeJira
+from jira import jira
+
+
+@patch('jira.jira.bucket', None)
+@patch.dict('jira.jira.estimate_fields', clear=True)
+@patch('jira.jira.account_id', None)
+class FakeJiraTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeJira(page_size=2).start()
+        self.addCleanup(self.fake.stop)
+        patcher = patch('jira.jira.SERVER', self.fake.url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sprint_issues_are_paginated(self):
+        sprint = self.fake.seed_sprint(stories=2, subtasks=1, bugs=1, tasks=0)
+        issues = jira.get_issues_for_sprint(sprint['id'], fields=['status'])
+        self.assertEqual(5, len(issues))
+        self.assertEqual(
+            3, self.fake.requests['GET', '/rest/agile/1.0/sprint/{id}/issue']
+        )
+
+    def test_writes_are_visible_to_reads(self):
+        issue = jira.create_issue('Story', 'summary')
+        jira.update_estimate(issue['key'], 3)
+        jira.assign_issue(issue['key'])
+        jira.transition_issue(issue['key'], 'In Progress')
+        self.assertEqual(ESTIMATE_FIELD, jira.get_estimate_field())
+        self.assertEqual({issue['key']: 3}, jira.get_estimates([issue['key']]))
+        fields = jira.get_issue(issue['key'])['fields']
+        self.assertEqual('In Progress', fields['status']['name'])
+        self.assertEqual(ACCOUNT_ID, fields['assignee']['accountId'])
+
+    @patch('jira.retry.time.sleep')
+    def test_injected_rate_limits_are_retried(self, mock_sleep):
+        self.fake.rate_limit_rate = 1
+        self.fake.retry_after = 0
+        self.assertRaises(
+            requests.exceptions.HTTPError, jira.get_active_sprint
+        )
+        self.fake.rate_limit_rate = 0
+        self.assertIsNone(jira.get_active_sprint())
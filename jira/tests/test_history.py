@@ -0,0 +1,81 @@
+import datetime
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from jira import history
+
+DAY = datetime.date(2024, 3, 4)
+
+
+class HistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'history.db')
+        patcher = patch('jira.history.connection', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp_dir.cleanup)
+        history.open_history(self.path)
+        self.addCleanup(lambda: history.connection.close())
+
+    def test_snapshots_are_returned_in_day_order(self):
+        for i in [2, 0, 1]:
+            history.record_snapshot(
+                1, 'TEST Sprint', 30 - i, day=DAY + datetime.timedelta(i)
+            )
+        snapshots = history.get_snapshots(1)
+        self.assertEqual([30, 29, 28], [s['remaining'] for s in snapshots])
+        self.assertEqual(DAY, snapshots[0]['day'])
+
+    def test_later_snapshot_replaces_the_days_earlier_one(self):
+        history.record_snapshot(1, 'TEST Sprint', 30, 2, 1, day=DAY)
+        history.record_snapshot(1, 'TEST Sprint', 25, 1, 0, day=DAY)
+        snapshots = history.get_snapshots(1)
+        self.assertEqual(1, len(snapshots))
+        self.assertEqual(25, snapshots[0]['remaining'])
+        self.assertEqual(1, snapshots[0]['estimate_missing'])
+        self.assertEqual(0, snapshots[0]['large_estimates'])
+
+    def test_snapshots_are_looked_up_by_date(self):
+        for i in range(5):
+            history.record_snapshot(
+                1, 'TEST Sprint', 10, day=DAY + datetime.timedelta(i)
+            )
+        history.record_snapshot(2, 'OTHER Sprint', 5, day=DAY, board_id=18)
+        snapshots = history.get_snapshots(
+            1, DAY + datetime.timedelta(1), DAY + datetime.timedelta(2)
+        )
+        self.assertEqual(2, len(snapshots))
+        self.assertEqual(
+            [1, 2], [s['sprint_id'] for s in history.get_day_snapshots(DAY)]
+        )
+        self.assertEqual(
+            [2], [s['sprint_id'] for s in history.get_day_snapshots(DAY, 18)]
+        )
+
+    def test_snapshots_survive_a_restart(self):
+        history.record_snapshot(1, 'TEST Sprint', 30, day=DAY)
+        history.connection.close()
+        history.open_history(self.path)
+        self.assertEqual(30, history.get_snapshots(1)[0]['remaining'])
+
+    def test_burn_is_the_drop_between_snapshots(self):
+        snapshots = [
+            {'day': DAY, 'remaining': 30},
+            {'day': DAY + datetime.timedelta(1), 'remaining': 24},
+            {'day': DAY + datetime.timedelta(2), 'remaining': 26}
+        ]
+        self.assertEqual([
+            (DAY + datetime.timedelta(1), 6),
+            (DAY + datetime.timedelta(2), -2)
+        ], history.get_burned(snapshots))
+
+
+@patch('jira.history.connection', None)
+class DisabledHistoryTest(unittest.TestCase):
+
+    def test_disabled_history_records_nothing(self):
+        history.record_snapshot(1, 'TEST Sprint', 30)
+        self.assertEqual([], history.get_snapshots(1))
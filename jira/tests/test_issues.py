@@ -1,15 +1,55 @@
 import requests
 import unittest
-from unittest.mock import patch
+from unittest.mock import ANY, patch
 from jira import jira
 from jira.issues import (
-    issue_event, get_issue_sprint, round_sprint_issue_estimates,
-    get_sprint_stories, set_story_status, set_story_estimate,
-    get_backlog_parent_issue, set_backlog_parent_issue_status,
-    set_backlog_parent_issue_assignee, set_backlog_parent_issue_estimate
+    ISSUE_FIELDS, story_index, issue_events, issue_event, store_issue,
+    reconcile_store, index_story, clear_sprint_from_index,
+    update_indexed_story, get_issue_sprint,
+    round_sprint_issue_estimates,
+    get_sprint_stories, set_story_status,
+    set_story_estimate, get_backlog_parent_issue,
+    set_backlog_parent_issue_status, set_backlog_parent_issue_assignee,
+    set_backlog_parent_issue_estimate
 )
 
 
+@patch('jira.issues.issue_event')
+class IssueEventsTest(unittest.TestCase):
+
+    events = [
+        ({"key": "TEST-1"}, "jira:issue_updated"),
+        ({"key": "TEST-2"}, "jira:issue_deleted")
+    ]
+
+    def test_every_event_is_handled_incrementally(self, mock_issue_event):
+        issue_events(self.events)
+        self.assertEqual(2, mock_issue_event.call_count)
+        mock_issue_event.assert_called_with(
+            {"key": "TEST-2"}, "jira:issue_deleted", set()
+        )
+
+    def test_stories_are_handled_before_subtasks(self, mock_issue_event):
+        subtask = {"key": "TEST-2", "fields": {"parent": {"key": "TEST-1"}}}
+        story = {"key": "TEST-1", "fields": {}}
+        issue_events([
+            (subtask, "jira:issue_updated"), (story, "jira:issue_updated")
+        ])
+        self.assertEqual(
+            [story, subtask],
+            [call[0][0] for call in mock_issue_event.call_args_list]
+        )
+
+    @patch('jira.issues.INCREMENTAL', False)
+    def test_only_latest_event_is_handled_without_incremental_mode(
+        self, mock_issue_event
+    ):
+        issue_events(self.events)
+        mock_issue_event.assert_called_once_with(
+            {"key": "TEST-2"}, "jira:issue_deleted", set()
+        )
+
+
 @patch('jira.issues.get_issue_sprint')
 class IssueEventTest(unittest.TestCase):
 
@@ -32,6 +72,179 @@ class IssueEventTest(unittest.TestCase):
         issue_event(self.issue)
         mock_get_issue_sprint.assert_not_called()
 
+    @patch('jira.issues.update_indexed_story')
+    def test_indexed_stories_skip_the_sprint_rescan(
+        self, mock_update_indexed_story, mock_get_issue_sprint
+    ):
+        self.issue['fields']['project']['key'] = jira.PROJ_KEY
+        mock_update_indexed_story.return_value = True
+        issue_event(self.issue, "jira:issue_updated")
+        mock_update_indexed_story.assert_called_once_with(
+            self.issue, "jira:issue_updated"
+        )
+        mock_get_issue_sprint.assert_not_called()
+
+    @patch('jira.issues.update_indexed_story')
+    def test_a_sprint_is_rescanned_once_per_batch(
+        self, mock_update_indexed_story, mock_get_issue_sprint
+    ):
+        mock_update_indexed_story.return_value = False
+        mock_get_issue_sprint.return_value = 1
+        stories = [
+            {"key": issue_key, "fields": {
+                "project": {"key": jira.PROJ_KEY},
+                "customfield_10020": [
+                    {"id": 1, "state": "active", "boardId": jira.BOARD_ID}
+                ]
+            }}
+            for issue_key in ["TEST-1", "TEST-2"]
+        ]
+        issue_events([(story, "jira:issue_updated") for story in stories])
+        mock_get_issue_sprint.assert_called_once_with("TEST-1")
+        mock_update_indexed_story.assert_called_once_with(
+            stories[0], "jira:issue_updated"
+        )
+
+
+@patch.dict('jira.jira.estimate_fields', {jira.BOARD_ID: 'customfield_1'})
+@patch('jira.issues.set_story_estimate')
+@patch('jira.issues.set_story_status')
+@patch('jira.jira.update_estimate')
+class UpdateIndexedStoryTest(unittest.TestCase):
+
+    story = {
+        "key": "TEST-1",
+        "fields": {
+            "sprint": {"id": 1},
+            "status": {"name": "In Progress"},
+            "subtasks": []
+        }
+    }
+
+    subtasks = [
+        {"key": "TEST-2", "fields": {"status": {"name": "Done"}}},
+        {"key": "TEST-3", "fields": {"status": {"name": "Backlog"}}}
+    ]
+
+    def setUp(self):
+        patcher = patch.dict(story_index, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        index_story(self.story, self.subtasks, {
+            "TEST-1": 5, "TEST-2": 2, "TEST-3": 3
+        })
+
+    @staticmethod
+    def subtask_event(status, estimate):
+        return {"key": "TEST-3", "fields": {
+            "parent": {"key": "TEST-1"},
+            "status": {"name": status},
+            "customfield_1": estimate
+        }}
+
+    def test_rolls_up_story_from_index(
+        self, mock_update_estimate, mock_set_story_status,
+        mock_set_story_estimate
+    ):
+        updated = update_indexed_story(self.subtask_event("Done", 4))
+        self.assertTrue(updated)
+        story = mock_set_story_status.call_args[0][0]
+        self.assertEqual("TEST-1", story['key'])
+        self.assertEqual(
+            ["Done", "Done"],
+            [
+                subtask['fields']['status']['name']
+                for subtask in story['fields']['subtasks']
+            ]
+        )
+        mock_set_story_estimate.assert_called_once_with(
+            story, {"TEST-1": 5, "TEST-2": 2, "TEST-3": 4}, ANY
+        )
+        mock_update_estimate.assert_not_called()
+
+    def test_rounds_up_fractional_subtask_estimate(
+        self, mock_update_estimate, mock_set_story_status,
+        mock_set_story_estimate
+    ):
+        update_indexed_story(self.subtask_event("Backlog", 2.5))
+        mock_update_estimate.assert_called_once_with("TEST-3", 3)
+
+    @patch('builtins.print')
+    def test_failed_writes_leave_the_story_unindexed(
+        self, mock_print, mock_update_estimate, mock_set_story_status,
+        mock_set_story_estimate
+    ):
+        mock_update_estimate.side_effect = requests.exceptions.HTTPError()
+        with self.assertRaises(requests.exceptions.HTTPError):
+            update_indexed_story(self.subtask_event("Backlog", 2.5))
+        self.assertNotIn("TEST-1", story_index)
+
+    def test_deleted_subtasks_are_dropped(
+        self, mock_update_estimate, mock_set_story_status,
+        mock_set_story_estimate
+    ):
+        update_indexed_story(
+            self.subtask_event("Backlog", 3), "jira:issue_deleted"
+        )
+        mock_set_story_estimate.assert_called_once_with(
+            mock_set_story_status.call_args[0][0],
+            {"TEST-1": 5, "TEST-2": 2},
+            ANY
+        )
+
+    def test_archived_subtasks_are_ignored(
+        self, mock_update_estimate, mock_set_story_status,
+        mock_set_story_estimate
+    ):
+        update_indexed_story(self.subtask_event("Archive", 3))
+        story = mock_set_story_status.call_args[0][0]
+        self.assertEqual(
+            ["TEST-2"], [s['key'] for s in story['fields']['subtasks']]
+        )
+
+    def test_unindexed_parents_fall_back_to_rescan(
+        self, mock_update_estimate, mock_set_story_status,
+        mock_set_story_estimate
+    ):
+        issue = self.subtask_event("Done", 1)
+        issue['fields']['parent']['key'] = "TEST-9"
+        self.assertFalse(update_indexed_story(issue))
+        mock_set_story_status.assert_not_called()
+
+    def test_story_events_drop_the_story_from_index(
+        self, mock_update_estimate, mock_set_story_status,
+        mock_set_story_estimate
+    ):
+        self.assertFalse(update_indexed_story({"key": "TEST-1", "fields": {}}))
+        self.assertNotIn("TEST-1", story_index)
+
+    def test_story_events_echoing_the_rollup_keep_the_index(
+        self, mock_update_estimate, mock_set_story_status,
+        mock_set_story_estimate
+    ):
+        story = {"key": "TEST-1", "fields": {
+            "customfield_10020": [
+                {"id": 1, "state": "active", "boardId": jira.BOARD_ID}
+            ],
+            "status": {"name": "In Progress"},
+            "customfield_1": 5.0,
+            "subtasks": self.subtasks
+        }}
+        self.assertTrue(update_indexed_story(story, "jira:issue_updated"))
+        self.assertIn("TEST-1", story_index)
+        story['fields']['customfield_1'] = 8.0
+        self.assertFalse(update_indexed_story(story, "jira:issue_updated"))
+        self.assertNotIn("TEST-1", story_index)
+
+    def test_rescanning_a_sprint_clears_its_stories(
+        self, mock_update_estimate, mock_set_story_status,
+        mock_set_story_estimate
+    ):
+        clear_sprint_from_index(2)
+        self.assertIn("TEST-1", story_index)
+        clear_sprint_from_index(1)
+        self.assertNotIn("TEST-1", story_index)
+
 
 @patch('jira.issues.get_backlog_parent_issue')
 @patch('jira.issues.round_sprint_issue_estimates')
@@ -54,6 +267,7 @@ class GetIssueSprintTest(unittest.TestCase):
         self.issue['fields']['sprint'] = {"id": 1}
         mock_get_issue.return_value = self.issue
         get_issue_sprint("TEST-1")
+        mock_get_issue.assert_called_once_with("TEST-1", fields=ISSUE_FIELDS)
         mock_round_sprint_issue_estimates.assert_called_once_with(1)
         mock_get_backlog_parent_issue.assert_not_called()
 
@@ -77,9 +291,64 @@ class GetIssueSprintTest(unittest.TestCase):
         mock_get_backlog_parent_issue.assert_not_called()
 
 
+@patch('jira.issues.store')
+class StoreIssueTest(unittest.TestCase):
+
+    def test_payloads_are_stored(self, mock_store):
+        store_issue({'key': 'TEST-1'}, 'jira:issue_updated')
+        mock_store.put_issue.assert_called_once_with({'key': 'TEST-1'})
+
+    def test_deleted_issues_are_removed(self, mock_store):
+        store_issue({'key': 'TEST-1'}, 'jira:issue_deleted')
+        mock_store.remove_issue.assert_called_once_with(
+            'TEST-1', deleted=True
+        )
+
+
+@patch.dict('jira.jira.estimate_fields', {jira.BOARD_ID: 'customfield_1'})
+@patch('jira.jira.iter_issues_for_sprint')
+@patch('jira.issues.store')
+class ReconcileStoreTest(unittest.TestCase):
+
+    def test_known_sprints_are_refetched(
+        self, mock_store, mock_iter_issues_for_sprint
+    ):
+        mock_store.get_sprint_ids.return_value = [1]
+        mock_store.get_sprint_board.return_value = jira.BOARD_ID
+        mock_iter_issues_for_sprint.return_value = iter([{'key': 'TEST-1'}])
+        reconcile_store()
+        mock_iter_issues_for_sprint.assert_called_once_with(
+            1, ordered=True, fields=ISSUE_FIELDS + ['customfield_1']
+        )
+        mock_store.put_sprint_issues.assert_called_once_with(
+            1, [{'key': 'TEST-1'}], jira.BOARD_ID
+        )
+
+    def test_sprints_of_unknown_boards_are_skipped(
+        self, mock_store, mock_iter_issues_for_sprint
+    ):
+        mock_store.get_sprint_ids.return_value = [1]
+        mock_store.get_sprint_board.return_value = jira.BOARD_ID + 1
+        reconcile_store()
+        mock_iter_issues_for_sprint.assert_not_called()
+
+    def test_deleted_sprints_are_dropped(
+        self, mock_store, mock_iter_issues_for_sprint
+    ):
+        mock_store.get_sprint_ids.return_value = [1]
+        mock_store.get_sprint_board.return_value = None
+        http_404_error = requests.exceptions.HTTPError()
+        http_404_error.response = requests.Response()
+        http_404_error.response.status_code = 404
+        mock_iter_issues_for_sprint.side_effect = http_404_error
+        reconcile_store()
+        mock_store.remove_sprint.assert_called_once_with(1)
+
+
+@patch.dict('jira.jira.estimate_fields', {jira.BOARD_ID: 'customfield_1'})
 @patch('jira.issues.get_sprint_stories')
 @patch('jira.jira.update_estimate')
-@patch('jira.jira.get_estimate')
+@patch('jira.jira.get_estimates')
 @patch('jira.jira.get_issues_for_sprint')
 class RoundSprintIssueEstimatesTest(unittest.TestCase):
 
@@ -93,30 +362,37 @@ class RoundSprintIssueEstimatesTest(unittest.TestCase):
     }]
 
     def test_rounds_up_fractional_estimates(
-        self, mock_get_issues_for_sprint, mock_get_estimate,
+        self, mock_get_issues_for_sprint, mock_get_estimates,
         mock_update_estimate, mock_get_sprint_story_subtasks
     ):
         mock_get_issues_for_sprint.return_value = self.sprint_issues
-        mock_get_estimate.return_value = 7.2
+        mock_get_estimates.return_value = {'TEST-1': 7.2}
         round_sprint_issue_estimates(1)
+        mock_get_issues_for_sprint.assert_called_once_with(
+            1, fields=ISSUE_FIELDS + ['customfield_1']
+        )
+        mock_get_estimates.assert_called_once_with(
+            ['TEST-1'], self.sprint_issues
+        )
         mock_update_estimate.assert_called_once_with('TEST-1', 8)
         mock_get_sprint_story_subtasks.assert_called_once_with(
-            self.sprint_issues
+            self.sprint_issues, {'TEST-1': 8}, ANY
         )
 
     def test_ignores_integer_estimates(
-        self, mock_get_issues_for_sprint, mock_get_estimate,
+        self, mock_get_issues_for_sprint, mock_get_estimates,
         mock_update_estimate, mock_get_sprint_story_subtasks
     ):
         mock_get_issues_for_sprint.return_value = self.sprint_issues
-        mock_get_estimate.return_value = 5
+        mock_get_estimates.return_value = {'TEST-1': 5}
         round_sprint_issue_estimates(1)
         mock_update_estimate.assert_not_called()
         mock_get_sprint_story_subtasks.assert_called_once_with(
-            self.sprint_issues
+            self.sprint_issues, {'TEST-1': 5}, ANY
         )
 
 
+@patch('jira.issues.index_story')
 @patch('jira.issues.set_story_estimate')
 @patch('jira.issues.set_story_status')
 class GetSprintStoriesTest(unittest.TestCase):
@@ -129,22 +405,44 @@ class GetSprintStoriesTest(unittest.TestCase):
         }
     }]
 
-    def test_gets_stories(self, mock_set_story_status, mock_set_story_estimate):
+    def test_gets_stories(
+        self, mock_set_story_status, mock_set_story_estimate,
+        mock_index_story
+    ):
         self.sprint_issues[0]['fields']['issuetype']['name'] = 'Story'
         get_sprint_stories(self.sprint_issues)
-        mock_set_story_status.assert_called_once_with(self.sprint_issues[0])
-        mock_set_story_estimate.assert_called_once_with(self.sprint_issues[0])
+        mock_set_story_status.assert_called_once_with(
+            self.sprint_issues[0], ANY
+        )
+        mock_set_story_estimate.assert_called_once_with(
+            self.sprint_issues[0], None, ANY
+        )
 
     def test_ignores_non_stories(
-        self, mock_set_story_status, mock_set_story_estimate
+        self, mock_set_story_status, mock_set_story_estimate,
+        mock_index_story
     ):
         self.sprint_issues[0]['fields']['issuetype']['name'] = 'Bug'
         get_sprint_stories(self.sprint_issues)
         mock_set_story_status.assert_not_called()
         mock_set_story_estimate.assert_not_called()
 
+    def test_passes_estimates_along(
+        self, mock_set_story_status, mock_set_story_estimate,
+        mock_index_story
+    ):
+        self.sprint_issues[0]['fields']['issuetype']['name'] = 'Story'
+        get_sprint_stories(self.sprint_issues, {'TEST-1': 3})
+        mock_set_story_estimate.assert_called_once_with(
+            self.sprint_issues[0], {'TEST-1': 3}, ANY
+        )
+        mock_index_story.assert_called_once_with(
+            self.sprint_issues[0], [], {'TEST-1': 3}
+        )
+
     def test_ignores_archived_subtasks(
-        self, mock_set_story_status, mock_set_story_estimate
+        self, mock_set_story_status, mock_set_story_estimate,
+        mock_index_story
     ):
         self.sprint_issues[0]['fields']['issuetype']['name'] = 'Story'
         self.sprint_issues[0]['fields']['subtasks'].append({
@@ -156,8 +454,12 @@ class GetSprintStoriesTest(unittest.TestCase):
         })
         get_sprint_stories(self.sprint_issues)
         self.sprint_issues[0]['fields']['subtasks'].clear()
-        mock_set_story_status.assert_called_once_with(self.sprint_issues[0])
-        mock_set_story_estimate.assert_called_once_with(self.sprint_issues[0])
+        mock_set_story_status.assert_called_once_with(
+            self.sprint_issues[0], ANY
+        )
+        mock_set_story_estimate.assert_called_once_with(
+            self.sprint_issues[0], None, ANY
+        )
 
 
 @patch('jira.jira.transition_issue')
@@ -181,7 +483,20 @@ class SetStoryStatusTest(unittest.TestCase):
         self.story['fields']['status']['name'] = 'Not Backlog'
         self.story['fields']['subtasks'].clear()
         set_story_status(self.story)
-        mock_transition_issue.assert_called_once_with("TEST-1", "Backlog")
+        mock_transition_issue.assert_called_once_with(
+            "TEST-1", "Backlog", issue_type="Story", status="Not Backlog"
+        )
+
+    @patch('builtins.print')
+    @patch('jira.plan.DRY_RUN', True)
+    def test_dry_run_keeps_the_story_status(
+        self, mock_print, mock_transition_issue
+    ):
+        self.story['fields']['status']['name'] = 'Not Backlog'
+        self.story['fields']['subtasks'].clear()
+        set_story_status(self.story)
+        mock_transition_issue.assert_not_called()
+        self.assertEqual('Not Backlog', self.story['fields']['status']['name'])
 
     def test_bocklogs_issue_when_all_subtasks_are_backlog(
         self, mock_transition_issue
@@ -190,7 +505,9 @@ class SetStoryStatusTest(unittest.TestCase):
         self.subtask['fields']['status']['name'] = 'Backlog'
         self.story['fields']['subtasks'].append(self.subtask)
         set_story_status(self.story)
-        mock_transition_issue.assert_called_once_with("TEST-1", "Backlog")
+        mock_transition_issue.assert_called_once_with(
+            "TEST-1", "Backlog", issue_type="Story", status="Not Backlog"
+        )
 
     def test_set_story_status_sets_status_to_po_review_when_all_subtasks_done(
         self, mock_transition_issue
@@ -199,7 +516,9 @@ class SetStoryStatusTest(unittest.TestCase):
         self.subtask['fields']['status']['name'] = 'Done'
         self.story['fields']['subtasks'].append(self.subtask)
         set_story_status(self.story)
-        mock_transition_issue.assert_called_once_with("TEST-1", "PO Review")
+        mock_transition_issue.assert_called_once_with(
+            "TEST-1", "PO Review", issue_type="Story", status="Not PO Review"
+        )
 
     def test_set_story_status_ignores_done_issues_when_all_subtasks_done(
         self, mock_transition_issue
@@ -224,7 +543,10 @@ class SetStoryStatusTest(unittest.TestCase):
             }
         })
         set_story_status(self.story)
-        mock_transition_issue.assert_called_once_with("TEST-1", "In Progress")
+        mock_transition_issue.assert_called_once_with(
+            "TEST-1", "In Progress", issue_type="Story",
+            status="Not In Progress"
+        )
 
     def test_set_story_status_ignores_correct_status(
         self, mock_transition_issue
@@ -236,7 +558,7 @@ class SetStoryStatusTest(unittest.TestCase):
 
 
 @patch('jira.jira.update_estimate')
-@patch('jira.jira.get_estimate')
+@patch('jira.jira.get_estimates')
 class SetStoryEstimateTest(unittest.TestCase):
 
     story = {
@@ -254,26 +576,44 @@ class SetStoryEstimateTest(unittest.TestCase):
     }
 
     def test_adds_up_issues_correctly(
-        self, mock_get_estimate, mock_update_estimate
+        self, mock_get_estimates, mock_update_estimate
     ):
-        mock_get_estimate.side_effect = [None, 2, 5]
+        mock_get_estimates.return_value = {
+            'TEST-1': None, 'TEST-2': 2, 'TEST-3': 5
+        }
         set_story_estimate(self.story)
+        mock_get_estimates.assert_called_once_with(
+            ['TEST-1', 'TEST-2', 'TEST-3']
+        )
         mock_update_estimate.assert_called_once_with("TEST-1", 7)
 
     def test_ignores_missing_estimates(
-        self, mock_get_estimate, mock_update_estimate
+        self, mock_get_estimates, mock_update_estimate
     ):
-        mock_get_estimate.side_effect = [11, 8, None]
+        mock_get_estimates.return_value = {
+            'TEST-1': 11, 'TEST-2': 8, 'TEST-3': None
+        }
         set_story_estimate(self.story)
         mock_update_estimate.assert_called_once_with("TEST-1", 8)
 
     def test_ignores_correct_estimates(
-        self, mock_get_estimate, mock_update_estimate
+        self, mock_get_estimates, mock_update_estimate
     ):
-        mock_get_estimate.side_effect = [11, 8, 3]
+        mock_get_estimates.return_value = {
+            'TEST-1': 11, 'TEST-2': 8, 'TEST-3': 3
+        }
         set_story_estimate(self.story)
         mock_update_estimate.assert_not_called()
 
+    def test_uses_estimates_passed_in(
+        self, mock_get_estimates, mock_update_estimate
+    ):
+        set_story_estimate(self.story, {
+            'TEST-1': 4, 'TEST-2': 2, 'TEST-3': 5
+        })
+        mock_get_estimates.assert_not_called()
+        mock_update_estimate.assert_called_once_with("TEST-1", 7)
+
 
 @patch('jira.issues.set_backlog_parent_issue_estimate')
 @patch('jira.issues.set_backlog_parent_issue_assignee')
@@ -302,14 +642,14 @@ class GetBacklogParentIssue(unittest.TestCase):
                 }
             }
         })
-        mock_get_issue.assert_called_once_with("TEST-1")
+        mock_get_issue.assert_called_once_with("TEST-1", fields=ISSUE_FIELDS)
         mock_set_backlog_parent_issue_status.assert_called_once_with(
-            self.parent_issue
+            self.parent_issue, ANY
         )
         mock_set_backlog_parent_issue_assignee.assert_called_once_with(
-            self.parent_issue
+            self.parent_issue, ANY
         )
-        mock_set_backlog_issue_estimate.assert_called_once_with("TEST-1")
+        mock_set_backlog_issue_estimate.assert_called_once_with("TEST-1", ANY)
 
     def test_gets_self_if_not_subtask(
         self, mock_get_issue, mock_set_backlog_parent_issue_status,
@@ -318,12 +658,12 @@ class GetBacklogParentIssue(unittest.TestCase):
         get_backlog_parent_issue(self.parent_issue)
         mock_get_issue.assert_not_called()
         mock_set_backlog_parent_issue_status.assert_called_once_with(
-            self.parent_issue
+            self.parent_issue, ANY
         )
         mock_set_backlog_parent_issue_assignee.assert_called_once_with(
-            self.parent_issue
+            self.parent_issue, ANY
         )
-        mock_set_backlog_issue_estimate.assert_called_once_with("TEST-1")
+        mock_set_backlog_issue_estimate.assert_called_once_with("TEST-1", ANY)
 
 
 @patch('jira.jira.transition_issue')
@@ -339,7 +679,9 @@ class SetBacklogParentIssueStatus(unittest.TestCase):
     def test_backlogs_non_backlogged_issues(self, mock_transition_issue):
         self.issue['fields']['status']['name'] = 'Not Backlog'
         set_backlog_parent_issue_status(self.issue)
-        mock_transition_issue.assert_called_once_with('TEST-1', "Backlog")
+        mock_transition_issue.assert_called_once_with(
+            'TEST-1', "Backlog", issue_type=None, status='Not Backlog'
+        )
 
     def test_ignores_issues_already_backlogged(self, mock_transition_issue):
         self.issue['fields']['status']['name'] = 'Backlog'
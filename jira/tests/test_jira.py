@@ -1,10 +1,13 @@
 import json
+import requests
+import time
 import unittest
 from unittest.mock import patch, Mock
 from jira import jira
 
 
-@patch('requests.request')
+@patch('jira.jira.bucket', None)
+@patch('jira.jira.session.request')
 class JiraTest(unittest.TestCase):
 
     @staticmethod
@@ -97,6 +100,75 @@ class JiraTest(unittest.TestCase):
         )
         self.assertEqual([{"key": "TEST-1"}, {"key": "TEST-2"}], sprint_issues)
 
+    def test_get_issues_for_sprint_projects_fields_on_every_page(
+        self, mock_request
+    ):
+        page_1 = self.create_mock_request(mock_request, {
+            'maxResults': 50,
+            'startAt': 0,
+            'total': 51,
+            'issues': [{"key": "TEST-1"}]
+        })
+        page_2 = self.create_mock_request(mock_request, {
+            'maxResults': 50,
+            'startAt': 50,
+            'total': 51,
+            'issues': [{"key": "TEST-2"}]
+        })
+        mock_request.side_effect = [page_1, page_2]
+        jira.get_issues_for_sprint(1, fields=['status'], expand=['names'])
+        endpoint = "/rest/agile/1.0/sprint/1/issue"
+        mock_request.assert_any_call(
+            "GET", f"{jira.SERVER}{endpoint}?fields=status&expand=names",
+            data=None,
+            headers=jira.headers
+        )
+        mock_request.assert_called_with(
+            "GET",
+            f"{jira.SERVER}{endpoint}?startAt=50&fields=status&expand=names",
+            data=None,
+            headers=jira.headers
+        )
+
+    def test_get_issues_for_sprint_keeps_page_order(self, mock_request):
+        pages = {}
+        for start_at in range(0, 150, 50):
+            pages[start_at] = {
+                'maxResults': 50,
+                'startAt': start_at,
+                'total': 150,
+                'issues': [{"key": f"TEST-{start_at}"}]
+            }
+
+        def respond(method, url, data, headers):
+            start_at = int(url.partition('startAt=')[2] or 0)
+            response = Mock()
+            response.text = json.dumps(pages[start_at])
+            return response
+
+        mock_request.side_effect = respond
+        sprint_issues = jira.get_issues_for_sprint(1)
+        self.assertEqual(3, mock_request.call_count)
+        self.assertEqual(
+            [{"key": "TEST-0"}, {"key": "TEST-50"}, {"key": "TEST-100"}],
+            sprint_issues
+        )
+
+    def test_iter_issues_for_sprint_yields_first_page_before_the_rest(
+        self, mock_request
+    ):
+        self.create_mock_request(mock_request, {
+            'maxResults': 50,
+            'startAt': 0,
+            'total': 100,
+            'issues': [{"key": "TEST-1"}]
+        })
+        sprint_issues = jira.iter_issues_for_sprint(1)
+        self.assertEqual({"key": "TEST-1"}, next(sprint_issues))
+        mock_request.assert_called_once()
+        self.assertEqual([{"key": "TEST-1"}], list(sprint_issues))
+        self.assertEqual(2, mock_request.call_count)
+
     def test_get_issue(self, mock_request):
         self.create_mock_request(mock_request, {'key': 'TEST-1'})
         issue = jira.get_issue('TEST-1')
@@ -107,6 +179,41 @@ class JiraTest(unittest.TestCase):
         )
         self.assertEqual({"key": "TEST-1"}, issue)
 
+    @patch.dict('jira.store.issues', clear=True)
+    @patch('jira.store.ENABLED', True)
+    def test_get_issue_is_served_from_store(self, mock_request):
+        self.create_mock_request(mock_request, {
+            'key': 'TEST-1', 'fields': {'status': {'name': 'Done'}}
+        })
+        jira.get_issue('TEST-1', fields=['status'])
+        issue = jira.get_issue('TEST-1', fields=['status'])
+        mock_request.assert_called_once()
+        self.assertEqual('Done', issue['fields']['status']['name'])
+
+    @patch('jira.jira.metrics')
+    def test_api_call_records_latency_and_status(
+        self, mock_metrics, mock_request
+    ):
+        self.create_mock_request(mock_request, {'key': 'TEST-1'})
+        mock_metrics.normalize_endpoint.return_value = '/issue/{issue}'
+        jira.api_call("GET", "/issue/TEST-1")
+        mock_metrics.observe.assert_called_once()
+        mock_metrics.inc.assert_called_once_with(
+            'jira_requests_total', help_text='Jira API calls by status',
+            status=200, method='GET', endpoint='/issue/{issue}'
+        )
+
+    def test_get_issue_projects_fields(self, mock_request):
+        self.create_mock_request(mock_request, {'key': 'TEST-1'})
+        jira.get_issue('TEST-1', fields=['status', 'subtasks'])
+        mock_request.assert_called_once_with(
+            "GET",
+            f"{jira.SERVER}/rest/agile/1.0/issue/TEST-1"
+            "?fields=status,subtasks",
+            data=None,
+            headers=jira.headers
+        )
+
     def test_get_estimate(self, mock_request):
         self.create_mock_request(mock_request, {'value': 11})
         estimate = jira.get_estimate('TEST-1')
@@ -119,6 +226,61 @@ class JiraTest(unittest.TestCase):
         )
         self.assertEqual(11, estimate)
 
+    def test_get_estimate_field_looks_up_board_configuration_once(
+        self, mock_request
+    ):
+        self.create_mock_request(mock_request, {
+            'estimation': {
+                'field': {
+                    'fieldId': 'customfield_1'
+                }
+            }
+        })
+        with patch.dict('jira.jira.estimate_fields', clear=True):
+            self.assertEqual('customfield_1', jira.get_estimate_field())
+            self.assertEqual('customfield_1', jira.get_estimate_field())
+        endpoint = f"/rest/agile/1.0/board/{jira.BOARD_ID}/configuration"
+        mock_request.assert_called_once_with(
+            "GET", f"{jira.SERVER}{endpoint}",
+            data=None,
+            headers=jira.headers
+        )
+
+    @patch.dict('jira.jira.estimate_fields', {jira.BOARD_ID: 'customfield_1'})
+    def test_get_estimates_reads_issue_payloads(self, mock_request):
+        estimates = jira.get_estimates(['TEST-1', 'TEST-2'], [
+            {'key': 'TEST-1', 'fields': {'customfield_1': 3.0}},
+            {'key': 'TEST-2', 'fields': {'customfield_1': None}}
+        ])
+        mock_request.assert_not_called()
+        self.assertEqual({'TEST-1': 3.0, 'TEST-2': None}, estimates)
+
+    @patch.dict('jira.jira.estimate_fields', {jira.BOARD_ID: 'customfield_1'})
+    def test_get_estimates_searches_for_missing_issues_in_batches(
+        self, mock_request
+    ):
+        self.create_mock_request(mock_request, {
+            'issues': [
+                {'key': 'TEST-2', 'fields': {'customfield_1': 5.0}}
+            ]
+        })
+        estimates = jira.get_estimates(['TEST-1', 'TEST-2', 'TEST-3'], [
+            {'key': 'TEST-1', 'fields': {'customfield_1': 3.0}}
+        ])
+        mock_request.assert_called_once_with(
+            "POST", f"{jira.SERVER}/rest/api/3/search",
+            data=json.dumps({
+                "jql": "key in (TEST-2,TEST-3)",
+                "fields": ["customfield_1"],
+                "maxResults": 2,
+                "validateQuery": "warn"
+            }),
+            headers=jira.headers
+        )
+        self.assertEqual(
+            {'TEST-1': 3.0, 'TEST-2': 5.0, 'TEST-3': None}, estimates
+        )
+
     def test_update_estimate(self, mock_request):
         self.create_mock_request(mock_request)
         jira.update_estimate('TEST-1', 11)
@@ -139,6 +301,63 @@ class JiraTest(unittest.TestCase):
             headers=jira.headers
         )
 
+    @patch('jira.jira.account_id', None)
+    def test_assign_issue_to_me_looks_up_account_once(self, mock_request):
+        self.create_mock_request(mock_request, {'accountId': 'abc123'})
+        jira.assign_issue('TEST-1')
+        jira.assign_issue('TEST-2')
+        myself_calls = [
+            call for call in mock_request.call_args_list
+            if call.args[1].endswith('/rest/api/3/myself')
+        ]
+        self.assertEqual(1, len(myself_calls))
+        mock_request.assert_called_with(
+            "PUT", f"{jira.SERVER}/rest/api/3/issue/TEST-2/assignee",
+            data=json.dumps({"accountId": "abc123"}),
+            headers=jira.headers
+        )
+
+    @patch('jira.jira.account_id', 'abc123')
+    def test_assign_issues(self, mock_request):
+        self.create_mock_request(mock_request)
+        jira.assign_issues(['TEST-1', 'TEST-2'])
+        self.assertEqual(2, mock_request.call_count)
+        mock_request.assert_any_call(
+            "PUT", f"{jira.SERVER}/rest/api/3/issue/TEST-2/assignee",
+            data=json.dumps({"accountId": "abc123"}),
+            headers=jira.headers
+        )
+
+    @patch('jira.jira.update_estimate')
+    def test_update_estimates_reports_failures_per_key(
+        self, mock_update_estimate, mock_request
+    ):
+        def update_estimate(issue_key, estimate):
+            if issue_key == 'TEST-2':
+                raise requests.exceptions.HTTPError()
+        mock_update_estimate.side_effect = update_estimate
+        report = jira.update_estimates({'TEST-1': 1, 'TEST-2': 2, 'TEST-3': 3})
+        self.assertEqual(['TEST-1', 'TEST-3'], report['succeeded'])
+        self.assertEqual(['TEST-2'], list(report['failed']))
+        mock_update_estimate.assert_any_call('TEST-3', 3)
+
+    @patch('jira.jira.BULK_CHUNK_SIZE', 1)
+    @patch('jira.jira.transition_issue')
+    def test_transition_issues(self, mock_transition_issue, mock_request):
+        report = jira.transition_issues(
+            ['TEST-1', 'TEST-2'], 'Backlog', issue_type='Story', status='Done'
+        )
+        self.assertEqual(['TEST-1', 'TEST-2'], report['succeeded'])
+        mock_transition_issue.assert_any_call(
+            'TEST-2', 'Backlog', issue_type='Story', status='Done'
+        )
+
+    def test_session_pools_connections_per_host(self, mock_request):
+        adapter = jira.session.get_adapter(jira.SERVER)
+        self.assertEqual(jira.POOL_CONNECTIONS, adapter._pool_connections)
+        self.assertEqual(jira.POOL_MAXSIZE, adapter._pool_maxsize)
+        self.assertEqual(jira.POOL_BLOCK, adapter._pool_block)
+
     def test_get_transition_id(self, mock_request):
         self.create_mock_request(mock_request, {
             'transitions': [
@@ -174,3 +393,59 @@ class JiraTest(unittest.TestCase):
             }),
             headers=jira.headers
         )
+
+    @patch('jira.jira.transition_ids', {})
+    @patch('jira.jira.get_transition_id')
+    def test_transition_ids_are_cached_per_workflow_status(
+        self, mock_get_transition_id, mock_request
+    ):
+        mock_get_transition_id.return_value = 1
+        self.create_mock_request(mock_request)
+        jira.transition_issue('TEST-1', 'Done', issue_type='Story', status='A')
+        jira.transition_issue('TEST-2', 'Done', issue_type='Story', status='A')
+        jira.transition_issue('TEST-3', 'Done', issue_type='Bug', status='A')
+        self.assertEqual(2, mock_get_transition_id.call_count)
+        mock_request.assert_called_with(
+            "POST", f"{jira.SERVER}/rest/api/3/issue/TEST-3/transitions",
+            data=json.dumps({
+                "transition": {
+                    "id": 1
+                }
+            }),
+            headers=jira.headers
+        )
+
+    @patch('jira.jira.transition_ids', {})
+    @patch('jira.jira.get_transition_id')
+    def test_transition_ids_are_not_cached_without_workflow(
+        self, mock_get_transition_id, mock_request
+    ):
+        mock_get_transition_id.return_value = 1
+        self.create_mock_request(mock_request)
+        jira.transition_issue('TEST-1', 'Done')
+        jira.transition_issue('TEST-1', 'Done')
+        self.assertEqual(2, mock_get_transition_id.call_count)
+
+    @patch('jira.jira.get_transition_id')
+    def test_stale_transition_ids_are_looked_up_again(
+        self, mock_get_transition_id, mock_request
+    ):
+        mock_get_transition_id.return_value = 2
+        failed = self.create_mock_request(mock_request)
+        failed.ok = False
+        failed.status_code = 400
+        failed.raise_for_status.side_effect = requests.exceptions.HTTPError(
+            response=failed
+        )
+        succeeded = Mock()
+        mock_request.side_effect = [failed, succeeded]
+        cache_key = ('TEST', 'Story', 'A', 'Done')
+        transition_ids = {cache_key: (1, time.monotonic() + 60)}
+        with patch('jira.jira.transition_ids', transition_ids), \
+                patch('builtins.print'):
+            jira.transition_issue(
+                'TEST-1', 'Done', issue_type='Story', status='A'
+            )
+        mock_get_transition_id.assert_called_once_with('TEST-1', 'Done')
+        self.assertEqual(2, transition_ids[cache_key][0])
+        self.assertEqual(2, mock_request.call_count)
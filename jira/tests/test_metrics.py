@@ -0,0 +1,47 @@
+import unittest
+from unittest.mock import patch
+from jira import metrics
+
+
+@patch.dict('jira.metrics.metrics', clear=True)
+class MetricsTest(unittest.TestCase):
+
+    def test_counters_are_rendered_with_labels(self):
+        metrics.inc('requests_total', help_text='Requests', status=200)
+        metrics.inc('requests_total', status=200)
+        text = metrics.render()
+        self.assertIn('# HELP requests_total Requests\n', text)
+        self.assertIn('# TYPE requests_total counter\n', text)
+        self.assertIn('requests_total{status="200"} 2\n', text)
+
+    def test_gauges_keep_the_last_value(self):
+        metrics.set_gauge('depth', 3)
+        metrics.set_gauge('depth', 1)
+        self.assertIn('depth 1\n', metrics.render())
+
+    def test_histograms_are_cumulative(self):
+        metrics.observe('latency', 0.2)
+        metrics.observe('latency', 3)
+        text = metrics.render()
+        self.assertIn('latency_bucket{le="0.1"} 0\n', text)
+        self.assertIn('latency_bucket{le="0.25"} 1\n', text)
+        self.assertIn('latency_bucket{le="5"} 2\n', text)
+        self.assertIn('latency_bucket{le="+Inf"} 2\n', text)
+        self.assertIn('latency_sum 3.2\n', text)
+        self.assertIn('latency_count 2\n', text)
+
+    def test_label_values_are_escaped(self):
+        metrics.inc('total', summary='say "hi"')
+        self.assertIn('total{summary="say \\"hi\\""} 1\n', metrics.render())
+
+    def test_endpoints_are_normalized(self):
+        self.assertEqual(
+            '/rest/agile/1.0/sprint/{id}/issue',
+            metrics.normalize_endpoint(
+                '/rest/agile/1.0/sprint/12/issue?startAt=50'
+            )
+        )
+        self.assertEqual(
+            '/rest/api/3/issue/{issue}/transitions',
+            metrics.normalize_endpoint('/rest/api/3/issue/EDU-42/transitions')
+        )
@@ -0,0 +1,120 @@
+import requests
+import unittest
+from unittest.mock import patch
+from jira.plan import Plan, execute_plan, planned
+
+
+class PlanTest(unittest.TestCase):
+
+    def test_last_write_for_an_issue_wins(self):
+        plan = Plan()
+        plan.estimate('TEST-1', 3)
+        plan.estimate('TEST-1', 5)
+        self.assertEqual(
+            [{'action': 'estimate', 'issue_key': 'TEST-1', 'value': 5}],
+            list(plan.mutations.values())
+        )
+
+    def test_writes_matching_current_state_are_dropped(self):
+        plan = Plan()
+        plan.transition('TEST-1', 'Done', 'In Progress')
+        plan.transition('TEST-1', 'In Progress', 'In Progress')
+        plan.assign('TEST-2', None, None)
+        self.assertEqual(0, len(plan))
+
+    def test_different_actions_on_the_same_issue_are_kept(self):
+        plan = Plan()
+        plan.transition('TEST-1', 'Backlog', 'Done')
+        plan.assign('TEST-1', None, 'someone')
+        self.assertEqual(2, len(plan))
+
+
+@patch('jira.jira.assign_issue')
+@patch('jira.jira.transition_issue')
+@patch('jira.jira.update_estimate')
+class ExecutePlanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.plan = Plan()
+        self.plan.assign('TEST-1', None, 'someone')
+        self.plan.transition('TEST-1', 'Backlog', 'Done')
+        self.plan.estimate('TEST-2', 8, 7.5)
+
+    def test_mutations_are_applied_in_batches_by_action(
+        self, mock_update_estimate, mock_transition_issue, mock_assign_issue
+    ):
+        mutations = execute_plan(self.plan, dry_run=False)
+        self.assertEqual(
+            ['estimate', 'transition', 'assignee'],
+            [mutation['action'] for mutation in mutations]
+        )
+        mock_update_estimate.assert_called_once_with('TEST-2', 8)
+        mock_transition_issue.assert_called_once_with(
+            'TEST-1', 'Backlog', issue_type=None, status='Done'
+        )
+        mock_assign_issue.assert_called_once_with('TEST-1', None)
+
+    @patch('builtins.print')
+    def test_failed_writes_do_not_stop_the_rest(
+        self, mock_print, mock_update_estimate, mock_transition_issue,
+        mock_assign_issue
+    ):
+        mock_update_estimate.side_effect = requests.exceptions.HTTPError()
+        self.plan.transition('TEST-3', 'Backlog', 'Done')
+        with self.assertRaises(requests.exceptions.HTTPError):
+            execute_plan(self.plan, dry_run=False)
+        self.assertEqual(2, mock_transition_issue.call_count)
+        mock_assign_issue.assert_called_once_with('TEST-1', None)
+
+    @patch('builtins.print')
+    def test_callbacks_only_run_for_issues_written_successfully(
+        self, mock_print, mock_update_estimate, mock_transition_issue,
+        mock_assign_issue
+    ):
+        mock_update_estimate.side_effect = requests.exceptions.HTTPError()
+        applied = []
+        self.plan.on_applied(['TEST-1'], lambda: applied.append('TEST-1'))
+        self.plan.on_applied(
+            ['TEST-1', 'TEST-2'], lambda: applied.append('TEST-2')
+        )
+        with self.assertRaises(requests.exceptions.HTTPError):
+            execute_plan(self.plan, dry_run=False)
+        self.assertEqual(['TEST-1'], applied)
+
+    @patch('builtins.print')
+    def test_dry_run_only_reports_the_plan(
+        self, mock_print, mock_update_estimate, mock_transition_issue,
+        mock_assign_issue
+    ):
+        mutations = execute_plan(self.plan, dry_run=True)
+        self.assertEqual(3, len(mutations))
+        self.assertEqual(3, mock_print.call_count)
+        mock_update_estimate.assert_not_called()
+        mock_transition_issue.assert_not_called()
+        mock_assign_issue.assert_not_called()
+
+    @patch('builtins.print')
+    def test_dry_run_skips_callbacks(
+        self, mock_print, mock_update_estimate, mock_transition_issue,
+        mock_assign_issue
+    ):
+        applied = []
+        self.plan.on_applied(['TEST-1'], lambda: applied.append('TEST-1'))
+        execute_plan(self.plan, dry_run=True)
+        self.assertEqual([], applied)
+
+    def test_planned_executes_its_own_plan(
+        self, mock_update_estimate, mock_transition_issue, mock_assign_issue
+    ):
+        with planned() as plan:
+            plan.estimate('TEST-1', 3)
+            mock_update_estimate.assert_not_called()
+        mock_update_estimate.assert_called_once_with('TEST-1', 3)
+
+    def test_planned_joins_the_callers_plan(
+        self, mock_update_estimate, mock_transition_issue, mock_assign_issue
+    ):
+        with planned(self.plan) as plan:
+            plan.estimate('TEST-3', 1)
+        mock_update_estimate.assert_not_called()
+        self.assertEqual(4, len(self.plan))
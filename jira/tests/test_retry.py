@@ -0,0 +1,123 @@
+import requests
+import unittest
+from unittest.mock import Mock, patch
+from jira import retry
+
+
+def mock_response(status_code, headers=None):
+    response = Mock()
+    response.status_code = status_code
+    response.ok = status_code < 400
+    response.headers = headers or {}
+    return response
+
+
+@patch('time.sleep')
+@patch.dict('jira.retry.counters', clear=True)
+class RequestTest(unittest.TestCase):
+
+    def test_successful_requests_are_returned(self, mock_sleep):
+        send = Mock(return_value=mock_response(200))
+        response = retry.request(send, 'GET', 'url', data=None)
+        send.assert_called_once_with('GET', 'url', data=None)
+        self.assertEqual(200, response.status_code)
+        mock_sleep.assert_not_called()
+
+    def test_rate_limited_requests_wait_for_retry_after(self, mock_sleep):
+        send = Mock(side_effect=[
+            mock_response(429, {'Retry-After': '3'}), mock_response(200)
+        ])
+        response = retry.request(send, 'POST', 'url', name='test')
+        self.assertEqual(200, response.status_code)
+        mock_sleep.assert_called_once_with(3)
+        self.assertEqual(1, retry.get_counters()['test']['rate_limited'])
+        self.assertEqual(1, retry.get_counters()['test']['retries'])
+
+    def test_server_errors_are_retried_for_idempotent_methods(
+        self, mock_sleep
+    ):
+        send = Mock(side_effect=[mock_response(503), mock_response(200)])
+        response = retry.request(send, 'PUT', 'url')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(2, send.call_count)
+
+    def test_server_errors_are_not_retried_for_post(self, mock_sleep):
+        send = Mock(return_value=mock_response(503))
+        response = retry.request(send, 'POST', 'url', name='test')
+        self.assertEqual(503, response.status_code)
+        send.assert_called_once()
+        self.assertEqual(1, retry.get_counters()['test']['failures'])
+
+    def test_gives_up_after_max_retries(self, mock_sleep):
+        send = Mock(return_value=mock_response(502))
+        response = retry.request(send, 'GET', 'url', max_retries=2)
+        self.assertEqual(502, response.status_code)
+        self.assertEqual(3, send.call_count)
+
+    def test_backoff_is_jittered_and_capped(self, mock_sleep):
+        for attempt in range(20):
+            delay = retry.get_backoff(attempt)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, retry.BACKOFF_MAX)
+
+    def test_connection_errors_are_retried_for_idempotent_methods(
+        self, mock_sleep
+    ):
+        send = Mock(side_effect=[
+            requests.exceptions.ConnectionError(), mock_response(200)
+        ])
+        response = retry.request(send, 'GET', 'url')
+        self.assertEqual(200, response.status_code)
+
+    def test_connection_errors_are_raised_for_post(self, mock_sleep):
+        send = Mock(side_effect=requests.exceptions.ConnectionError())
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            retry.request(send, 'POST', 'url')
+        send.assert_called_once()
+
+    def test_rate_limits_pause_the_bucket(self, mock_sleep):
+        bucket = Mock()
+        bucket.acquire.return_value = 0
+        send = Mock(side_effect=[
+            mock_response(429, {'Retry-After': '2'}), mock_response(200)
+        ])
+        retry.request(send, 'GET', 'url', bucket=bucket)
+        bucket.pause.assert_called_once_with(2)
+        self.assertEqual(2, bucket.acquire.call_count)
+
+
+class GetRetryAfterTest(unittest.TestCase):
+
+    def test_reads_seconds(self):
+        response = mock_response(429, {'Retry-After': '7'})
+        self.assertEqual(7, retry.get_retry_after(response))
+
+    def test_reads_http_dates(self):
+        response = mock_response(429, {
+            'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'
+        })
+        self.assertEqual(0, retry.get_retry_after(response))
+
+    def test_missing_header(self):
+        self.assertIsNone(retry.get_retry_after(mock_response(429)))
+
+
+@patch('time.sleep')
+class TokenBucketTest(unittest.TestCase):
+
+    def test_bursts_up_to_capacity_without_waiting(self, mock_sleep):
+        bucket = retry.TokenBucket(1, 3)
+        for _ in range(3):
+            self.assertEqual(0, bucket.acquire())
+        mock_sleep.assert_not_called()
+
+    def test_waits_for_a_token_once_empty(self, mock_sleep):
+        bucket = retry.TokenBucket(1000, 1)
+        bucket.acquire()
+        bucket.tokens = 0
+        with patch('time.monotonic', side_effect=[
+            bucket.updated, bucket.updated + 0.002
+        ]):
+            waited = bucket.acquire()
+        self.assertGreater(waited, 0)
+        mock_sleep.assert_called_once()
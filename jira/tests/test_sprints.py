@@ -1,9 +1,13 @@
+import concurrent.futures
+import datetime
+import requests
+import threading
 import unittest
 from unittest.mock import patch
-from jira import jira
+from jira import boards, jira
 from jira.sprints import (
-    sprint_event, get_sprint_issues_by_type, get_message_info,
-    get_active_sprint_info
+    SPRINT_FIELDS, sprint_event, get_sprint_issues_by_type, get_message_info,
+    get_active_sprint_info, get_board_job
 )
 
 
@@ -25,6 +29,82 @@ class SprintsTest(unittest.TestCase):
         sprint_event(self.sprint)
         mock_get_sprint_issues_by_type.assert_called_once_with(1, 'TEST Sprint')
 
+    def test_configured_boards_are_handled_as_the_current_board(
+        self, mock_get_sprint_issues_by_type
+    ):
+        board = {'id': 18, 'project': 'OTHER'}
+        mock_get_sprint_issues_by_type.side_effect = (
+            lambda *args: self.assertEqual(18, jira.get_board_id())
+        )
+        self.sprint['originBoardId'] = 18
+        with patch.dict('jira.boards.boards', {18: board}):
+            sprint_event(self.sprint)
+        mock_get_sprint_issues_by_type.assert_called_once_with(
+            1, 'TEST Sprint'
+        )
+
+
+@patch('jira.sprints.get_active_sprint_info')
+class GetBoardJobTest(unittest.TestCase):
+
+    board = {
+        'id': 18,
+        'project': 'OTHER',
+        'alert_schedule': '30 8 * * *',
+        'timezone': 'UTC'
+    }
+
+    def test_job_uses_the_boards_schedule(self, mock_get_active_sprint_info):
+        job = get_board_job(self.board)
+        self.assertEqual('30 8 * * *', job.expression)
+        self.assertEqual('burndown:18', job.name)
+
+    def test_job_falls_back_to_the_default_schedule(
+        self, mock_get_active_sprint_info
+    ):
+        job = get_board_job({**self.board, 'alert_schedule': None})
+        self.assertEqual('0 9 * * mon-fri', job.expression)
+
+    def test_job_runs_as_the_board(self, mock_get_active_sprint_info):
+        mock_get_active_sprint_info.side_effect = (
+            lambda: self.assertIs(self.board, boards.get_current())
+        )
+        get_board_job(self.board).func()
+        mock_get_active_sprint_info.assert_called_once_with()
+        self.assertIsNone(boards.get_current())
+
+    def test_job_fails_when_the_alert_is_not_delivered(
+        self, mock_get_active_sprint_info
+    ):
+        delivery = concurrent.futures.Future()
+        delivery.set_exception(requests.HTTPError(500))
+        mock_get_active_sprint_info.return_value = delivery
+        job = get_board_job(self.board)
+        self.assertEqual(3, job.retries)
+        with self.assertRaises(requests.HTTPError):
+            job.func()
+
+    @patch('slack.slack.DELIVERY_TIMEOUT', 0)
+    def test_timed_out_alerts_are_withdrawn_before_the_retry(
+        self, mock_get_active_sprint_info
+    ):
+        delivery = concurrent.futures.Future()
+        mock_get_active_sprint_info.return_value = delivery
+        with self.assertRaises(concurrent.futures.TimeoutError):
+            get_board_job(self.board).func()
+        self.assertTrue(delivery.cancelled())
+
+    @patch('slack.slack.DELIVERY_TIMEOUT', 0)
+    def test_timed_out_alerts_being_sent_are_waited_on(
+        self, mock_get_active_sprint_info
+    ):
+        delivery = concurrent.futures.Future()
+        delivery.set_running_or_notify_cancel()
+        mock_get_active_sprint_info.return_value = delivery
+        threading.Timer(0.05, delivery.set_result, ['ok']).start()
+        get_board_job(self.board).func()
+        self.assertEqual('ok', delivery.result())
+
 
 class GetActiveSprintInfo(unittest.TestCase):
 
@@ -50,7 +130,9 @@ class GetActiveSprintInfo(unittest.TestCase):
         mock_get_sprint_issues_by_type.assert_not_called()
 
 
+@patch.dict('jira.jira.estimate_fields', {jira.BOARD_ID: 'customfield_1'})
 @patch('jira.sprints.get_message_info')
+@patch('jira.jira.get_estimates')
 @patch('jira.jira.get_issues_for_sprint')
 class GetSprintIssueByType(unittest.TestCase):
 
@@ -79,25 +161,37 @@ class GetSprintIssueByType(unittest.TestCase):
     }
 
     def test_ignores_done_issues(
-        self, mock_get_issues_for_sprint, mock_get_message_info
+        self, mock_get_issues_for_sprint, mock_get_estimates,
+        mock_get_message_info
     ):
         self.issue_1['fields']['status']['statusCategory']['name'] = 'Done'
         mock_get_issues_for_sprint.return_value = [self.issue_1]
         get_sprint_issues_by_type(1, 'TEST Sprint')
-        mock_get_message_info.assert_called_once_with('TEST Sprint', [], [], [])
+        mock_get_issues_for_sprint.assert_called_once_with(
+            1, fields=SPRINT_FIELDS + ['customfield_1']
+        )
+        mock_get_message_info.assert_called_once_with(
+            'TEST Sprint', [], [], [], mock_get_estimates.return_value,
+            sprint_id=1
+        )
 
     def test_ignores_stories_with_subtasks(
-        self, mock_get_issues_for_sprint, mock_get_message_info
+        self, mock_get_issues_for_sprint, mock_get_estimates,
+        mock_get_message_info
     ):
         self.issue_1['fields']['issuetype'] = {'name': "Story"}
         self.issue_1['fields']['status']['statusCategory']['name'] = 'Not Done'
         self.issue_1['fields']['subtasks'].append({'key': 'TEST-3'})
         mock_get_issues_for_sprint.return_value = [self.issue_1]
         get_sprint_issues_by_type(1, 'TEST Sprint')
-        mock_get_message_info.assert_called_once_with('TEST Sprint', [], [], [])
+        mock_get_message_info.assert_called_once_with(
+            'TEST Sprint', [], [], [], mock_get_estimates.return_value,
+            sprint_id=1
+        )
 
     def test_separates_stories_wo_subtasks(
-        self, mock_get_issues_for_sprint, mock_get_message_info
+        self, mock_get_issues_for_sprint, mock_get_estimates,
+        mock_get_message_info
     ):
         self.issue_1['fields']['issuetype'] = {'name': "Story"}
         self.issue_1['fields']['status']['statusCategory']['name'] = 'Not Done'
@@ -109,10 +203,11 @@ class GetSprintIssueByType(unittest.TestCase):
             'key': 'TEST-1',
             'type': 'story',
             'assignee': None
-        }], [], [])
+        }], [], [], mock_get_estimates.return_value, sprint_id=1)
 
     def test_get_sprint_issuses_by_type_passes_assignee_when_exists(
-        self, mock_get_issues_for_sprint, mock_get_message_info
+        self, mock_get_issues_for_sprint, mock_get_estimates,
+        mock_get_message_info
     ):
         self.issue_1['fields']['issuetype'] = {'name': "Story"}
         self.issue_1['fields']['status']['statusCategory']['name'] = 'Not Done'
@@ -124,10 +219,11 @@ class GetSprintIssueByType(unittest.TestCase):
             'key': 'TEST-1',
             'type': 'story',
             'assignee': 'someone'
-        }], [], [])
+        }], [], [], mock_get_estimates.return_value, sprint_id=1)
 
     def test_get_sprint_issues_by_type_separates_out_bugs(
-        self, mock_get_issues_for_sprint, mock_get_message_info
+        self, mock_get_issues_for_sprint, mock_get_estimates,
+        mock_get_message_info
     ):
         self.issue_1['fields']['issuetype'] = {'name': "Bug"}
         self.issue_1['fields']['status']['statusCategory']['name'] = "Not Done"
@@ -148,10 +244,11 @@ class GetSprintIssueByType(unittest.TestCase):
                 'type': 'bug',
                 'assignee': None
             },
-        ], [])
+        ], [], mock_get_estimates.return_value, sprint_id=1)
 
     def test_get_sprint_issues_by_type_separates_out_tasks(
-        self, mock_get_issues_for_sprint, mock_get_message_info
+        self, mock_get_issues_for_sprint, mock_get_estimates,
+        mock_get_message_info
     ):
         self.issue_1['fields']['issuetype'] = {'name': "Task"}
         self.issue_1['fields']['status']['statusCategory']['name'] = "Not Done"
@@ -172,14 +269,24 @@ class GetSprintIssueByType(unittest.TestCase):
                 'type': 'task',
                 'assignee': None
             },
-        ])
+        ], mock_get_estimates.return_value, sprint_id=1)
 
 
 @patch('slack.webhooks.build_message')
-@patch('jira.jira.get_estimate')
+@patch('jira.jira.get_estimates')
 class GetMessageInfoTest(unittest.TestCase):
 
-    issue = {}
+    issue_1 = {
+        'key': 'TEST-1',
+        'type': 'task',
+        'assignee': 'someone'
+    }
+
+    issue_2 = {
+        'key': 'TEST-2',
+        'type': 'bug',
+        'assignee': 'someone'
+    }
 
     sprint_info = {
         'name': 'TEST Sprint',
@@ -187,38 +294,66 @@ class GetMessageInfoTest(unittest.TestCase):
     }
 
     def test_issue_estimates_are_added_up(
-        self, mock_get_estimate, mock_build_message
+        self, mock_get_estimates, mock_build_message
     ):
-        self.issue['key'] = 'TEST-1'
-        self.issue['type'] = 'task'
-        self.issue['key'] = 'someone'
-        mock_get_estimate.side_effect = [2, 8]
-        get_message_info('TEST Sprint', [], [], [self.issue, self.issue])
+        mock_get_estimates.return_value = {'TEST-1': 2, 'TEST-2': 8}
+        get_message_info('TEST Sprint', [], [self.issue_2], [self.issue_1])
+        mock_get_estimates.assert_called_once_with(['TEST-2', 'TEST-1'])
         self.sprint_info['burndown'] = 10
         mock_build_message.assert_called_once_with(self.sprint_info, [], [], [])
 
+    def test_uses_estimates_passed_in(
+        self, mock_get_estimates, mock_build_message
+    ):
+        get_message_info(
+            'TEST Sprint', [], [self.issue_2], [self.issue_1],
+            {'TEST-1': 3, 'TEST-2': 4}
+        )
+        mock_get_estimates.assert_not_called()
+        self.sprint_info['burndown'] = 7
+        mock_build_message.assert_called_once_with(
+            self.sprint_info, [], [], []
+        )
+
     def test_missing_estimate_issues_are_passed_along(
-        self, mock_get_estimate, mock_build_message
+        self, mock_get_estimates, mock_build_message
     ):
-        self.issue['key'] = 'TEST-1'
-        self.issue['type'] = 'bug'
-        self.issue['key'] = 'someone'
-        mock_get_estimate.return_value = None
-        get_message_info('TEST Sprint', [], [self.issue], [])
+        mock_get_estimates.return_value = {'TEST-2': None}
+        get_message_info('TEST Sprint', [], [self.issue_2], [])
         self.sprint_info['burndown'] = 0
         mock_build_message.assert_called_once_with(
-            self.sprint_info, [], [self.issue], []
+            self.sprint_info, [], [self.issue_2], []
         )
 
     def test_large_estimate_issues_are_passed_along(
-        self, mock_get_estimate, mock_build_message
+        self, mock_get_estimates, mock_build_message
     ):
-        self.issue['key'] = 'TEST-1'
-        self.issue['type'] = 'task'
-        self.issue['key'] = 'someone'
-        mock_get_estimate.return_value = 17
-        get_message_info('TEST Sprint', [], [], [self.issue])
+        mock_get_estimates.return_value = {'TEST-1': 17}
+        get_message_info('TEST Sprint', [], [], [self.issue_1])
         self.sprint_info['burndown'] = 17
         mock_build_message.assert_called_once_with(
-            self.sprint_info, [], [], [self.issue]
+            self.sprint_info, [], [], [self.issue_1]
+        )
+
+    @patch('jira.sprints.get_today')
+    @patch('jira.history.record_snapshot')
+    def test_snapshot_is_recorded_for_the_sprint(
+        self, mock_record_snapshot, mock_get_today, mock_get_estimates,
+        mock_build_message
+    ):
+        mock_get_today.return_value = datetime.date(2024, 3, 4)
+        get_message_info(
+            'TEST Sprint', [], [self.issue_2], [self.issue_1],
+            {'TEST-1': 17, 'TEST-2': None}, sprint_id=1
+        )
+        mock_record_snapshot.assert_called_once_with(
+            1, 'TEST Sprint', 17, 1, 1, 0, datetime.date(2024, 3, 4),
+            jira.BOARD_ID
         )
+
+    @patch('jira.history.record_snapshot')
+    def test_no_snapshot_without_a_sprint(
+        self, mock_record_snapshot, mock_get_estimates, mock_build_message
+    ):
+        get_message_info('TEST Sprint', [], [], [], {})
+        mock_record_snapshot.assert_not_called()
@@ -0,0 +1,155 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from jira import store
+
+
+def make_issue(key, sprint_id=1, status='To Do', **fields):
+    return {'key': key, 'fields': {
+        'status': {'name': status},
+        'customfield_10020': [
+            {'id': sprint_id, 'state': 'active', 'boardId': 17}
+        ],
+        **fields
+    }}
+
+
+@patch('jira.store.connection', None)
+@patch.dict('jira.store.sprints', clear=True)
+@patch.dict('jira.store.issues', clear=True)
+@patch('jira.store.ENABLED', True)
+class StoreTest(unittest.TestCase):
+
+    def test_webhook_payloads_are_served_back(self):
+        store.put_issue(make_issue('TEST-1'))
+        issue = store.get_issue('TEST-1', ['status', 'sprint'])
+        self.assertEqual({'name': 'To Do'}, issue['fields']['status'])
+        self.assertEqual(1, issue['fields']['sprint']['id'])
+
+    def test_missing_fields_are_a_miss(self):
+        store.put_issue({'key': 'TEST-1', 'fields': {'status': {}}}, False)
+        self.assertIsNone(store.get_issue('TEST-1', ['assignee']))
+        self.assertIsNone(store.get_issue('TEST-1'))
+
+    def test_served_issues_are_copies(self):
+        store.put_issue(make_issue('TEST-1'))
+        store.get_issue('TEST-1')['fields']['status']['name'] = 'Done'
+        self.assertEqual(
+            'To Do', store.get_issue('TEST-1')['fields']['status']['name']
+        )
+
+    def test_sprints_are_only_served_once_complete(self):
+        store.put_issue(make_issue('TEST-1'))
+        self.assertIsNone(store.get_sprint_issues(1, ['status']))
+        store.put_sprint_issues(1, [make_issue('TEST-1')])
+        store.put_issue(make_issue('TEST-2'))
+        self.assertEqual(
+            ['TEST-1', 'TEST-2'],
+            [issue['key'] for issue in store.get_sprint_issues(1, ['status'])]
+        )
+
+    def test_issues_moved_out_of_a_sprint_leave_it(self):
+        store.put_sprint_issues(1, [make_issue('TEST-1')])
+        store.put_issue(make_issue('TEST-1', sprint_id=2))
+        self.assertEqual([], store.get_sprint_issues(1, ['status']))
+
+    def test_removed_issues_make_their_sprint_incomplete(self):
+        store.put_sprint_issues(1, [make_issue('TEST-1')])
+        store.remove_issue('TEST-1')
+        self.assertIsNone(store.get_issue('TEST-1'))
+        self.assertIsNone(store.get_sprint_issues(1, ['status']))
+
+    def test_deleted_issues_leave_their_sprint(self):
+        store.put_sprint_issues(1, [make_issue('TEST-1')])
+        store.remove_issue('TEST-1', deleted=True)
+        self.assertEqual([], store.get_sprint_issues(1, ['status']))
+
+    def test_subtask_payloads_update_their_story(self):
+        store.put_issue(make_issue('TEST-1', subtasks=[
+            {'key': 'TEST-2', 'fields': {'status': {'name': 'To Do'}}},
+            {'key': 'TEST-3', 'fields': {'status': {'name': 'Done'}}}
+        ]))
+        store.put_issue(
+            make_issue('TEST-2', status='Done', parent={'key': 'TEST-1'})
+        )
+        store.put_issue(make_issue('TEST-4', parent={'key': 'TEST-1'}))
+        subtasks = store.get_issue('TEST-1', ['subtasks'])['fields'][
+            'subtasks'
+        ]
+        self.assertEqual(
+            [('TEST-2', 'Done'), ('TEST-3', 'Done'), ('TEST-4', 'To Do')],
+            [
+                (subtask['key'], subtask['fields']['status']['name'])
+                for subtask in subtasks
+            ]
+        )
+
+    def test_deleted_subtasks_leave_their_story(self):
+        store.put_issue(make_issue('TEST-1', subtasks=[
+            {'key': 'TEST-2', 'fields': {'status': {'name': 'To Do'}}}
+        ]))
+        store.put_issue(make_issue('TEST-2', parent={'key': 'TEST-1'}))
+        store.remove_issue('TEST-2', deleted=True)
+        self.assertEqual(
+            [], store.get_issue('TEST-1', ['subtasks'])['fields']['subtasks']
+        )
+
+    def test_closed_sprints_are_not_reconciled(self):
+        store.put_sprint({'id': 1, 'state': 'active'})
+        store.put_sprint({'id': 2, 'state': 'closed'})
+        self.assertEqual([1], store.get_sprint_ids())
+
+    def test_sprints_remember_their_board(self):
+        store.put_sprint({'id': 1, 'originBoardId': 18})
+        store.put_sprint_issues(2, [make_issue('TEST-1')], 19)
+        store.put_sprint_issues(3, [])
+        self.assertEqual(18, store.get_sprint_board(1))
+        self.assertEqual(19, store.get_sprint_board(2))
+        self.assertIsNone(store.get_sprint_board(3))
+        self.assertIsNone(store.get_sprint_board(4))
+
+    def test_sprint_payloads_are_served_back(self):
+        store.put_sprint({'id': 1, 'endDate': '2024-03-18T09:00:00.000Z'})
+        sprint = store.get_sprint(1)
+        sprint['endDate'] = None
+        self.assertEqual(
+            '2024-03-18T09:00:00.000Z', store.get_sprint(1)['endDate']
+        )
+        self.assertIsNone(store.get_sprint(2))
+
+
+@patch.dict('jira.store.issues', clear=True)
+@patch('jira.store.ENABLED', False)
+class DisabledStoreTest(unittest.TestCase):
+
+    def test_disabled_store_never_hits(self):
+        store.put_issue(make_issue('TEST-1'))
+        self.assertIsNone(store.get_issue('TEST-1'))
+
+
+@patch.dict('jira.store.sprints', clear=True)
+@patch.dict('jira.store.issues', clear=True)
+@patch('jira.store.ENABLED', True)
+class SQLiteStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'store.db')
+        patcher = patch('jira.store.connection', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def test_store_is_reloaded_with_sprints_pending_reconcile(self):
+        store.open_store(self.path)
+        store.put_sprint_issues(1, [make_issue('TEST-1')])
+        store.connection.close()
+        store.issues.clear()
+        store.sprints.clear()
+        store.open_store(self.path)
+        issue = store.get_issue('TEST-1', ['status'])
+        self.assertEqual('To Do', issue['fields']['status']['name'])
+        self.assertIsNone(store.get_sprint_issues(1, ['status']))
+        self.assertEqual([1], store.get_sprint_ids())
+        store.connection.close()
@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from jira import tracing
+
+
+class TracingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.path = os.path.join(self.tmp_dir.name, 'trace.log')
+        patcher = patch('jira.tracing.LOG_PATH', self.path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_records(self):
+        with open(self.path) as log:
+            return [json.loads(line) for line in log]
+
+    def test_spans_are_recorded_in_their_trace(self):
+        with tracing.trace('event', 'abc', key='sprint:1'):
+            self.assertEqual('abc', tracing.get_trace_id())
+            with tracing.span('jira', endpoint='/issue/{issue}'):
+                pass
+            with tracing.span('jira', endpoint='/issue/{issue}'):
+                pass
+        record, = self.get_records()
+        self.assertEqual('abc', record['trace_id'])
+        self.assertEqual({'key': 'sprint:1'}, record['attrs'])
+        self.assertEqual({'jira': 2}, record['counts'])
+        self.assertEqual(2, len(record['spans']))
+        self.assertIsNone(tracing.get_trace_id())
+
+    def test_spans_outside_a_trace_are_ignored(self):
+        with tracing.span('jira') as span:
+            self.assertIsNone(span)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_errors_are_recorded(self):
+        with self.assertRaises(ValueError):
+            with tracing.trace('event'):
+                with tracing.span('issue_event'):
+                    raise ValueError()
+        record, = self.get_records()
+        self.assertEqual('ValueError()', record['error'])
+        self.assertEqual('ValueError()', record['spans'][0]['error'])
+
+    def test_spans_after_the_trace_finished_are_dropped(self):
+        with tracing.trace('event') as record:
+            count = tracing.wrap(tracing.count)
+            get_span = tracing.wrap(lambda: tracing.span('jira').__enter__())
+        count('jira')
+        self.assertIsNone(get_span())
+        self.assertEqual({}, dict(record['counts']))
+
+    def test_followed_work_is_its_own_trace_with_the_same_id(self):
+        def send():
+            with tracing.span('slack'):
+                pass
+
+        with tracing.trace('event', 'abc'):
+            send = tracing.follow('slack_delivery', send)
+        send()
+        event, delivery = self.get_records()
+        self.assertEqual('event', event['name'])
+        self.assertEqual(('abc', 'slack_delivery'), (
+            delivery['trace_id'], delivery['name']
+        ))
+        self.assertEqual({'slack': 1}, delivery['counts'])
+
+    def test_wrapped_work_keeps_the_trace_on_other_threads(self):
+        with tracing.trace('event', 'abc'):
+            get_trace_id = tracing.wrap(tracing.get_trace_id)
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                trace_ids = list(executor.map(
+                    lambda _: get_trace_id(), range(4)
+                ))
+        self.assertEqual(['abc'] * 4, trace_ids)
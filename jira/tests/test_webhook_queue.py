@@ -0,0 +1,108 @@
+import os
+import queue
+import sqlite3
+import tempfile
+import time
+import unittest
+from jira.webhook_queue import DurableQueue, MemoryQueue, open_queue
+
+
+class MemoryQueueTest(unittest.TestCase):
+
+    def test_events_are_handed_out_without_an_id(self):
+        q = MemoryQueue()
+        q.put({"key": "value"})
+        self.assertEqual((None, {"key": "value"}), q.get())
+
+
+class DurableQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'queue.db')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_events_are_handed_out_in_order(self):
+        q = DurableQueue(self.path)
+        q.put({"key": 1})
+        q.put({"key": 2})
+        self.assertEqual({"key": 1}, q.get()[1])
+        self.assertEqual({"key": 2}, q.get()[1])
+        q.close()
+
+    def test_unacked_events_are_replayed_on_reopen(self):
+        q = DurableQueue(self.path)
+        q.put({"key": 1})
+        q.put({"key": 2})
+        event_id, _ = q.get()
+        q.ack([event_id])
+        q.get()
+        q.close()
+        q = DurableQueue(self.path)
+        self.assertEqual({"key": 2}, q.get(timeout=1)[1])
+        self.assertRaises(queue.Empty, q.get, timeout=0)
+        q.close()
+
+    def test_shutdown_is_not_persisted(self):
+        q = DurableQueue(self.path)
+        q.put('shutdown')
+        self.assertEqual((None, 'shutdown'), q.get())
+        q.close()
+        q = DurableQueue(self.path)
+        self.assertTrue(q.empty())
+        q.close()
+
+    def test_failed_events_are_handed_out_again(self):
+        q = DurableQueue(self.path, max_attempts=2)
+        q.put({"key": 1})
+        event_id, _ = q.get()
+        q.fail([event_id])
+        self.assertEqual((event_id, {"key": 1}), q.get(timeout=1))
+        q.close()
+
+    def test_events_out_of_attempts_are_dead_lettered(self):
+        q = DurableQueue(self.path, max_attempts=2)
+        q.put({"key": 1})
+        for _ in range(2):
+            event_id, _ = q.get(timeout=1)
+            q.fail([event_id])
+        self.assertRaises(queue.Empty, q.get, timeout=0)
+        self.assertEqual([(event_id, {"key": 1}, 2)], q.get_dead_letters())
+        q.close()
+        q = DurableQueue(self.path)
+        self.assertTrue(q.empty())
+        q.close()
+
+    def test_idle_queues_are_checkpointed(self):
+        q = DurableQueue(self.path, sync_interval=0.05)
+        q.put({"key": 1})
+        q.last_sync = time.monotonic()
+        q.put({"key": 2})
+        deadline = time.monotonic() + 2
+        while q.dirty and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(q.dirty)
+        q.close()
+
+    def test_queues_from_before_attempts_are_migrated(self):
+        connection = sqlite3.connect(self.path)
+        connection.execute(
+            "CREATE TABLE events "
+            "(id INTEGER PRIMARY KEY AUTOINCREMENT, data TEXT NOT NULL)"
+        )
+        connection.execute("INSERT INTO events (data) VALUES ('{}')")
+        connection.commit()
+        connection.close()
+        q = DurableQueue(self.path)
+        event_id, data = q.get(timeout=1)
+        q.fail([event_id])
+        self.assertEqual((event_id, {}), q.get(timeout=1))
+        q.close()
+
+    def test_open_queue_picks_backend_from_path(self):
+        self.assertIsInstance(open_queue(), MemoryQueue)
+        q = open_queue(self.path)
+        self.assertIsInstance(q, DurableQueue)
+        q.close()
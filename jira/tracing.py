@@ -0,0 +1,127 @@
+import collections
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+
+# every webhook gets a trace id that follows it through the workers, the
+# handlers and the api calls they make, and each finished trace is written as
+# one json line so fan-out per story or sprint can be found
+ENABLED = os.environ.get('JACKBOT_TRACE', 'false').lower() == 'true'
+LOG_PATH = os.environ.get('JACKBOT_TRACE_LOG')
+
+current = contextvars.ContextVar('trace', default=None)
+output_lock = threading.Lock()
+
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+
+def get_trace_id():
+    trace = current.get()
+    return trace['trace_id'] if trace else None
+
+
+def emit(record):
+    if not (ENABLED or LOG_PATH):
+        return
+    line = json.dumps({
+        key: value for key, value in record.items()
+        if key not in ('lock', 'started', 'finished')
+    }, default=str)
+    with output_lock:
+        if LOG_PATH:
+            with open(LOG_PATH, 'a') as log:
+                log.write(line + '\n')
+        else:
+            print(line, flush=True)
+
+
+@contextlib.contextmanager
+def trace(name, trace_id=None, **attrs):
+    record = {
+        'trace_id': trace_id or new_trace_id(),
+        'name': name,
+        'start': time.time(),
+        'attrs': attrs,
+        'counts': collections.Counter(),
+        'spans': [],
+        'lock': threading.Lock(),
+        'started': time.monotonic(),
+        'finished': False
+    }
+    token = current.set(record)
+    try:
+        yield record
+    except Exception as e:
+        record['error'] = repr(e)
+        raise
+    finally:
+        current.reset(token)
+        # work still running in a copy of the context may outlive the trace,
+        # its spans and counts are dropped once the record is emitted
+        with record['lock']:
+            record['finished'] = True
+            record['duration'] = time.monotonic() - record['started']
+        emit(record)
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    record = current.get()
+    if record is None or record['finished']:
+        yield None
+        return
+    started = time.monotonic()
+    entry = {
+        'name': name,
+        'offset': started - record['started'],
+        'thread': threading.current_thread().name,
+        **attrs
+    }
+    try:
+        yield entry
+    except Exception as e:
+        entry['error'] = repr(e)
+        raise
+    finally:
+        entry['duration'] = time.monotonic() - started
+        with record['lock']:
+            if not record['finished']:
+                record['spans'].append(entry)
+                record['counts'][name] += 1
+
+
+def count(name, n=1):
+    record = current.get()
+    if record is not None:
+        with record['lock']:
+            if not record['finished']:
+                record['counts'][name] += n
+
+
+def wrap(func):
+    # executor threads do not inherit context variables, so work submitted
+    # to them runs in a copy of the submitting thread's context, one copy per
+    # call as a context can only be entered by one thread at a time
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(func, *args, **kwargs)
+
+
+def follow(name, func):
+    # work queued for later, like a background send, usually runs after the
+    # trace that queued it has finished, so it is recorded as its own trace
+    # under the same trace id
+    trace_id = get_trace_id()
+    if trace_id is None:
+        return func
+
+    def run(*args, **kwargs):
+        with trace(name, trace_id):
+            return func(*args, **kwargs)
+
+    return run
@@ -0,0 +1,161 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+# a durable event that fails this many times is moved to the dead_letters
+# table instead of being handed out again
+MAX_ATTEMPTS = int(os.environ.get('JACKBOT_QUEUE_MAX_ATTEMPTS', 3))
+
+
+# both queues hand out (event_id, data) pairs, events are acked by id once
+# they have been handled
+class MemoryQueue(queue.Queue):
+
+    def _put(self, data):
+        self.queue.append((None, data))
+
+    def ack(self, event_ids):
+        pass
+
+    def fail(self, event_ids):
+        pass
+
+
+# events are committed to a SQLite WAL before put returns and stay there
+# until acked, anything left unacked is replayed when the queue is reopened,
+# failed events are handed out again until they run out of attempts
+class DurableQueue(queue.Queue):
+
+    def __init__(self, path, sync_interval=1, max_attempts=MAX_ATTEMPTS):
+        super().__init__()
+        self.sync_interval = sync_interval
+        self.max_attempts = max_attempts
+        self.last_sync = time.monotonic()
+        self.dirty = False
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS events "
+            "(id INTEGER PRIMARY KEY AUTOINCREMENT, data TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = [
+            row[1] for row in self.connection.execute(
+                "PRAGMA table_info(events)"
+            )
+        ]
+        if 'attempts' not in columns:
+            self.connection.execute(
+                "ALTER TABLE events "
+                "ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0"
+            )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS dead_letters "
+            "(id INTEGER PRIMARY KEY, data TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL, failed_at REAL NOT NULL)"
+        )
+        rows = self.connection.execute(
+            "SELECT id, data FROM events ORDER BY id"
+        )
+        for event_id, data in rows:
+            super().put((event_id, json.loads(data)))
+        # without traffic nothing would checkpoint the last events written
+        self.flusher = threading.Thread(target=self.flush, daemon=True)
+        self.flusher.start()
+
+    def put(self, data, block=True, timeout=None):
+        event_id = None
+        if data != 'shutdown':
+            with self.lock:
+                cursor = self.connection.execute(
+                    "INSERT INTO events (data) VALUES (?)", (json.dumps(data),)
+                )
+                event_id = cursor.lastrowid
+                self.sync()
+        super().put((event_id, data), block, timeout)
+
+    def ack(self, event_ids):
+        event_ids = [(event_id,) for event_id in event_ids if event_id]
+        if event_ids:
+            with self.lock:
+                self.connection.executemany(
+                    "DELETE FROM events WHERE id = ?", event_ids
+                )
+                self.sync()
+
+    def fail(self, event_ids):
+        event_ids = [event_id for event_id in event_ids if event_id]
+        retries = []
+        with self.lock:
+            for event_id in event_ids:
+                self.connection.execute(
+                    "UPDATE events SET attempts = attempts + 1 WHERE id = ?",
+                    (event_id,)
+                )
+                row = self.connection.execute(
+                    "SELECT data, attempts FROM events WHERE id = ?",
+                    (event_id,)
+                ).fetchone()
+                if not row:
+                    continue
+                data, attempts = row
+                if attempts < self.max_attempts:
+                    retries.append((event_id, json.loads(data)))
+                    continue
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO dead_letters VALUES (?, ?, ?, ?)",
+                    (event_id, data, attempts, time.time())
+                )
+                self.connection.execute(
+                    "DELETE FROM events WHERE id = ?", (event_id,)
+                )
+            self.sync()
+        for retry in retries:
+            super().put(retry)
+
+    def get_dead_letters(self):
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT id, data, attempts FROM dead_letters ORDER BY id"
+            ).fetchall()
+        return [
+            (event_id, json.loads(data), attempts)
+            for event_id, data, attempts in rows
+        ]
+
+    def sync(self, force=False):
+        # checkpointing the WAL is what fsyncs it, doing it on an interval
+        # batches the fsyncs of every event committed in between
+        self.dirty = True
+        now = time.monotonic()
+        if force or now - self.last_sync >= self.sync_interval:
+            self.connection.execute("PRAGMA wal_checkpoint(PASSIVE)")
+            self.last_sync = now
+            self.dirty = False
+
+    def flush(self):
+        while not self.stopped.wait(self.sync_interval):
+            with self.lock:
+                if self.dirty:
+                    self.sync(force=True)
+
+    def close(self):
+        self.stopped.set()
+        self.flusher.join()
+        with self.lock:
+            self.sync(force=True)
+            self.connection.close()
+
+
+def open_queue(path=None):
+    if path:
+        return DurableQueue(path)
+    return MemoryQueue()
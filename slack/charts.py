@@ -0,0 +1,93 @@
+import datetime
+import io
+import os
+import requests
+import threading
+import traceback
+from jira import history, store
+from slack import slack
+
+# burndown charts are drawn from the daily snapshots in jira.history with
+# matplotlib, which is only imported once the first chart is drawn
+ENABLED = os.environ.get('JACKBOT_CHARTS', 'false').lower() == 'true'
+
+# (sprint id, day) -> (values of the latest snapshot, id of the uploaded
+# chart), every alert records the snapshot again so repeated alerts reuse
+# the chart until the values in it change
+charts = {}
+SNAPSHOT_VALUES = [
+    'remaining', 'estimate_missing', 'large_estimates', 'no_subtasks'
+]
+lock = threading.Lock()
+# set once matplotlib fails to import so later alerts skip the chart quietly
+matplotlib_missing = False
+
+
+def render_burndown(sprint_name, snapshots, end=None):
+    # the figure is used without pyplot, which keeps it off the gui backends
+    # and safe to call from worker threads
+    from matplotlib.figure import Figure
+    figure = Figure(figsize=(6, 3), dpi=100)
+    axes = figure.add_subplot()
+    days = [snapshot['day'] for snapshot in snapshots]
+    axes.plot(
+        days, [snapshot['remaining'] for snapshot in snapshots],
+        marker='o', label='Remaining'
+    )
+    if end and end > days[0]:
+        axes.plot(
+            [days[0], end], [snapshots[0]['remaining'], 0],
+            linestyle='--', color='grey', label='Ideal'
+        )
+    axes.set_title(f"{sprint_name} burndown")
+    axes.set_ylabel('Hours')
+    axes.set_ylim(bottom=0)
+    axes.legend()
+    figure.autofmt_xdate()
+    image = io.BytesIO()
+    figure.savefig(image, format='png', bbox_inches='tight')
+    return image.getvalue()
+
+
+def get_sprint_end(sprint_id):
+    sprint = store.get_sprint(sprint_id)
+    if not sprint or not sprint.get('endDate'):
+        return None
+    end = sprint['endDate'].replace('Z', '+00:00')
+    return datetime.datetime.fromisoformat(end).date()
+
+
+def get_burndown_chart(sprint_id, sprint_name, day):
+    global matplotlib_missing
+    if not ENABLED or matplotlib_missing:
+        return None
+    snapshots = history.get_snapshots(sprint_id, end=day)
+    if not snapshots:
+        return None
+    values = tuple(snapshots[-1][value] for value in SNAPSHOT_VALUES)
+    with lock:
+        cached = charts.get((sprint_id, day))
+        if cached and cached[0] == values:
+            return cached[1]
+    # a missing chart should never hold up the alert itself
+    try:
+        image = render_burndown(
+            sprint_name, snapshots, get_sprint_end(sprint_id)
+        )
+        file_id = slack.upload_file(
+            image, f"burndown-{sprint_id}-{day}.png",
+            f"{sprint_name} burndown"
+        )
+    except ImportError:
+        matplotlib_missing = True
+        print('Burndown charts need matplotlib, pip install matplotlib')
+        return None
+    except requests.exceptions.RequestException:
+        traceback.print_exc()
+        return None
+    with lock:
+        # earlier charts of the sprint will not be asked for again
+        for key in [key for key in charts if key[0] == sprint_id]:
+            del charts[key]
+        charts[(sprint_id, day)] = (values, file_id)
+    return file_id
@@ -1,40 +1,68 @@
+import concurrent.futures
 import json
 import os
+import queue
 import requests
+import threading
 import time
+from jira import metrics, retry, tracing
+from requests.adapters import HTTPAdapter
 
 API_TOKEN = os.environ['SLACK_API_TOKEN']
+API_URL = 'https://slack.com/api'
 WEBHOOK_URL = os.environ.get('SLACK_LIVE_WEBHOOK_URL')
 
 if not WEBHOOK_URL:
     WEBHOOK_URL = os.environ.get('SLACK_TEST_WEBHOOK_URL')
 
+OUTBOX_SIZE = int(os.environ.get('SLACK_OUTBOX_SIZE', 100))
+OUTBOX_TIMEOUT = float(os.environ.get('SLACK_OUTBOX_TIMEOUT', 5))
+DELIVERY_TIMEOUT = float(os.environ.get('SLACK_DELIVERY_TIMEOUT', 120))
+
 headers = {"Content-Type": "application/json"}
+# the token goes in a header rather than the url, and only to the web api
+auth_headers = {"Authorization": f"Bearer {API_TOKEN}"}
+# incoming webhooks allow about one message per second
+bucket = retry.TokenBucket(1, 3)
 
+# one keep-alive session shared by the web api, webhooks and uploads
+session = requests.Session()
+session.headers.update({"Connection": "keep-alive"})
+adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4)
+session.mount('https://', adapter)
+session.mount('http://', adapter)
 
-def get_messages(channel_id):
-    # get 10 newest messages from channel
-    url = f"https://slack.com/api/conversations.history"
-    url += f"?token={API_TOKEN}"
-    url += f"&channel={channel_id}"
-    url += "&limit=10"
-    response = requests.request("GET", url)
-    if not json.loads(response.text)['ok']:
+# messages waiting for the background sender, bounded so a slack outage
+# cannot hold an unbounded backlog of alerts in memory
+outbox = queue.Queue(maxsize=OUTBOX_SIZE)
+sender = None
+sender_lock = threading.Lock()
+
+
+def api_call(method, api_method, **kwargs):
+    response = retry.request(
+        session.request, method, f"{API_URL}/{api_method}", name='slack',
+        headers={**auth_headers, **kwargs.pop('headers', {})}, **kwargs
+    )
+    body = json.loads(response.text)
+    if not body['ok']:
         print(response.text)
         raise requests.HTTPError(403)
-    messages = json.loads(response.text)['messages']
-    return messages
+    return body
+
+
+def get_messages(channel_id):
+    # get 10 newest messages from channel
+    return api_call(
+        "GET", 'conversations.history',
+        params={'channel': channel_id, 'limit': 10}
+    )['messages']
 
 
 def delete_message(channel_id, message_ts):
-    url = 'https://slack.com/api/chat.delete'
-    url += f"?token={API_TOKEN}"
-    url += f"&channel={channel_id}"
-    url += f"&ts={message_ts}"
-    response = requests.request("POST", url)
-    if not json.loads(response.text)['ok']:
-        print(response.text)
-        raise requests.HTTPError(403)
+    api_call(
+        "POST", 'chat.delete', json={'channel': channel_id, 'ts': message_ts}
+    )
 
 
 def get_latest_bot_message(channel_id, webhook_url):
@@ -68,6 +96,96 @@ def clear_old_bot_messages(channel_id, webhook_url):
             delete_message(channel_id, ts)
 
 
-def send_message(message):
+def upload_file(content, filename, title=None):
+    # files are uploaded in three steps, an upload url is reserved, the
+    # content is sent to it and the upload is completed to get a file id
+    upload = api_call(
+        "POST", 'files.getUploadURLExternal',
+        data={'filename': filename, 'length': len(content)}
+    )
+    response = retry.request(
+        session.request, "POST", upload['upload_url'], name='slack',
+        data=content
+    )
+    response.raise_for_status()
+    api_call(
+        "POST", 'files.completeUploadExternal', json={
+            'files': [{'id': upload['file_id'], 'title': title or filename}]
+        }
+    )
+    return upload['file_id']
+
+
+def send_message(message, webhook_url=None):
     data = json.dumps(message)
-    requests.request("POST", WEBHOOK_URL, data=data, headers=headers)
+    try:
+        with metrics.timed(
+            'slack_send_duration_seconds', 'Slack message send latency'
+        ), tracing.span('slack'):
+            response = retry.request(
+                session.request, "POST", webhook_url or WEBHOOK_URL,
+                name='slack', bucket=bucket, data=data, headers=headers
+            )
+    except requests.exceptions.RequestException:
+        metrics.inc('slack_send_failures_total', help_text='Failed sends')
+        raise
+    metrics.inc('slack_sends_total', help_text='Slack messages sent')
+    if not response.ok:
+        metrics.inc('slack_send_failures_total', help_text='Failed sends')
+        print(response.text)
+    return response
+
+
+def deliver(send, message, webhook_url, delivery):
+    if not delivery.set_running_or_notify_cancel():
+        return
+    # nobody may be waiting on the delivery, so failures are logged here and
+    # any error fails the delivery rather than the sender thread
+    try:
+        response = send(message, webhook_url)
+        if not response.ok:
+            raise requests.HTTPError(
+                f"{response.status_code} {response.text}", response=response
+            )
+    except Exception as e:
+        print(f"Slack delivery failed: {e!r}")
+        delivery.set_exception(e)
+        return
+    delivery.set_result(response)
+
+
+def send_from_outbox():
+    while True:
+        item = outbox.get()
+        if item == 'shutdown':
+            break
+        deliver(*item)
+
+
+def start_sender():
+    global sender
+    with sender_lock:
+        if sender is None or not sender.is_alive():
+            sender = threading.Thread(target=send_from_outbox, daemon=True)
+            sender.start()
+
+
+def queue_message(message, webhook_url=None):
+    # messages are sent in order by one background sender, the returned
+    # future resolves to slack's response or fails with the delivery error
+    start_sender()
+    delivery = concurrent.futures.Future()
+    try:
+        outbox.put(
+            (
+                tracing.follow('slack_delivery', send_message), message,
+                webhook_url, delivery
+            ),
+            timeout=OUTBOX_TIMEOUT
+        )
+    except queue.Full:
+        metrics.inc('slack_send_failures_total', help_text='Failed sends')
+        delivery.set_exception(requests.exceptions.RequestException(
+            'Slack outbox is full'
+        ))
+    return delivery
@@ -0,0 +1,177 @@
+import datetime
+import importlib.util
+import os
+import requests
+import tempfile
+import unittest
+from unittest.mock import patch
+from jira import history
+from jira.sprints import get_message_info
+from slack import charts
+
+DAY = datetime.date(2024, 3, 5)
+SNAPSHOTS = [
+    {
+        'day': datetime.date(2024, 3, 4), 'remaining': 30,
+        'estimate_missing': 0, 'large_estimates': 0, 'no_subtasks': 0,
+        'recorded_at': 1.0
+    },
+    {
+        'day': DAY, 'remaining': 24, 'estimate_missing': 0,
+        'large_estimates': 0, 'no_subtasks': 0, 'recorded_at': 2.0
+    }
+]
+
+
+@patch.dict('slack.charts.charts', clear=True)
+@patch('slack.charts.matplotlib_missing', False)
+@patch('slack.charts.ENABLED', True)
+@patch('slack.slack.upload_file')
+@patch('slack.charts.render_burndown')
+@patch('jira.history.get_snapshots')
+class GetBurndownChartTest(unittest.TestCase):
+
+    def test_chart_is_drawn_from_the_sprints_snapshots(
+        self, mock_get_snapshots, mock_render_burndown, mock_upload_file
+    ):
+        mock_get_snapshots.return_value = SNAPSHOTS
+        mock_upload_file.return_value = 'F1'
+        self.assertEqual(
+            'F1', charts.get_burndown_chart(1, 'TEST Sprint', DAY)
+        )
+        mock_get_snapshots.assert_called_once_with(1, end=DAY)
+        mock_render_burndown.assert_called_once_with(
+            'TEST Sprint', SNAPSHOTS, None
+        )
+        mock_upload_file.assert_called_once_with(
+            mock_render_burndown.return_value, 'burndown-1-2024-03-05.png',
+            'TEST Sprint burndown'
+        )
+
+    def test_chart_is_reused_for_the_rest_of_the_day(
+        self, mock_get_snapshots, mock_render_burndown, mock_upload_file
+    ):
+        mock_get_snapshots.return_value = SNAPSHOTS
+        mock_upload_file.side_effect = ['F1', 'F2']
+        charts.get_burndown_chart(1, 'TEST Sprint', DAY)
+        charts.get_burndown_chart(1, 'TEST Sprint', DAY)
+        next_day = DAY + datetime.timedelta(1)
+        self.assertEqual(
+            'F2', charts.get_burndown_chart(1, 'TEST Sprint', next_day)
+        )
+        self.assertEqual(2, mock_render_burndown.call_count)
+        self.assertEqual({(1, next_day): ((24, 0, 0, 0), 'F2')}, charts.charts)
+
+    def test_chart_is_redrawn_after_a_new_snapshot(
+        self, mock_get_snapshots, mock_render_burndown, mock_upload_file
+    ):
+        mock_get_snapshots.return_value = SNAPSHOTS
+        mock_upload_file.side_effect = ['F1', 'F2']
+        charts.get_burndown_chart(1, 'TEST Sprint', DAY)
+        mock_get_snapshots.return_value = SNAPSHOTS[:1] + [
+            {**SNAPSHOTS[1], 'recorded_at': 3.0}
+        ]
+        self.assertEqual(
+            'F1', charts.get_burndown_chart(1, 'TEST Sprint', DAY)
+        )
+        mock_get_snapshots.return_value = SNAPSHOTS[:1] + [
+            {**SNAPSHOTS[1], 'remaining': 20, 'recorded_at': 4.0}
+        ]
+        self.assertEqual(
+            'F2', charts.get_burndown_chart(1, 'TEST Sprint', DAY)
+        )
+        self.assertEqual(2, mock_render_burndown.call_count)
+
+    def test_no_chart_without_snapshots(
+        self, mock_get_snapshots, mock_render_burndown, mock_upload_file
+    ):
+        mock_get_snapshots.return_value = []
+        self.assertIsNone(charts.get_burndown_chart(1, 'TEST Sprint', DAY))
+        mock_render_burndown.assert_not_called()
+
+    def test_no_chart_without_matplotlib(
+        self, mock_get_snapshots, mock_render_burndown, mock_upload_file
+    ):
+        mock_get_snapshots.return_value = SNAPSHOTS
+        mock_render_burndown.side_effect = ImportError
+        with patch('builtins.print') as mock_print:
+            chart = charts.get_burndown_chart(1, 'TEST Sprint', DAY)
+            charts.get_burndown_chart(1, 'TEST Sprint', DAY)
+        self.assertIsNone(chart)
+        mock_upload_file.assert_not_called()
+        mock_render_burndown.assert_called_once()
+        mock_print.assert_called_once()
+
+    def test_failed_uploads_are_not_cached(
+        self, mock_get_snapshots, mock_render_burndown, mock_upload_file
+    ):
+        mock_get_snapshots.return_value = SNAPSHOTS
+        mock_upload_file.side_effect = requests.HTTPError(403)
+        with patch('traceback.print_exc'):
+            chart = charts.get_burndown_chart(1, 'TEST Sprint', DAY)
+        self.assertIsNone(chart)
+        self.assertEqual({}, charts.charts)
+
+    def test_no_chart_when_disabled(
+        self, mock_get_snapshots, mock_render_burndown, mock_upload_file
+    ):
+        with patch('slack.charts.ENABLED', False):
+            chart = charts.get_burndown_chart(1, 'TEST Sprint', DAY)
+        self.assertIsNone(chart)
+        mock_get_snapshots.assert_not_called()
+
+
+@patch.dict('slack.charts.charts', clear=True)
+@patch('slack.charts.ENABLED', True)
+@patch('jira.sprints.get_today', return_value=DAY)
+@patch('slack.slack.queue_message')
+@patch('slack.slack.upload_file', return_value='F1')
+@patch('slack.charts.render_burndown')
+class BurndownAlertTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        patcher = patch('jira.history.connection', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        history.open_history(os.path.join(self.tmp_dir.name, 'history.db'))
+        self.addCleanup(lambda: history.connection.close())
+
+    def test_repeated_alerts_on_a_day_reuse_the_chart(
+        self, mock_render_burndown, mock_upload_file, mock_queue_message,
+        mock_get_today
+    ):
+        task = {'key': 'TEST-1', 'type': 'task', 'assignee': None}
+        for _ in range(2):
+            get_message_info(
+                'TEST Sprint', [], [], [task], {'TEST-1': 8}, sprint_id=1
+            )
+        mock_render_burndown.assert_called_once()
+        mock_upload_file.assert_called_once()
+        message = mock_queue_message.call_args[0][0]
+        self.assertEqual({'id': 'F1'}, message['blocks'][-1]['slack_file'])
+
+
+@patch('jira.store.get_sprint')
+class GetSprintEndTest(unittest.TestCase):
+
+    def test_end_date_is_read_from_the_stored_sprint(self, mock_get_sprint):
+        mock_get_sprint.return_value = {'endDate': '2024-03-18T09:00:00.000Z'}
+        self.assertEqual(datetime.date(2024, 3, 18), charts.get_sprint_end(1))
+
+    def test_unknown_sprints_have_no_end(self, mock_get_sprint):
+        mock_get_sprint.return_value = None
+        self.assertIsNone(charts.get_sprint_end(1))
+
+
+@unittest.skipUnless(
+    importlib.util.find_spec('matplotlib'), 'matplotlib is not installed'
+)
+class RenderBurndownTest(unittest.TestCase):
+
+    def test_chart_is_a_png(self):
+        image = charts.render_burndown(
+            'TEST Sprint', SNAPSHOTS, datetime.date(2024, 3, 18)
+        )
+        self.assertEqual(b'\x89PNG', image[:4])
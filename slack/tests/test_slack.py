@@ -1,11 +1,16 @@
+import concurrent.futures
+import json
+import queue
+import requests
 import unittest
 from unittest.mock import Mock, patch
+from jira import tracing
 from slack import slack
 
 
 class SlackTest(unittest.TestCase):
 
-    @patch('requests.request')
+    @patch('slack.slack.session.request')
     def test_send_message(self, mock_request):
         mock_request.return_value = Mock()
         mock_request.return_value.status_code = 200
@@ -16,3 +21,150 @@ class SlackTest(unittest.TestCase):
             data='{"key": "value"}',
             headers=slack.headers
         )
+
+    @patch('slack.slack.session.request')
+    def test_send_message_to_another_webhook(self, mock_request):
+        mock_request.return_value = Mock()
+        mock_request.return_value.status_code = 200
+        slack.send_message({'key': 'value'}, 'https://hooks/18')
+        mock_request.assert_called_once_with(
+            "POST", 'https://hooks/18',
+            data='{"key": "value"}',
+            headers=slack.headers
+        )
+
+    @patch('slack.slack.bucket', None)
+    @patch('time.sleep')
+    @patch('slack.slack.session.request')
+    def test_send_message_retries_when_rate_limited(
+        self, mock_request, mock_sleep
+    ):
+        rate_limited = Mock()
+        rate_limited.status_code = 429
+        rate_limited.headers = {'Retry-After': '1'}
+        sent = Mock()
+        sent.status_code = 200
+        mock_request.side_effect = [rate_limited, sent]
+        response = slack.send_message({'key': 'value'})
+        self.assertEqual(sent, response)
+        self.assertEqual(2, mock_request.call_count)
+
+    @patch('slack.slack.session.request')
+    def test_upload_file_returns_the_file_id(self, mock_request):
+        reserved = Mock()
+        reserved.status_code = 200
+        reserved.text = json.dumps({
+            'ok': True, 'upload_url': 'https://files/1', 'file_id': 'F1'
+        })
+        sent = Mock()
+        sent.status_code = 200
+        completed = Mock()
+        completed.status_code = 200
+        completed.text = '{"ok": true}'
+        mock_request.side_effect = [reserved, sent, completed]
+        self.assertEqual('F1', slack.upload_file(b'png', 'chart.png'))
+        mock_request.assert_any_call(
+            "POST", 'https://files/1', data=b'png'
+        )
+        self.assertEqual(
+            [{'id': 'F1', 'title': 'chart.png'}],
+            mock_request.call_args.kwargs['json']['files']
+        )
+
+    @patch('slack.slack.session.request')
+    def test_web_api_token_is_sent_as_a_bearer_header(self, mock_request):
+        mock_request.return_value = Mock()
+        mock_request.return_value.status_code = 200
+        mock_request.return_value.text = '{"ok": true, "messages": []}'
+        self.assertEqual([], slack.get_messages('C1'))
+        mock_request.assert_called_once_with(
+            "GET", 'https://slack.com/api/conversations.history',
+            headers=slack.auth_headers,
+            params={'channel': 'C1', 'limit': 10}
+        )
+
+    @patch('builtins.print')
+    @patch('slack.slack.session.request')
+    def test_web_api_errors_are_raised(self, mock_request, mock_print):
+        mock_request.return_value = Mock()
+        mock_request.return_value.status_code = 200
+        mock_request.return_value.text = '{"ok": false}'
+        with self.assertRaises(requests.HTTPError):
+            slack.delete_message('C1', '1.1')
+
+
+class DeliveryTest(unittest.TestCase):
+
+    def test_delivery_resolves_to_the_response(self):
+        response = Mock(ok=True)
+        send = Mock(return_value=response)
+        delivery = concurrent.futures.Future()
+        slack.deliver(send, {'key': 'value'}, None, delivery)
+        send.assert_called_once_with({'key': 'value'}, None)
+        self.assertIs(response, delivery.result())
+
+    def test_rejected_messages_fail_the_delivery(self):
+        send = Mock(return_value=Mock(ok=False, status_code=400, text='no'))
+        delivery = concurrent.futures.Future()
+        slack.deliver(send, {'key': 'value'}, None, delivery)
+        with self.assertRaises(requests.HTTPError):
+            delivery.result()
+
+    @patch('builtins.print')
+    def test_errors_fail_the_delivery(self, mock_print):
+        send = Mock(side_effect=requests.exceptions.ConnectionError())
+        delivery = concurrent.futures.Future()
+        slack.deliver(send, {'key': 'value'}, None, delivery)
+        self.assertIsInstance(
+            delivery.exception(), requests.exceptions.ConnectionError
+        )
+        mock_print.assert_called_once()
+
+    @patch('builtins.print')
+    def test_unexpected_errors_fail_the_delivery(self, mock_print):
+        send = Mock(side_effect=ValueError())
+        delivery = concurrent.futures.Future()
+        slack.deliver(send, {'key': 'value'}, None, delivery)
+        self.assertIsInstance(delivery.exception(), ValueError)
+        mock_print.assert_called_once()
+
+    def test_cancelled_deliveries_are_not_sent(self):
+        send = Mock()
+        delivery = concurrent.futures.Future()
+        delivery.cancel()
+        slack.deliver(send, {'key': 'value'}, None, delivery)
+        send.assert_not_called()
+
+    @patch('slack.slack.send_message')
+    def test_queued_messages_are_sent_in_the_background(
+        self, mock_send_message
+    ):
+        mock_send_message.return_value = Mock(ok=True)
+        delivery = slack.queue_message({'key': 'value'}, 'https://hooks/18')
+        self.assertIs(mock_send_message.return_value, delivery.result(5))
+        mock_send_message.assert_called_once_with(
+            {'key': 'value'}, 'https://hooks/18'
+        )
+
+    @patch('jira.retry.request')
+    @patch('slack.slack.outbox', queue.Queue())
+    @patch('slack.slack.start_sender')
+    def test_messages_queued_in_a_trace_are_sent_after_it_finishes(
+        self, mock_start_sender, mock_request
+    ):
+        mock_request.return_value = Mock(ok=True)
+        with tracing.trace('event') as record:
+            delivery = slack.queue_message({'key': 'value'})
+        slack.deliver(*slack.outbox.get_nowait())
+        self.assertIs(mock_request.return_value, delivery.result(0))
+        self.assertEqual([], record['spans'])
+
+    @patch('slack.slack.OUTBOX_TIMEOUT', 0)
+    @patch('slack.slack.outbox', queue.Queue(maxsize=1))
+    @patch('slack.slack.start_sender')
+    def test_full_outbox_fails_the_delivery(self, mock_start_sender):
+        slack.outbox.put('queued')
+        delivery = slack.queue_message({'key': 'value'})
+        self.assertIsInstance(
+            delivery.exception(), requests.exceptions.RequestException
+        )
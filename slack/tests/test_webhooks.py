@@ -1,5 +1,6 @@
 import unittest
 from unittest.mock import patch
+from jira import boards
 from slack.webhooks import (
     build_message, build_burndown_block, build_issue_str,
     build_estimates_missing_block, build_large_estimates_block,
@@ -7,7 +8,7 @@ from slack.webhooks import (
 )
 
 
-@patch('slack.slack.send_message')
+@patch('slack.slack.queue_message')
 @patch('slack.webhooks.build_large_estimates_block')
 @patch('slack.webhooks.build_estimates_missing_block')
 @patch('slack.webhooks.build_no_subtasks_block')
@@ -27,19 +28,20 @@ class BuildMessageTest(unittest.TestCase):
     def test_build_message_ignores_empty_lists(
         self, mock_build_burndown_block, mock_build_no_subtasks_block,
         mock_build_estimates_missing_block, mock_build_large_estimates_block,
-        mock_send_message
+        mock_queue_message
     ):
-        build_message(self.sprint_info, [], [], [])
+        delivery = build_message(self.sprint_info, [], [], [])
+        self.assertIs(mock_queue_message.return_value, delivery)
         mock_build_burndown_block.assert_called_once_with(self.sprint_info)
         mock_build_no_subtasks_block.assert_not_called()
         mock_build_estimates_missing_block.assert_not_called()
         mock_build_large_estimates_block.assert_not_called()
-        mock_send_message.assert_called_once()
+        mock_queue_message.assert_called_once()
 
     def test_build_message_builds_no_subtasks_block_when_appropriate(
         self, mock_build_burndown_block, mock_build_no_subtasks_block,
         mock_build_estimates_missing_block, mock_build_large_estimates_block,
-        mock_send_message
+        mock_queue_message
     ):
         self.issues[0]['type'] = 'story'
         build_message(self.sprint_info, self.issues, [], [])
@@ -47,12 +49,12 @@ class BuildMessageTest(unittest.TestCase):
         mock_build_no_subtasks_block.assert_called_once_with(self.issues)
         mock_build_estimates_missing_block.assert_not_called()
         mock_build_large_estimates_block.assert_not_called()
-        mock_send_message.assert_called_once()
+        mock_queue_message.assert_called_once()
 
     def test_build_message_builds_estimates_missing_block_when_appropriate(
         self, mock_build_burndown_block, mock_build_no_subtasks_block,
         mock_build_estimates_missing_block, mock_build_large_estimates_block,
-        mock_send_message
+        mock_queue_message
     ):
         self.issues[0]['type'] = 'bug'
         build_message(self.sprint_info, [], self.issues, [])
@@ -60,12 +62,12 @@ class BuildMessageTest(unittest.TestCase):
         mock_build_no_subtasks_block.assert_not_called()
         mock_build_estimates_missing_block.assert_called_once_with(self.issues)
         mock_build_large_estimates_block.assert_not_called()
-        mock_send_message.assert_called_once()
+        mock_queue_message.assert_called_once()
 
     def test_build_message_builds_large_estimates_block_when_appropriate(
         self, mock_build_burndown_block, mock_build_no_subtasks_block,
         mock_build_estimates_missing_block, mock_build_large_estimates_block,
-        mock_send_message
+        mock_queue_message
     ):
         self.issues[0]['type'] = 'task'
         build_message(self.sprint_info, [], [], self.issues)
@@ -73,7 +75,19 @@ class BuildMessageTest(unittest.TestCase):
         mock_build_no_subtasks_block.assert_not_called()
         mock_build_estimates_missing_block.assert_not_called()
         mock_build_large_estimates_block.assert_called_once_with(self.issues)
-        mock_send_message.assert_called_once()
+        mock_queue_message.assert_called_once()
+
+    def test_build_message_posts_to_the_current_boards_webhook(
+        self, mock_build_burndown_block, mock_build_no_subtasks_block,
+        mock_build_estimates_missing_block, mock_build_large_estimates_block,
+        mock_queue_message
+    ):
+        board = {'id': 18, 'slack_webhook_url': 'https://hooks/18'}
+        with boards.using(board):
+            build_message(self.sprint_info, [], [], [])
+        mock_queue_message.assert_called_once_with(
+            mock_build_burndown_block.return_value, 'https://hooks/18'
+        )
 
 
 class BuildMessageBlocksTest(unittest.TestCase):
@@ -121,3 +135,27 @@ class BuildMessageBlocksTest(unittest.TestCase):
         self.assertIn('TEST-1', str(large_estimates_block))
         self.assertIn('jira_task', str(large_estimates_block))
         self.assertIn('someone', str(large_estimates_block))
+
+    @patch('slack.charts.get_burndown_chart')
+    def test_burndown_chart_is_attached_when_available(
+        self, mock_get_burndown_chart
+    ):
+        mock_get_burndown_chart.return_value = 'F1'
+        sprint_info = {
+            'name': 'TEST Sprint', 'burndown': 21, 'id': 1, 'day': 'today'
+        }
+        burndown_block = build_burndown_block(sprint_info)
+        mock_get_burndown_chart.assert_called_once_with(
+            1, 'TEST Sprint', 'today'
+        )
+        self.assertEqual(
+            {'id': 'F1'}, burndown_block['blocks'][-1]['slack_file']
+        )
+
+    @patch('slack.charts.get_burndown_chart')
+    def test_burndown_block_without_a_chart(self, mock_get_burndown_chart):
+        mock_get_burndown_chart.return_value = None
+        sprint_info = {
+            'name': 'TEST Sprint', 'burndown': 21, 'id': 1, 'day': 'today'
+        }
+        self.assertEqual(1, len(build_burndown_block(sprint_info)['blocks']))
@@ -1,5 +1,5 @@
-from jira import jira
-from slack import slack
+from jira import boards, jira
+from slack import charts, slack
 
 
 def build_message(
@@ -18,12 +18,16 @@ def build_message(
         message['blocks'].extend(
             build_large_estimates_block(large_estimates)
         )
-    slack.send_message(message)
+    # boards may post to their own channel, otherwise the default webhook
+    board = boards.get_current()
+    return slack.queue_message(
+        message, board and board['slack_webhook_url']
+    )
 
 
 def build_burndown_block(sprint_info):
     sprint_url = f"{jira.SERVER}/secure/RapidBoard.jspa"
-    sprint_url += f"?rapidView={jira.BOARD_ID}"
+    sprint_url += f"?rapidView={jira.get_board_id()}"
     burndown_block = {
         "blocks": [{
             "type": "section",
@@ -43,6 +47,16 @@ def build_burndown_block(sprint_info):
             ]
         }]
     }
+    if sprint_info.get('id') is not None:
+        chart = charts.get_burndown_chart(
+            sprint_info['id'], sprint_info['name'], sprint_info['day']
+        )
+        if chart:
+            burndown_block['blocks'].append({
+                "type": "image",
+                "slack_file": {"id": chart},
+                "alt_text": f"{sprint_info['name']} burndown chart"
+            })
     return burndown_block
 
 